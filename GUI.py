@@ -8,99 +8,225 @@ Updated GUI: same layout as before but adds:
 
 from PyQt6.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QMessageBox,
-    QListWidget, QListWidgetItem, QSpinBox, QFrame, QMenu, QFileDialog,
-    QProgressBar, QDialog
+    QListWidget, QListView, QSpinBox, QFrame, QMenu, QFileDialog,
+    QProgressBar, QDialog, QComboBox, QDateEdit, QCheckBox, QFormLayout,
+    QDialogButtonBox, QProgressDialog, QInputDialog, QTableWidget, QTableWidgetItem,
+    QHeaderView, QAbstractItemView, QSystemTrayIcon, QStyle
 
 
 )
-from PyQt6.QtCore import Qt, QTimer
-from database import Database
+from PyQt6.QtCore import (
+    Qt, QTimer, QAbstractListModel, QModelIndex, QPointF, QRectF, QFileSystemWatcher,
+    QDate, QThread, pyqtSignal
+)
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen, QPixmap, QKeySequence, QShortcut
+from database import Database, DB_FILE, open_database
+from render_cache import RenderCache
 from styles import Styles
-from datetime import date, datetime, timedelta
+from workers import DbWorker
+import diagnostics
+import exporter
+import reminders
+import retention
+from datetime import date, datetime, time, timedelta
+import importlib
+import math
+import os
+import threading
+
+
+# ---------- Today's entries model ----------
+class EntriesModel(QAbstractListModel):
+    """
+    List model over the day's intake rows, keyed by intake.id.
+    sync() applies only the rows that were inserted, changed or removed,
+    so a refresh with unchanged data touches no views at all.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []   # [(id, timestamp_iso, amount_ml)] ordered like the view
+        self._labels = {}  # id -> formatted label, filled lazily by data()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry_id, timestamp, amount = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            label = self._labels.get(entry_id)
+            if label is None:
+                ts = datetime.fromisoformat(timestamp).strftime("%H:%M:%S")
+                label = f"{entry_id} — {ts} — {amount} ml"
+                self._labels[entry_id] = label
+            return label
+        if role == Qt.ItemDataRole.UserRole:
+            return entry_id
+        return None
+
+    @diagnostics.timed("gui.entries.sync")
+    def sync(self, entries):
+        new_rows = [(e["id"], e["timestamp"], e["amount_ml"]) for e in entries]
+        if not self._rows or not new_rows:
+            if self._rows != new_rows:
+                self.beginResetModel()
+                self._rows = new_rows
+                self._labels.clear()
+                self.endResetModel()
+            return
+
+        # Deletions, bottom-up so row numbers stay valid
+        new_ids = {r[0] for r in new_rows}
+        for row in range(len(self._rows) - 1, -1, -1):
+            if self._rows[row][0] not in new_ids:
+                self._remove(row)
 
-import matplotlib
-matplotlib.use("QtAgg")
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+        # Inserts, moves and in-place updates, walking the target order.
+        # Rows from `tail` on are all new, so they go in as one append.
+        present = {r[0] for r in self._rows}
+        tail = len(new_rows)
+        while tail > 0 and new_rows[tail - 1][0] not in present:
+            tail -= 1
+        for i, new in enumerate(new_rows):
+            if i >= tail:
+                self.beginInsertRows(QModelIndex(), i, len(new_rows) - 1)
+                self._rows[i:] = new_rows[i:]
+                self.endInsertRows()
+                return
+            if i < len(self._rows) and self._rows[i][0] == new[0]:
+                if self._rows[i] != new:
+                    self._rows[i] = new
+                    self._labels.pop(new[0], None)
+                    idx = self.index(i)
+                    self.dataChanged.emit(idx, idx)
+                continue
+            if new[0] in present:
+                # Timestamp edit moved this row; drop it from its old slot
+                self._remove(self._row_of(new[0], i))
+            self.beginInsertRows(QModelIndex(), i, i)
+            self._rows.insert(i, new)
+            self._labels.pop(new[0], None)
+            self.endInsertRows()
+            present.add(new[0])
+
+    def _row_of(self, entry_id, start):
+        for row in range(start, len(self._rows)):
+            if self._rows[row][0] == entry_id:
+                return row
+        raise KeyError(entry_id)
+
+    def _remove(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        entry_id = self._rows.pop(row)[0]
+        self._labels.pop(entry_id, None)
+        self.endRemoveRows()
 
 
 # ---------- Donut chart with % inside ----------
-class DonutCanvas(FigureCanvas):
+class DonutWidget(QWidget):
+    """
+    Progress donut painted directly with QPainter. Only repaints when the
+    displayed percentage changes, and each (percentage, size, device pixel
+    ratio) is painted once into a pixmap kept in CACHE.
+    """
+    FILL_COLOR = QColor("#4fc3f7")
+    TRACK_COLOR = QColor("#2a2d33")
+    TEXT_COLOR = QColor("#00bfff")
+    RING_WIDTH = 0.28    # fraction of the outer radius, as in the old pie chart
+    DIAMETER = 0.71      # outer diameter as a fraction of the widget
+    TEXT_SCALE = 0.144   # 27pt text on the old 260px figure
+    # 101 percentages at a couple of sizes is well under this
+    CACHE = RenderCache(max_bytes=16 * 1024 * 1024)
+
     def __init__(self, parent=None, size=(3.0, 3.0), dpi=100):
-        fig = Figure(figsize=size, dpi=dpi, tight_layout=True)
-        super().__init__(fig)
-        self.axes = fig.add_subplot(111)
-
-    def plot_donut_percent(self, percent: float):
-        self.axes.clear()
-        pct = max(0.0, min(100.0, percent))
-        remaining_pct = 100.0 - pct
-        wedges = [pct, remaining_pct] if pct > 0 else [0.0001, 100.0]
-        colors = ["#4fc3f7", "#2a2d33"]
-        self.axes.pie(
-            wedges,
-            colors=colors,
-            startangle=90,
-            wedgeprops=dict(width=0.28, edgecolor='w')
-        )
-        # Draw % text in center
-        self.axes.text(0, 0, f"{int(round(pct))}%", ha='center', va='center',
-                       fontsize=27, color='#00bfff', weight='bold')
-        self.axes.set_aspect('equal')
-        self.axes.axis('off')
-        self.draw()
-
-class WeeklyChartCanvas(FigureCanvas):
-    def __init__(self, parent=None, db=None):
-        self.db = db
-        self.fig = Figure(figsize=(4, 3), facecolor="#2a2b2f")
-        super().__init__(self.fig)
-        self.ax = self.fig.add_subplot(111)
-        self.fig.tight_layout(pad=3)
-        self.plot_weekly_data()
-
-    def plot_weekly_data(self):
-        self.ax.clear()
-        self.ax.set_facecolor("#2a2b2f")
-
-        # Get last 7 days
-        today = date.today()
-        days = [(today - timedelta(days=i)).isoformat() for i in range(6, -1, -1)]
-        labels = [(today - timedelta(days=i)).strftime("%a") for i in range(6, -1, -1)]
-
-        data = []
-        for d in days:
-            total = self.db.get_intake_for_date(d)
-            data.append(total)
-
-        # Plot bar chart
-        bars = self.ax.bar(labels, data, color="#4fc3f7", edgecolor="#1e1f23")
-
-        # Add values on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            if height > 0:
-                self.ax.text(
-                    bar.get_x() + bar.get_width()/2, height + 30,
-                    f"{int(height)}", ha="center", va="bottom",
-                    color="#e6eef6", fontsize=8
-                )
+        super().__init__(parent)
+        self.setMinimumSize(int(size[0] * dpi), int(size[1] * dpi))
+        self._percent = None
+
+    def set_percent(self, percent: float):
+        pct = int(round(max(0.0, min(100.0, percent))))
+        if pct == self._percent:
+            return
+        self._percent = pct
+        self.update()
 
-        # Chart styling
-        self.ax.set_title("Weekly Water Intake", color="#e6eef6", fontsize=12, pad=10)
-        self.ax.tick_params(colors="#a0b3c6")
-        for spine in self.ax.spines.values():
-            spine.set_color("#a0b3c6")
-        self.ax.set_ylabel("ml", color="#a0b3c6")
+    @diagnostics.timed("gui.paint.donut")
+    def paintEvent(self, event):
+        pct = self._percent or 0
+        ratio = self.devicePixelRatioF()
+        key = (pct, self.width(), self.height(), ratio, self.font().key())
+        pixmap = self.CACHE.get(key)
+        if pixmap is None:
+            pixmap = QPixmap(round(self.width() * ratio), round(self.height() * ratio))
+            pixmap.setDevicePixelRatio(ratio)
+            self._paint_donut(pixmap, pct)
+            self.CACHE.put(key, pixmap, pixmap.width() * pixmap.height() * 4)
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, pixmap)
+        painter.end()
 
-        self.draw()
+    def _paint_donut(self, device, pct):
+        painter = QPainter(device)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), Qt.GlobalColor.white)
+
+        extent = min(self.width(), self.height())
+        side = extent * self.DIAMETER
+        ring = side / 2 * self.RING_WIDTH
+        # arcs are stroked along their centre line, so inset by half the ring
+        rect = QRectF((self.width() - side + ring) / 2, (self.height() - side + ring) / 2,
+                      side - ring, side - ring)
+
+        pen = QPen(self.TRACK_COLOR, ring)
+        pen.setCapStyle(Qt.PenCapStyle.FlatCap)
+        painter.setPen(pen)
+        painter.drawEllipse(rect)
+        if pct > 0:
+            pen.setColor(self.FILL_COLOR)
+            painter.setPen(pen)
+            painter.drawArc(rect, 90 * 16, int(pct * 3.6 * 16))
+        if 0 < pct < 100:
+            # white wedge edges where fill and track meet
+            painter.setPen(QPen(Qt.GlobalColor.white, 1.5))
+            center = rect.center()
+            r0, r1 = side / 2 - ring, side / 2
+            for angle in (90.0, 90.0 + pct * 3.6):
+                rad = math.radians(angle)
+                painter.drawLine(
+                    QPointF(center.x() + r0 * math.cos(rad), center.y() - r0 * math.sin(rad)),
+                    QPointF(center.x() + r1 * math.cos(rad), center.y() - r1 * math.sin(rad)),
+                )
+
+        font = QFont(self.font())
+        font.setBold(True)
+        font.setPixelSize(max(1, int(extent * self.TEXT_SCALE)))
+        painter.setFont(font)
+        painter.setPen(self.TEXT_COLOR)
+        painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, f"{pct}%")
+        painter.end()
 
 
 # ---------- Report window ----------
 class ReportWindow(QDialog):
-    def __init__(self, db, parent=None):
+    VIEWS = [
+        ("Last 7 days", "week"),
+        ("Daily trend (1 year)", "trend"),
+        ("Monthly", "month"),
+        ("Yearly", "year"),
+        ("Hour of day", "heatmap"),
+        ("All history (zoomable)", "all"),
+    ]
+    TREND_DAYS = 365
+    MONTHS_SHOWN = 24
+
+    def __init__(self, db, parent=None, worker=None):
         super().__init__(parent)
         self.db = db
+        self.worker = worker
+        self.view = "week"
+        self._analytics = None
         self.setWindowTitle("Intake Report")
         self.setMinimumSize(520, 500)
         self._build_ui()
@@ -124,6 +250,11 @@ class ReportWindow(QDialog):
                 font-weight: bold;
                 color: #4fc3f7;
             }
+            QLabel#metric_small {
+                font-size: 16px;
+                font-weight: bold;
+                color: #4fc3f7;
+            }
             QLabel#section {
                 font-size: 16px;
                 font-weight: bold;
@@ -140,11 +271,24 @@ class ReportWindow(QDialog):
     def _build_ui(self):
         layout = QVBoxLayout()
 
-        # Top: Weekly chart (replaces donut)
+        # Top: Weekly chart (replaces donut), or one of the long-range views
+        # charts pulls in matplotlib, so it is only imported once a report is opened
+        from charts import TrendsCanvas, WeeklyChartCanvas
         chart_card = QFrame(); chart_card.setObjectName("card")
         cv = QVBoxLayout()
-        self.weekly_chart = WeeklyChartCanvas(self, db=self.db)
+        self.view_combo = QComboBox()
+        for label, view in self.VIEWS:
+            self.view_combo.addItem(label, view)
+        self.view_combo.currentIndexChanged.connect(self._on_view_changed)
+        cv.addWidget(self.view_combo, alignment=Qt.AlignmentFlag.AlignRight)
+        self.weekly_chart = WeeklyChartCanvas(self, db=self.db, data=[0] * 7)
         cv.addWidget(self.weekly_chart)
+        self.trends_chart = TrendsCanvas(self)
+        self.trends_chart.hide()
+        cv.addWidget(self.trends_chart)
+        self.trends_toolbar = self.trends_chart.make_toolbar(self)
+        self.trends_toolbar.hide()
+        cv.addWidget(self.trends_toolbar)
         chart_card.setLayout(cv)
         layout.addWidget(chart_card)
 
@@ -171,6 +315,22 @@ class ReportWindow(QDialog):
         metric_layout.addLayout(target_box)
         layout.addLayout(metric_layout)
 
+        # Averages and goal streaks over the whole history
+        trend_layout = QHBoxLayout()
+        trend_layout.setSpacing(30)
+        trend_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.trend_values = {}
+        for key, title in (("avg_7", "7-day avg"), ("avg_30", "30-day avg"),
+                           ("streak", "Streak (best)"), ("hit_rate", "Goal hit rate")):
+            box = QVBoxLayout()
+            title_label = QLabel(title); title_label.setObjectName("metric_label")
+            value_label = QLabel("–"); value_label.setObjectName("metric_small")
+            box.addWidget(title_label, alignment=Qt.AlignmentFlag.AlignCenter)
+            box.addWidget(value_label, alignment=Qt.AlignmentFlag.AlignCenter)
+            trend_layout.addLayout(box)
+            self.trend_values[key] = value_label
+        layout.addLayout(trend_layout)
+
         # Bottom: Summary section
         summary_card = QFrame(); summary_card.setObjectName("card")
         sv = QVBoxLayout()
@@ -185,47 +345,386 @@ class ReportWindow(QDialog):
 
         self.setLayout(layout)
 
+    def _on_view_changed(self, _index):
+        self.view = self.view_combo.currentData()
+        self.refresh()
+
+    def _analytics_for(self, db):
+        # one cache per profile; a profile switch replaces self.db
+        if self._analytics is None or self._analytics.db is not db:
+            from analytics import Analytics
+            if self._analytics is not None:
+                self._analytics.close()
+            self._analytics = Analytics(db)
+        return self._analytics
+
     def refresh(self):
-        # Update weekly chart
-        self.weekly_chart.plot_weekly_data()
+        args = (self.db, self._analytics_for(self.db), self.view)
+        if self.worker is None:
+            self._apply(self._load(*args))
+        else:
+            self.worker.read("report", self._load, *args, callback=self._apply)
+
+    @classmethod
+    @diagnostics.timed("report.load")
+    def _load(cls, db, analytics, view):
+        # runs on a worker thread: gather everything the report shows
+        from charts import WeeklyChartCanvas
+        import analytics as an
+        # read before the data: a write in between gives a newer version
+        # on the next load, never the old data under a newer key
+        key = (db.user_id, db.data_version(), date.today().isoformat(), view)
+        target = db.get_daily_target_ml()
+        # one zero-filled range query feeds both the chart and the summary
+        week = WeeklyChartCanvas.load_weekly_series(db)
+        data = {
+            "view": view,
+            "key": key,
+            "target": target,
+            "consumed": week[-1][1],
+            "week": [total for _, total in week],
+            "history": week[::-1],  # last 7 days, newest first
+            "summary": analytics.summary(target),
+        }
+        if view == "trend":
+            days, totals = analytics.daily(cls.TREND_DAYS)
+            n = len(days)
+            data["trend"] = (days.astype("datetime64[D]"), totals,
+                             analytics.rolling_average(7)[-n:], analytics.rolling_average(30)[-n:])
+        elif view == "month":
+            starts, _totals, means = analytics.periods(an.PERIOD_MONTH)
+            labels = [str(m) for m in starts[-cls.MONTHS_SHOWN:]]
+            data["periods"] = (labels, means[-cls.MONTHS_SHOWN:], "Average per Day by Month")
+        elif view == "year":
+            starts, _totals, means = analytics.periods(an.PERIOD_YEAR)
+            data["periods"] = ([str(y) for y in starts], means, "Average per Day by Year")
+        elif view == "heatmap":
+            data["heatmap"] = analytics.hour_heatmap()
+        elif view == "all":
+            data["all"] = analytics.daily()
+        return data
+
+    @diagnostics.timed("gui.report.apply")
+    def _apply(self, data):
+        if data["view"] != self.view:
+            return  # superseded by a view change
+        # Update the chart for the selected view
+        # unchanged data at a size drawn before comes from the render cache
+        target, key = data["target"], data["key"]
+        self.weekly_chart.setVisible(self.view == "week")
+        self.trends_chart.setVisible(self.view != "week")
+        self.trends_toolbar.setVisible(self.view == "all")
+        if self.view == "week":
+            self.weekly_chart.plot_weekly_data(data["week"], key=key)
+        elif self.view == "trend":
+            self.trends_chart.plot_trend(*data["trend"], target, key=key)
+        elif self.view == "heatmap":
+            self.trends_chart.plot_heatmap(data["heatmap"], key=key)
+        elif self.view == "all":
+            self.trends_chart.plot_long_range(*data["all"], target, key=key)
+        else:
+            labels, means, title = data["periods"]
+            self.trends_chart.plot_periods(labels, means, target, title, key=key)
+
+        summary = data["summary"]
+        self.trend_values["avg_7"].setText(f"{summary['avg_7']:.0f} ml")
+        self.trend_values["avg_30"].setText(f"{summary['avg_30']:.0f} ml")
+        self.trend_values["streak"].setText(
+            f"{summary['current_streak']} d ({summary['longest_streak']} d)")
+        self.trend_values["hit_rate"].setText(f"{summary['hit_rate']:.0%}")
 
         # Update metrics
-        target = self.db.get_daily_target_ml()
-        today = date.today().isoformat()
-        consumed = self.db.get_intake_for_date(today)
-        remaining = max(0, target - consumed)
+        remaining = max(0, target - data["consumed"])
         self.rem_label_value.setText(f"{remaining} ml")
         self.target_label_value.setText(f"{target} ml")
 
         # Summary section (weekly)
         self.date_label.setText("Weekly Intake Summary")
         self.summary_list.clear()
+        for dt, total in reversed(data["history"]):
+            day_name = date.fromisoformat(dt).strftime("%a, %b %d")
+            self.summary_list.addItem(f"{day_name}: {total} ml")
+
+
+# ---------- Export ----------
+class ExportDialog(QDialog):
+    """Asks for the export file, format, granularity and date range."""
+
+    FORMAT_LABELS = [
+        ("CSV", exporter.FORMAT_CSV, "csv"),
+        ("JSON Lines", exporter.FORMAT_JSONL, "jsonl"),
+        ("Compressed binary", exporter.FORMAT_BIN, "wiex"),
+        ("Text report (daily totals)", exporter.FORMAT_TXT, "txt"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Export History")
+        form = QFormLayout()
+
+        self.format_combo = QComboBox()
+        for label, fmt, _ext in self.FORMAT_LABELS:
+            self.format_combo.addItem(label, fmt)
+        self.granularity_combo = QComboBox()
+        self.granularity_combo.addItem("Daily totals", exporter.GRANULARITY_DAY)
+        self.granularity_combo.addItem("Individual entries", exporter.GRANULARITY_ENTRY)
+        self.format_combo.currentIndexChanged.connect(self._update_granularity)
+
+        self.all_dates = QCheckBox("All history")
+        self.all_dates.setChecked(True)
+        today = QDate.currentDate()
+        self.start_edit = QDateEdit(today.addDays(-30)); self.start_edit.setCalendarPopup(True)
+        self.end_edit = QDateEdit(today); self.end_edit.setCalendarPopup(True)
+        self.all_dates.toggled.connect(self._update_dates)
+
+        form.addRow("Format:", self.format_combo)
+        form.addRow("Granularity:", self.granularity_combo)
+        form.addRow("", self.all_dates)
+        form.addRow("From:", self.start_edit)
+        form.addRow("To:", self.end_edit)
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        form.addRow(buttons)
+        self.setLayout(form)
+        self._update_dates(True)
+
+    def _update_granularity(self):
+        is_txt = self.format_combo.currentData() == exporter.FORMAT_TXT
+        if is_txt:
+            self.granularity_combo.setCurrentIndex(0)
+        self.granularity_combo.setEnabled(not is_txt)
+
+    def _update_dates(self, all_dates):
+        self.start_edit.setEnabled(not all_dates)
+        self.end_edit.setEnabled(not all_dates)
+
+    def options(self):
+        fmt = self.format_combo.currentData()
+        ext = self.FORMAT_LABELS[self.format_combo.currentIndex()][2]
+        start = end = None
+        if not self.all_dates.isChecked():
+            start = self.start_edit.date().toPyDate().isoformat()
+            end = self.end_edit.date().toPyDate().isoformat()
+        return fmt, ext, self.granularity_combo.currentData(), start, end
+
+
+class ExportThread(QThread):
+    progress = pyqtSignal(int, int)
+    succeeded = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db, path, fmt, granularity, start, end, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.args = (path, fmt, granularity, start, end)
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        path, fmt, granularity, start, end = self.args
+        try:
+            count = exporter.export(
+                self.db, path, fmt=fmt, granularity=granularity, start=start, end=end,
+                progress=self.progress.emit, cancelled=self._cancel.is_set,
+            )
+            self.succeeded.emit(count)
+        except exporter.ExportCancelled:
+            self.failed.emit("")
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+# ---------- Diagnostics ----------
+class DiagnosticsDialog(QDialog):
+    """Live table of the diagnostics timings, with recording on/off, reset and save."""
+
+    COLUMNS = ["Name", "Count", "p50 ms", "p99 ms", "Max ms", "Total ms"]
+    REFRESH_MS = 1000
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle("Diagnostics")
+        self.resize(760, 480)
+        layout = QVBoxLayout()
+
+        top = QHBoxLayout()
+        self.record_check = QCheckBox("Record timings")
+        self.record_check.setChecked(diagnostics.enabled())
+        self.status_label = QLabel()
+        top.addWidget(self.record_check); top.addWidget(self.status_label, 1)
+        layout.addLayout(top)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table, 1)
+
+        buttons = QHBoxLayout()
+        self.reset_btn = QPushButton("Reset")
+        self.save_btn = QPushButton("Save...")
+        close_btn = QPushButton("Close")
+        buttons.addWidget(self.reset_btn); buttons.addWidget(self.save_btn)
+        buttons.addStretch(); buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+        self.record_check.toggled.connect(self._set_recording)
+        self.reset_btn.clicked.connect(self._reset)
+        self.save_btn.clicked.connect(self._save)
+        close_btn.clicked.connect(self.close)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(self.REFRESH_MS)
+        self.refresh()
+
+    def _set_recording(self, on):
+        if on:
+            diagnostics.enable(self.db)
+        else:
+            diagnostics.disable()
+        self.refresh()
+
+    def _reset(self):
+        rec = diagnostics.recorder()
+        if rec is not None:
+            rec.reset()
+        self.refresh()
+
+    def _save(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save Timings", "water_timings.prom",
+            "Prometheus text (*.prom *.txt);;JSON (*.json)")
+        if not path:
+            return
+        try:
+            diagnostics.dump(path)
+        except (OSError, RuntimeError) as e:
+            QMessageBox.warning(self, "Save Timings", f"Could not save timings:\n{e}")
+
+    def refresh(self):
+        rec = diagnostics.recorder()
+        self.reset_btn.setEnabled(rec is not None)
+        self.save_btn.setEnabled(rec is not None)
+        if rec is None:
+            self.status_label.setText("Recording is off; timings cost nothing while it is.")
+            self.table.setRowCount(0)
+            return
+        rows = sorted(rec.snapshot().items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        self.status_label.setText(f"{len(rows)} timers since {datetime.fromtimestamp(rec.started):%H:%M:%S}")
+        self.table.setRowCount(len(rows))
+        for r, (name, t) in enumerate(rows):
+            values = [name, str(t["count"])] + [
+                f"{t[k]:.2f}" for k in ("p50_ms", "p99_ms", "max_ms", "total_ms")]
+            for c, value in enumerate(values):
+                item = self.table.item(r, c)
+                if item is None:
+                    item = QTableWidgetItem()
+                    if c:
+                        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                    self.table.setItem(r, c, item)
+                item.setText(value)
+
+    def closeEvent(self, event):
+        self._timer.stop()
+        super().closeEvent(event)
 
-        history = self.db.get_history(7)  # last 7 days
-        if history:
-            total_week = 0
-            for dt, total in reversed(history):
-                total_week += total
-                day_name = date.fromisoformat(dt).strftime("%a, %b %d")
-                self.summary_list.addItem(f"{day_name}: {total} ml")
+    def showEvent(self, event):
+        self._timer.start(self.REFRESH_MS)
+        super().showEvent(event)
 
 
 # ---------- Main window ----------
+# retention and archive sealing run this long after startup (and again
+# after midnight), then free the file space in small incremental-vacuum steps this far apart
+MAINTENANCE_DELAY_MS = 120_000
+VACUUM_STEP_INTERVAL_MS = 2_000
+
+
+class _DesktopNotifier:
+    """plyer on the scheduler's thread; failing that, the window shows the reminder."""
+
+    def __init__(self, fallback):
+        self._plyer = reminders.PlyerNotifier()
+        self._fallback = fallback   # a signal, so the GUI thread handles it
+
+    def notify(self, title: str, message: str) -> bool:
+        if not self._plyer.notify(title, message):
+            self._fallback.emit(title, message)
+        return True
+
+
 class MainWindow(QWidget):
-    def __init__(self):
+    # Database change events, delivered on the GUI thread
+    db_changed = pyqtSignal(object)
+    # reminders plyer could not show, as (title, message)
+    reminder_due = pyqtSignal(str, str)
+
+    def __init__(self, preload_charts: bool = True, db_spec: str = DB_FILE):
         super().__init__()
-        self.db = Database()
+        # _root_db owns the connections; self.db is the active profile's view
+        self._root_db = open_database(db_spec)
+        self.db = self._root_db
+        # every query after startup goes through the worker, off the GUI thread
+        self.worker = DbWorker(parent=self)
+        self.worker.failed.connect(self._on_worker_failed)
         self.setWindowTitle("Water Intake Tracker")
         self.setMinimumSize(900, 600)
         self._apply_dark_style()
         self._build_ui()
+        self._today = date.today().isoformat()
+        # last totals shown, plus logs submitted but not yet written, so the
+        # target check in log_intake needs no query
+        self._target = 0
+        self._consumed = 0
+        self._pending_ml = 0
         self.refresh_ui()
+        self._refresh_profiles()
         self.report_window = None
+        self.diagnostics_window = None
+        # SQL timing when started with --diagnostics (no-op otherwise)
+        diagnostics.attach(self._root_db)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=self.open_diagnostics)
+
+        # Updates are event driven: our own writes publish a Change, other
+        # processes are noticed through the database file changing, and a
+        # single-shot timer handles the day rollover at local midnight.
+        self.db_changed.connect(self._on_db_change)
+        self._db_listener = self.db_changed.emit
+        self.db.add_listener(self._db_listener)
+        self._file_watcher = QFileSystemWatcher(self)
+        self._file_watcher.fileChanged.connect(self._on_db_file_changed)
+        self._file_watcher.directoryChanged.connect(self._on_db_file_changed)
+        self._watch_db_files()
+        self._midnight_timer = QTimer(self)
+        self._midnight_timer.setSingleShot(True)
+        self._midnight_timer.timeout.connect(self._on_midnight)
+        self._arm_midnight_timer()
+        QTimer.singleShot(MAINTENANCE_DELAY_MS, self._run_maintenance)
+
+        # Reminders for every profile, on the scheduler's own thread; it
+        # sleeps until the earliest one is due
+        self._tray = None
+        self.reminder_due.connect(self._show_reminder)
+        self.reminders = reminders.ReminderScheduler(self._root_db, _DesktopNotifier(self.reminder_due))
+        self.reminders.start()
 
-        # Refresh every 30 seconds
-        self._refresh_timer = QTimer(self)
-        self._refresh_timer.timeout.connect(self.refresh_ui)
-        self._refresh_timer.start(30_000)
+        # Warm up the charting stack once the event loop is running, so
+        # the first report opens quickly without delaying the first paint
+        if preload_charts:
+            QTimer.singleShot(0, self._preload_charts)
+
+    def _preload_charts(self):
+        threading.Thread(
+            target=importlib.import_module, args=("charts",), daemon=True
+        ).start()
 
     def reset_today_data(self):
         reply = QMessageBox.question(
@@ -236,9 +735,9 @@ class MainWindow(QWidget):
         )
         if reply == QMessageBox.StandardButton.Yes:
             today = date.today().isoformat()
-            self.db.clear_entries_for_date(today)
-            QMessageBox.information(self, "Reset", "Today's data has been cleared.")
-            self.refresh_ui()
+            self.worker.write(self.db.clear_entries_for_date, today,
+                              callback=lambda _: QMessageBox.information(
+                                  self, "Reset", "Today's data has been cleared."))
 
     def _apply_dark_style(self):
         self.setStyleSheet("""
@@ -268,7 +767,7 @@ class MainWindow(QWidget):
                 border: 1px solid #3a3f45;
                 color: #e6eef6;
             }
-            QListWidget {
+            QListWidget, QListView {
                 background: #151618;
                 border: 1px solid #26292d;
                 border-radius: 6px;
@@ -293,6 +792,15 @@ class MainWindow(QWidget):
         title = QLabel("Water Intake Tracker"); title.setObjectName("title")
         left_col.addWidget(title)
 
+        # Profile switcher
+        p_card = QFrame(); p_card.setObjectName("card")
+        play = QHBoxLayout()
+        self.profile_combo = QComboBox()
+        self.new_profile_btn = QPushButton("New Profile"); self.new_profile_btn.setObjectName("ghost")
+        play.addWidget(QLabel("Profile:")); play.addWidget(self.profile_combo, 1); play.addWidget(self.new_profile_btn)
+        p_card.setLayout(play)
+        left_col.addWidget(p_card)
+
         # Target
         t_card = QFrame(); t_card.setObjectName("card")
         tlay = QHBoxLayout()
@@ -303,6 +811,16 @@ class MainWindow(QWidget):
         t_card.setLayout(tlay)
         left_col.addWidget(t_card)
 
+        # Reminders
+        r_card = QFrame(); r_card.setObjectName("card")
+        rlay = QHBoxLayout()
+        self.reminder_check = QCheckBox("Remind me when I fall behind, at most every")
+        self.reminder_spin = QSpinBox(); self.reminder_spin.setRange(reminders.MIN_INTERVAL_MINUTES, 240)
+        self.reminder_spin.setSingleStep(15); self.reminder_spin.setSuffix(" min")
+        rlay.addWidget(self.reminder_check); rlay.addWidget(self.reminder_spin); rlay.addStretch()
+        r_card.setLayout(rlay)
+        left_col.addWidget(r_card)
+
         # Log intake
         l_card = QFrame(); l_card.setObjectName("card")
         llay = QHBoxLayout()
@@ -323,7 +841,10 @@ class MainWindow(QWidget):
         e_card = QFrame(); e_card.setObjectName("card")
         ev = QVBoxLayout()
         ev.addWidget(QLabel("Today's entries (right-click to delete):"))
-        self.entries = QListWidget()
+        self.entries_model = EntriesModel(self)
+        self.entries = QListView()
+        self.entries.setUniformItemSizes(True)
+        self.entries.setModel(self.entries_model)
         self.entries.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.entries.customContextMenuRequested.connect(self._show_entry_menu)
         ev.addWidget(self.entries)
@@ -334,7 +855,7 @@ class MainWindow(QWidget):
         right_col = QVBoxLayout()
         donut_card = QFrame(); donut_card.setObjectName("card")
         dv = QVBoxLayout()
-        self.donut = DonutCanvas(self, size=(2.6, 2.6))
+        self.donut = DonutWidget(self, size=(2.6, 2.6))
         dv.addWidget(self.donut)
         self.rem_label = QLabel(); self.target_label = QLabel()
         donut_card.setLayout(dv)
@@ -356,45 +877,218 @@ class MainWindow(QWidget):
 
         # Connect
         self.target_btn.clicked.connect(self.set_target)
+        self.reminder_check.toggled.connect(self._set_reminder_enabled)
+        self.reminder_spin.editingFinished.connect(self._set_reminder_minutes)
+        self.profile_combo.activated.connect(self._on_profile_selected)
+        self.new_profile_btn.clicked.connect(self.new_profile)
         self.log_btn.clicked.connect(self.log_intake)
         self.view_btn.clicked.connect(self.open_report_window)
-        self.export_btn.clicked.connect(self.export_txt)
+        self.export_btn.clicked.connect(self.export_history)
         self.reset_btn = QPushButton("Reset (Demo)")
         bl.addWidget(self.reset_btn)
         self.reset_btn.setStyleSheet("background:#ff5555;color:white;font-weight:bold;")
         self.reset_btn.clicked.connect(self.reset_today_data)
 
 
+    # Change handling
+    def _on_db_change(self, change):
+        if change.kind == "external":
+            self._refresh_profiles()
+            self.refresh_ui()
+            self._refresh_report()
+            return
+        if change.kind == "users":
+            self._refresh_profiles()
+            return
+        if change.user_id != self.db.user_id:
+            return
+        if change.kind == "settings":
+            if change.key == "daily_target_ml":
+                self._refresh_totals()
+                self._refresh_report()
+            elif change.key in ("reminder_enabled", "reminder_minutes"):
+                self._refresh_reminder_settings()
+            return
+        if not change.dates or self._today in change.dates:
+            self._refresh_totals()
+            self._refresh_entries()
+        # the weekly chart and the 30-day average only look back 30 days;
+        # the long-range views cover every day
+        recent = (date.today() - timedelta(days=29)).isoformat()
+        long_range = self.report_window is not None and self.report_window.view != "week"
+        if long_range or not change.dates or any(d >= recent for d in change.dates):
+            self._refresh_report()
+
+    # Profiles
+    def _refresh_profiles(self):
+        self.worker.read("profiles", self._root_db.get_users, callback=self._apply_profiles)
+
+    def _apply_profiles(self, users):
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.clear()
+        for user in users:
+            self.profile_combo.addItem(user["name"], user["id"])
+        self.profile_combo.setCurrentIndex(self.profile_combo.findData(self.db.user_id))
+        self.profile_combo.blockSignals(False)
+        if self.profile_combo.currentIndex() < 0 and self.db is not self._root_db:
+            # the active profile was deleted (possibly by another process)
+            self._set_profile(self._root_db)
+
+    def _on_profile_selected(self, index):
+        user_id = self.profile_combo.itemData(index)
+        if user_id is not None and user_id != self.db.user_id:
+            self.switch_profile(user_id)
+
+    def switch_profile(self, user_id):
+        self.worker.read("profile", self._root_db.for_user, user_id, callback=self._set_profile)
+
+    def _set_profile(self, db):
+        self.db = db
+        if self.report_window is not None:
+            self.report_window.db = db
+        self.profile_combo.setCurrentIndex(self.profile_combo.findData(db.user_id))
+        self.refresh_ui()
+        self._refresh_report()
+
+    def new_profile(self):
+        name, ok = QInputDialog.getText(self, "New Profile", "Profile name:")
+        if ok and name.strip():
+            self.worker.write(self._root_db.create_user, name, callback=self.switch_profile)
+
+    def _refresh_report(self):
+        if self.report_window is not None and self.report_window.isVisible():
+            self.report_window.refresh()
+
+    def _watch_db_files(self):
+        # only SQLite files can be written by another process
+        if not isinstance(self._root_db, Database) or self.db.db_path == ":memory:":
+            return
+        path = os.path.abspath(self.db.db_path)
+        watched = set(self._file_watcher.files()) | set(self._file_watcher.directories())
+        # the -wal file only exists in WAL mode, and comes and goes with
+        # checkpoints; the directory watch notices when it reappears
+        wanted = [path, path + "-wal", os.path.dirname(path)]
+        missing = [p for p in wanted if p not in watched and os.path.exists(p)]
+        if missing:
+            self._file_watcher.addPaths(missing)
+
+    def _on_db_file_changed(self, _path):
+        self._watch_db_files()
+        # our own commits also touch the file; data_version tells them apart
+        self.worker.read("external", self.db.check_external_change)
+
+    def _arm_midnight_timer(self):
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+        self._midnight_timer.start(int((midnight - now).total_seconds() * 1000) + 50)
+
+    def _on_midnight(self):
+        if date.today().isoformat() == self._today:
+            # fired a little early (clock adjustment); try again
+            self._arm_midnight_timer()
+            return
+        self.refresh_ui()
+        self._refresh_report()
+        self._arm_midnight_timer()
+        QTimer.singleShot(MAINTENANCE_DELAY_MS, self._run_maintenance)
+
+    def _run_maintenance(self):
+        if not self.isVisible():
+            return
+        # queued behind any pending writes; a log issued meanwhile waits
+        # for one compaction transaction at most
+        self.worker.write(retention.apply_stored, self._root_db,
+                          callback=lambda _reports: self._seal_archive())
+
+    def _seal_archive(self):
+        # after compaction, which retires an archive covering the days it merged
+        if not self.isVisible():
+            return
+        self.worker.write(self.db.seal_archive, callback=lambda _counts: self._vacuum_step())
+
+    def _vacuum_step(self):
+        if not self.isVisible():
+            return
+        self.worker.write(retention.idle_vacuum, self._root_db, callback=self._vacuumed)
+
+    def _vacuumed(self, freed):
+        if freed:
+            QTimer.singleShot(VACUUM_STEP_INTERVAL_MS, self._vacuum_step)
+
+    @diagnostics.timed("gui.refresh_ui")
     def refresh_ui(self):
-        target = self.db.get_daily_target_ml()
-        today = date.today().isoformat()
-        consumed = self.db.get_intake_for_date(today)
-        remaining = max(0, target - consumed)
+        self._today = date.today().isoformat()
+        self._refresh_totals()
+        self._refresh_entries()
+        self._refresh_reminder_settings()
+
+    def _refresh_totals(self):
+        self.worker.read("totals", self._load_totals, self._today, callback=self._apply_totals)
+
+    def _load_totals(self, day):
+        return self.db.get_daily_target_ml(), self.db.get_intake_for_date(day)
+
+    @diagnostics.timed("gui.apply_totals")
+    def _apply_totals(self, totals):
+        target, consumed = totals
+        self._target, self._consumed = target, consumed
         pct = int(consumed / target * 100) if target > 0 else 0
         self.progress_bar.setFormat("")
 
         # Update visuals
-        self.donut.plot_donut_percent(pct)
+        self.donut.set_percent(pct)
         self.status_label.setText(f"Today: {consumed} / {target} ml")
         self.progress_bar.setValue(pct)
 
+    def _refresh_entries(self):
+        self.worker.read("entries", self.db.get_entries_for_date, self._today,
+                         callback=self.entries_model.sync)
 
-        # Entries
-        self.entries.clear()
-        for e in self.db.get_entries_for_date(today):
-            ts = datetime.fromisoformat(e["timestamp"]).strftime("%H:%M:%S")
-            item = QListWidgetItem(f"{e['id']} — {ts} — {e['amount_ml']} ml")
-            item.setData(Qt.ItemDataRole.UserRole, e["id"])
-            self.entries.addItem(item)
+    def _on_worker_failed(self, key, error):
+        QMessageBox.warning(self, "Database error", f"{key}: {error}")
+
+    # Reminders
+    def _refresh_reminder_settings(self):
+        self.worker.read("reminder", self._load_reminder_settings, callback=self._apply_reminder_settings)
+
+    def _load_reminder_settings(self):
+        return self.db.get_reminder_enabled(), self.db.get_reminder_minutes()
+
+    def _apply_reminder_settings(self, settings):
+        enabled, minutes = settings
+        for widget in (self.reminder_check, self.reminder_spin):
+            widget.blockSignals(True)
+        self.reminder_check.setChecked(enabled)
+        self.reminder_spin.setValue(minutes)
+        self.reminder_spin.setEnabled(enabled)
+        for widget in (self.reminder_check, self.reminder_spin):
+            widget.blockSignals(False)
+
+    def _set_reminder_enabled(self, enabled):
+        self.reminder_spin.setEnabled(enabled)
+        self.worker.write(self.db.set_reminder_enabled, enabled)
+
+    def _set_reminder_minutes(self):
+        self.worker.write(self.db.set_reminder_minutes, self.reminder_spin.value())
+
+    def _show_reminder(self, title, message):
+        if QSystemTrayIcon.isSystemTrayAvailable():
+            if self._tray is None:
+                icon = self.style().standardIcon(QStyle.StandardPixmap.SP_MessageBoxInformation)
+                self._tray = QSystemTrayIcon(icon, self)
+                self._tray.show()
+            self._tray.showMessage(title, message)
+        else:
+            QMessageBox.information(self, title, message)
 
     def set_target(self):
         ml = int(self.target_spin.value())
         if ml <= 0:
             QMessageBox.warning(self, "Invalid", "Target must be positive.")
             return
-        self.db.set_daily_target_ml(ml)
-        QMessageBox.information(self, "Saved", f"Daily target set to {ml} ml")
-        self.refresh_ui()
+        self.worker.write(self.db.set_daily_target_ml, ml,
+                          callback=lambda _: QMessageBox.information(
+                              self, "Saved", f"Daily target set to {ml} ml"))
 
     def log_intake(self):
         amount = self.log_spin.value()
@@ -402,9 +1096,8 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "Invalid", "Enter amount > 0")
             return
 
-        target = self.db.get_daily_target_ml()
-        today = date.today().isoformat()
-        consumed = self.db.get_intake_for_date(today)
+        target = self._target
+        consumed = self._consumed + self._pending_ml
 
         # Check if adding would exceed daily target
         if consumed + amount > target:
@@ -436,43 +1129,83 @@ class MainWindow(QWidget):
             return  # stop — don’t log beyond target
 
         # Otherwise log intake
-        self.db.log_intake(amount)
+        self._pending_ml += amount
+        user_id = self.db.user_id
+        self.worker.write(self.db.log_intake, amount,
+                          callback=lambda _id: self._logged(amount, user_id))
         self.log_spin.setValue(250)  # reset spin
-        self.refresh_ui()
 
-    def export_txt(self):
-        path = "water_history.txt"  # You can change this to any path or make it dynamic
-        try:
-            with open(path, "w", encoding="utf-8") as f:
-                f.write("Water Intake History\n")
-                f.write("=====================\n\n")
-                for dt, total in self.db.get_history(3650):
-                    f.write(f"{dt}: {total} ml\n")
-            QMessageBox.information(self, "Exported", f"History exported to:\n{path}")
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Export failed: {e}")
+    def _logged(self, amount, user_id):
+        # counted as consumed until the totals refresh this write triggered lands
+        self._pending_ml -= amount
+        if user_id == self.db.user_id:
+            self._consumed += amount
+
+    def export_history(self):
+        dialog = ExportDialog(self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        fmt, ext, granularity, start, end = dialog.options()
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export History", f"water_history.{ext}", f"*.{ext};;All files (*)"
+        )
+        if not path:
+            return
+
+        progress = QProgressDialog("Exporting history…", "Cancel", 0, 100, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(300)
+        worker = ExportThread(self.db, path, fmt, granularity, start, end, parent=self)
+        progress.canceled.connect(worker.cancel)
+        worker.progress.connect(
+            lambda done, total: progress.setValue(int(done * 100 / total) if total else 100)
+        )
+
+        def finished_ok(count):
+            progress.reset()
+            QMessageBox.information(self, "Exported", f"{count} rows exported to:\n{path}")
+
+        def finished_err(message):
+            progress.reset()
+            if message:
+                QMessageBox.warning(self, "Error", f"Export failed: {message}")
+
+        worker.succeeded.connect(finished_ok)
+        worker.failed.connect(finished_err)
+        worker.finished.connect(worker.deleteLater)
+        self._export_worker = worker
+        worker.start()
 
     # Context menu for entries
     def _show_entry_menu(self, pos):
-        item = self.entries.itemAt(pos)
-        if not item:
+        index = self.entries.indexAt(pos)
+        if not index.isValid():
             return
-        entry_id = item.data(Qt.ItemDataRole.UserRole)
+        entry_id = index.data(Qt.ItemDataRole.UserRole)
         menu = QMenu(self)
         del_action = menu.addAction("Delete entry")
         act = menu.exec(self.entries.mapToGlobal(pos))
         if act == del_action:
-            self.db.delete_entry(entry_id)
-            self.refresh_ui()
+            self.worker.write(self.db.delete_entry, entry_id)
 
     def open_report_window(self):
         if not self.report_window:
-            self.report_window = ReportWindow(self.db, parent=self)
+            self.report_window = ReportWindow(self.db, parent=self, worker=self.worker)
         self.report_window.refresh()
         self.report_window.show()
         self.report_window.raise_()
         self.report_window.activateWindow()
 
+    def open_diagnostics(self):
+        if not self.diagnostics_window:
+            self.diagnostics_window = DiagnosticsDialog(self._root_db, parent=self)
+        self.diagnostics_window.show()
+        self.diagnostics_window.raise_()
+        self.diagnostics_window.activateWindow()
+
     def closeEvent(self, event):
-        self.db.close()
+        self.reminders.stop()
+        self.db.remove_listener(self._db_listener)
+        self.worker.shutdown()
+        self._root_db.close()
         event.accept()
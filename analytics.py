@@ -0,0 +1,288 @@
+# analytics.py
+"""
+NumPy analytics over a profile's whole intake history: zero-filled daily
+series, rolling averages, monthly and yearly totals, goal streaks and an
+hour-of-day heatmap.
+
+Entries are loaded with one query (Database.packed_entry_chunks; sealed
+days come straight from the archive's mapped column) into contiguous
+arrays and reduced to a daily series; everything else is
+computed from those arrays. Both are cached until Database.data_version()
+changes, so repeated report refreshes cost a PRAGMA and some vector math.
+When the Database's change events say which days a write touched, only
+entries from the earliest such day on are reloaded.
+"""
+
+import threading
+from datetime import date
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+PERIOD_MONTH = "month"
+PERIOD_YEAR = "year"
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def epoch_day(d: date) -> int:
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+def to_date(day: int) -> date:
+    return date.fromordinal(int(day) + _EPOCH_ORDINAL)
+
+
+class IntakeArrays(NamedTuple):
+    """Column arrays for one profile; days/totals cover first entry .. today."""
+    entry_day: np.ndarray    # int32 epoch day per entry
+    entry_hour: np.ndarray   # int8 local hour per entry
+    entry_amount: np.ndarray  # int32 ml per entry
+    days: np.ndarray         # int32 epoch day, contiguous
+    totals: np.ndarray       # int64 ml per day, zero-filled
+
+
+class Streaks(NamedTuple):
+    current: int       # consecutive hit days ending today (or yesterday, while today is open)
+    longest: int
+    longest_end: Optional[date]
+    hit_days: int
+    days: int          # days considered, first entry .. today
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hit_days / self.days if self.days else 0.0
+
+
+def unpack_entries(packed) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split Database.packed_entries() output into day, hour and amount arrays."""
+    packed = np.asarray(packed, dtype=np.int64)
+    return ((packed >> 37).astype(np.int32),
+            ((packed >> 32) & 0x1F).astype(np.int8),
+            (packed & 0xFFFFFFFF).astype(np.int32))
+
+
+def load_packed(db, start: Optional[str] = None) -> np.ndarray:
+    """db.packed_entries(start) as one int64 array, without per-entry Python ints for archived days."""
+    chunks = [np.asarray(c, dtype=np.int64) for c in db.packed_entry_chunks(start=start)]
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def build_arrays(entry_day: np.ndarray, entry_hour: np.ndarray, entry_amount: np.ndarray,
+                 today: Optional[date] = None) -> IntakeArrays:
+    last = epoch_day(today or date.today())
+    if not len(entry_day):
+        empty = np.zeros(0, dtype=np.int32)
+        return IntakeArrays(empty, empty.astype(np.int8), empty,
+                            np.array([last], dtype=np.int32), np.zeros(1, dtype=np.int64))
+    first = int(entry_day[0])
+    last = max(last, int(entry_day[-1]))
+    days = np.arange(first, last + 1, dtype=np.int32)
+    totals = np.bincount(entry_day - first, weights=entry_amount,
+                         minlength=len(days)).astype(np.int64)
+    return IntakeArrays(entry_day, entry_hour, entry_amount, days, totals)
+
+
+def load_arrays(db, today: Optional[date] = None) -> IntakeArrays:
+    return build_arrays(*unpack_entries(load_packed(db)), today=today)
+
+
+def rolling_mean(totals: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` days; the first days average what exists."""
+    csum = np.concatenate(([0], np.cumsum(totals, dtype=np.float64)))
+    idx = np.arange(1, len(totals) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (csum[idx] - csum[lo]) / (idx - lo)
+
+
+def period_totals(days: np.ndarray, totals: np.ndarray, period: str
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (period starts as datetime64, total ml, mean ml per calendar day) for
+    each month or year touched by days.
+    """
+    unit = {PERIOD_MONTH: "M", PERIOD_YEAR: "Y"}.get(period)
+    if unit is None:
+        raise ValueError(f"Unknown period: {period!r}")
+    buckets = days.astype("datetime64[D]").astype(f"datetime64[{unit}]")
+    index = (buckets - buckets[0]).astype(np.int64)
+    sums = np.bincount(index, weights=totals)
+    counts = np.bincount(index)
+    starts = buckets[0] + np.arange(len(sums))
+    present = counts > 0
+    return starts[present], sums[present].astype(np.int64), sums[present] / counts[present]
+
+
+def streaks(totals: np.ndarray, target: int) -> Streaks:
+    hit = totals >= target
+    n = len(hit)
+    # today still counts as open: a streak through yesterday is current
+    tail = hit if (n and hit[-1]) else hit[:-1]
+    misses = np.flatnonzero(~tail)
+    current = len(tail) - (misses[-1] + 1 if len(misses) else 0)
+
+    padded = np.concatenate(([False], hit, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    longest, longest_end = 0, None
+    if len(starts):
+        lengths = ends - starts
+        best = int(np.argmax(lengths))
+        longest, longest_end = int(lengths[best]), int(ends[best] - 1)
+    return Streaks(int(current), longest, longest_end, int(hit.sum()), n)
+
+
+def hour_heatmap(entry_day: np.ndarray, entry_hour: np.ndarray,
+                 entry_amount: np.ndarray) -> np.ndarray:
+    """7 x 24 matrix of ml logged per weekday (Monday = 0) and hour."""
+    weekday = (entry_day.astype(np.int64) + 3) % 7   # 1970-01-01 was a Thursday
+    cell = weekday * 24 + np.clip(entry_hour, 0, 23)
+    return np.bincount(cell, weights=entry_amount, minlength=7 * 24).reshape(7, 24).astype(np.int64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of n_out points
+    that keep the visual shape of (x, y). The first and last points are
+    always kept; every bucket in between contributes the point forming
+    the largest triangle with the previous pick and the next bucket's mean.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+class Analytics:
+    """
+    Cached analytics for one Database (profile). Safe to call from worker
+    threads; results are recomputed only after the data version changes.
+    Call close() to stop listening for changes.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._key = None
+        self._arrays: Optional[IntakeArrays] = None
+        self._results: Dict[tuple, object] = {}
+        # what changed since the last load, from the change events
+        self._dirty_dates = set()
+        self._dirty_all = False
+        self._notified = False
+        db.add_listener(self._on_change)
+
+    def close(self):
+        self.db.remove_listener(self._on_change)
+
+    def _on_change(self, change):
+        with self._lock:
+            self._notified = True
+            if change.kind == "external":
+                self._dirty_all = True
+            elif change.user_id == self.db.user_id and change.kind in ("intake", "users"):
+                if change.dates:
+                    self._dirty_dates.update(change.dates)
+                else:
+                    self._dirty_all = True
+
+    def arrays(self) -> IntakeArrays:
+        # _lock is also taken by _on_change, which runs on the writing
+        # thread with the pool's write lock held, so no query may run
+        # under it; _load_lock serializes the loads instead
+        with self._load_lock:
+            today = date.today()
+            key = (self.db.user_id, self.db.data_version(), today)
+            with self._lock:
+                if key == self._key:
+                    return self._arrays
+                arrays, previous = self._arrays, self._key
+                dirty_dates, dirty_all, notified = self._dirty_dates, self._dirty_all, self._notified
+                self._dirty_dates = set()
+                self._dirty_all = self._notified = False
+            if arrays is None or not notified or dirty_all:
+                # nothing to go on (e.g. a bulk load that skips change events)
+                arrays = load_arrays(self.db, today)
+            elif dirty_dates or today != previous[2]:
+                arrays = self._reload_since(arrays, min(dirty_dates, default=None), today)
+            with self._lock:
+                self._arrays, self._key, self._results = arrays, key, {}
+            return arrays
+
+    def _reload_since(self, a: IntakeArrays, first_dirty: Optional[str], today: date) -> IntakeArrays:
+        if first_dirty is None:
+            # only the day rolled over: extend the zero-filled series
+            return build_arrays(a.entry_day, a.entry_hour, a.entry_amount, today)
+        cut = np.searchsorted(a.entry_day, epoch_day(date.fromisoformat(first_dirty)))
+        day, hour, amount = unpack_entries(load_packed(self.db, first_dirty))
+        return build_arrays(np.concatenate((a.entry_day[:cut], day)),
+                            np.concatenate((a.entry_hour[:cut], hour)),
+                            np.concatenate((a.entry_amount[:cut], amount)), today)
+
+    def _cached(self, name: tuple, compute):
+        arrays = self.arrays()
+        with self._lock:
+            if name not in self._results:
+                self._results[name] = compute(arrays)
+            return self._results[name]
+
+    def daily(self, last_days: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(epoch days, totals), zero-filled through today; optionally only the last N days."""
+        a = self.arrays()
+        if last_days is None or last_days >= len(a.days):
+            return a.days, a.totals
+        return a.days[-last_days:], a.totals[-last_days:]
+
+    def rolling_average(self, window: int) -> np.ndarray:
+        return self._cached(("rolling", window), lambda a: rolling_mean(a.totals, window))
+
+    def periods(self, period: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self._cached(("period", period), lambda a: period_totals(a.days, a.totals, period))
+
+    def streaks(self, target: Optional[int] = None) -> Streaks:
+        target = self.db.get_daily_target_ml() if target is None else int(target)
+
+        def compute(a):
+            s = streaks(a.totals, target)
+            end = None if s.longest_end is None else to_date(a.days[s.longest_end])
+            return s._replace(longest_end=end)
+        return self._cached(("streaks", target), compute)
+
+    def hour_heatmap(self) -> np.ndarray:
+        return self._cached(("heatmap",), lambda a: hour_heatmap(
+            a.entry_day, a.entry_hour, a.entry_amount))
+
+    def summary(self, target: Optional[int] = None) -> Dict[str, object]:
+        """Headline numbers for the report window."""
+        target = self.db.get_daily_target_ml() if target is None else int(target)
+        a = self.arrays()
+        s = self.streaks(target)
+        avg7, avg30 = self.rolling_average(7), self.rolling_average(30)
+        return {
+            "target": target,
+            "avg_7": float(avg7[-1]),
+            "avg_30": float(avg30[-1]),
+            "current_streak": s.current,
+            "longest_streak": s.longest,
+            "longest_streak_end": s.longest_end,
+            "hit_rate": s.hit_rate,
+            "days_tracked": len(a.days),
+            "total_ml": int(a.totals.sum()),
+        }
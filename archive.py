@@ -0,0 +1,184 @@
+# archive.py
+"""
+Columnar archive of a profile's closed days.
+
+Database.seal_archive() writes every entry dated up to a cut-off day
+(normally yesterday) into one binary file of fixed-width columns, and the
+long-range reads (get_history, totals_between, count_*, iter_daily_totals,
+packed_entries) then take those days from the file and only the days
+after the cut-off from SQLite. The file is memory-mapped and the columns
+are exposed as memoryviews (or NumPy arrays via array()), so a full
+history scan touches no per-row Python objects.
+
+File layout (native byte order, recorded in the header; every column
+starts on an 8-byte boundary):
+
+    header    magic, format version, byte order, user id, cut-off epoch
+              day, generation, day count, entry count
+    per day   day (int32 epoch day), total_ml (int64), entries (int64),
+              offsets (int64, one more than days: entry range of each day)
+    per entry ts_ms (int64, 0 if unknown), packed (int64, the
+              Database.packed_entries encoding), weight (int32, entries a
+              compacted row stands for)
+
+An archive is only used while its cut-off and generation match the
+database's archive_seal row; see database.py for how writes to sealed
+days bump the generation. Files are never rewritten in place: each seal
+gets a new name, so a mapping held by a reader stays valid.
+
+Standard library only; NumPy is imported by array() on first use.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array as _array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"WIAR"
+FORMAT_VERSION = 1
+SUFFIX = ".archive"
+
+_HEADER = struct.Struct("<4sHHqqqqq")
+_BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# (name, array typecode); day columns have one value per day except
+# offsets, which has one more
+DAY_COLUMNS = (("day", "i"), ("total_ml", "q"), ("entries", "q"), ("offsets", "q"))
+ENTRY_COLUMNS = (("ts_ms", "q"), ("packed", "q"), ("weight", "i"))
+
+
+def epoch_day(date_str: str) -> int:
+    return date.fromisoformat(date_str).toordinal() - _EPOCH_ORDINAL
+
+
+def day_to_iso(day: int) -> str:
+    return date.fromordinal(day + _EPOCH_ORDINAL).isoformat()
+
+
+def archive_name(db_path: str, user_id: int, through: str, generation: int) -> str:
+    """File name of one seal; unique per content, next to the database."""
+    return f"{db_path}.u{int(user_id)}.{through}.g{int(generation)}{SUFFIX}"
+
+
+def _layout(n_days: int, n_entries: int) -> List[Tuple[str, str, int, int]]:
+    """(name, typecode, offset, count) of every column."""
+    out, offset = [], _HEADER.size
+    for name, code in DAY_COLUMNS + ENTRY_COLUMNS:
+        offset = (offset + 7) & ~7
+        count = n_entries if (name, code) in ENTRY_COLUMNS else n_days + (name == "offsets")
+        out.append((name, code, offset, count))
+        offset += count * _array(code).itemsize
+    return out
+
+
+class Archive:
+    """A sealed archive file, memory-mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, order, self.user_id, self.through_day, self.generation,
+             n_days, n_entries) = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != FORMAT_VERSION or order != _BYTE_ORDER:
+                raise ValueError(f"{path}: not a version {FORMAT_VERSION} archive for this platform")
+            layout = _layout(n_days, n_entries)
+            name, code, offset, count = layout[-1]
+            if len(self._mm) < offset + count * _array(code).itemsize:
+                raise ValueError(f"{path}: truncated archive")
+        except Exception:
+            self._mm.close()
+            raise
+        self.through = day_to_iso(self.through_day)
+        self.n_days, self.n_entries = n_days, n_entries
+        self._layout = {name: (code, offset, count) for name, code, offset, count in layout}
+        whole = memoryview(self._mm)
+        self._columns: Dict[str, memoryview] = {
+            name: whole[offset:offset + count * _array(code).itemsize].cast(code)
+            for name, code, offset, count in layout
+        }
+        self._dates: Optional[List[str]] = None
+
+    def column(self, name: str) -> memoryview:
+        """Zero-copy view of one column (see DAY_COLUMNS / ENTRY_COLUMNS)."""
+        return self._columns[name]
+
+    def array(self, name: str):
+        """The column as a read-only NumPy array over the mapping."""
+        import numpy as np
+        code, offset, count = self._layout[name]
+        return np.frombuffer(self._mm, dtype=np.dtype(code), count=count, offset=offset)
+
+    @property
+    def dates(self) -> List[str]:
+        """'YYYY-MM-DD' of every archived day, oldest first."""
+        if self._dates is None:
+            self._dates = [day_to_iso(d) for d in self._columns["day"]]
+        return self._dates
+
+    def day_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Tuple[int, int]:
+        """Index range [lo, hi) of the archived days between start and end inclusive."""
+        days = self._columns["day"]
+        lo = bisect_left(days, epoch_day(start)) if start else 0
+        hi = bisect_right(days, epoch_day(end)) if end else len(days)
+        return lo, max(lo, hi)
+
+    def entry_range(self, lo: int, hi: int) -> Tuple[int, int]:
+        """Index range of the entries of days [lo, hi)."""
+        offsets = self._columns["offsets"]
+        return offsets[lo], offsets[hi]
+
+    def close(self):
+        """Unmap the file; fails quietly while views of it are still in use."""
+        for view in self._columns.values():
+            view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+
+def write_archive(path: str, user_id: int, through: str, generation: int,
+                  rows: Iterable[Tuple[str, Optional[int], int, int, int]]) -> Tuple[int, int]:
+    """
+    Write an archive from rows of (date, ts_ms, packed, amount_ml, entries)
+    in chronological order. The file appears under path only once it is
+    complete. Returns (days, entries) written.
+    """
+    cols = {name: _array(code) for name, code in DAY_COLUMNS + ENTRY_COLUMNS}
+    cols["offsets"].append(0)
+    last = None
+    for date_str, ts_ms, packed, amount_ml, entries in rows:
+        if date_str != last:
+            if last is not None:
+                cols["offsets"].append(len(cols["packed"]))
+            cols["day"].append(epoch_day(date_str))
+            cols["total_ml"].append(0)
+            cols["entries"].append(0)
+            last = date_str
+        cols["total_ml"][-1] += amount_ml
+        cols["entries"][-1] += entries
+        cols["ts_ms"].append(ts_ms or 0)
+        cols["packed"].append(packed)
+        cols["weight"].append(entries)
+    if last is not None:
+        cols["offsets"].append(len(cols["packed"]))
+    n_days, n_entries = len(cols["day"]), len(cols["packed"])
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _BYTE_ORDER, int(user_id), epoch_day(through),
+                             int(generation), n_days, n_entries))
+        for name, code, offset, count in _layout(n_days, n_entries):
+            f.write(b"\0" * (offset - f.tell()))
+            cols[name].tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return n_days, n_entries
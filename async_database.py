@@ -0,0 +1,306 @@
+# async_database.py
+"""
+asyncio front end for Database, for embedding the tracker storage in
+async services. Every Database call runs on a dedicated executor so the
+event loop never blocks on SQLite: writes on a single thread (they are
+serialized by the connection pool anyway), reads on a small thread pool
+matching the pool's reader connections.
+
+Cancelling an awaiting task stops the wait; a statement that has already
+started still runs to completion. Streams and exports stop at the next
+batch boundary.
+"""
+
+import asyncio
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database import Database, DB_FILE, DURABILITY_NORMAL
+from storage import COMPACT_DAY, Change, IntakeItem
+
+_STREAM_END = object()
+
+
+class AsyncDatabase:
+    def __init__(self, db_path: str = DB_FILE, durability: str = DURABILITY_NORMAL,
+                 group_commit_ms: int = 0, readers: int = 4, db: Optional[Database] = None):
+        """
+        Wraps an existing Database when db is given, otherwise opens one
+        (WAL by default, so readers never wait on the writer).
+        """
+        self.db = db or Database(db_path, durability=durability,
+                                 group_commit_ms=group_commit_ms, max_readers=readers)
+        self._owns_db = db is None
+        self._owns_executors = True
+        self._read_executor = ThreadPoolExecutor(max_workers=readers,
+                                                 thread_name_prefix="water-db-read")
+        self._write_executor = ThreadPoolExecutor(max_workers=1,
+                                                  thread_name_prefix="water-db-write")
+
+    async def _read(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._read_executor, fn, *args)
+
+    async def _write(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._write_executor, fn, *args)
+
+    # Profiles
+    def for_user(self, user_id: int) -> "AsyncDatabase":
+        """
+        An AsyncDatabase over Database.for_user(user_id), sharing this one's
+        executors; closing it leaves them and the connections running.
+        """
+        view = copy.copy(self)
+        view.db = self.db.for_user(user_id)
+        view._owns_db = False
+        view._owns_executors = False
+        return view
+
+    async def create_user(self, name: str) -> int:
+        return await self._write(self.db.create_user, name)
+
+    async def rename_user(self, user_id: int, name: str):
+        await self._write(self.db.rename_user, user_id, name)
+
+    async def delete_user(self, user_id: int):
+        await self._write(self.db.delete_user, user_id)
+
+    async def get_user(self, user_id: int):
+        return await self._read(self.db.get_user, user_id)
+
+    async def get_user_by_name(self, name: str):
+        return await self._read(self.db.get_user_by_name, name)
+
+    async def get_users(self) -> List:
+        return await self._read(self.db.get_users)
+
+    async def get_user_totals_for_date(self, dt: str) -> List[Tuple[int, str, int]]:
+        return await self._read(self.db.get_user_totals_for_date, dt)
+
+    # Settings
+    async def set_setting(self, key: str, value: str):
+        await self._write(self.db.set_setting, key, value)
+
+    async def get_setting(self, key: str) -> Optional[str]:
+        return await self._read(self.db.get_setting, key)
+
+    async def set_daily_target_ml(self, ml: int):
+        await self._write(self.db.set_daily_target_ml, ml)
+
+    async def get_daily_target_ml(self) -> int:
+        return await self._read(self.db.get_daily_target_ml)
+
+    async def set_reminder_enabled(self, enabled: bool):
+        await self._write(self.db.set_reminder_enabled, enabled)
+
+    async def get_reminder_enabled(self) -> bool:
+        return await self._read(self.db.get_reminder_enabled)
+
+    async def set_reminder_minutes(self, minutes: int):
+        await self._write(self.db.set_reminder_minutes, minutes)
+
+    async def get_reminder_minutes(self) -> int:
+        return await self._read(self.db.get_reminder_minutes)
+
+    async def set_retention_days(self, days: int):
+        await self._write(self.db.set_retention_days, days)
+
+    async def get_retention_days(self) -> int:
+        return await self._read(self.db.get_retention_days)
+
+    async def set_retention_granularity(self, granularity: str):
+        await self._write(self.db.set_retention_granularity, granularity)
+
+    async def get_retention_granularity(self) -> str:
+        return await self._read(self.db.get_retention_granularity)
+
+    # Intake logging and edits
+    async def log_intake(self, amount_ml: int, ts: Optional[datetime] = None) -> int:
+        return await self._write(self.db.log_intake, amount_ml, ts)
+
+    async def log_intakes(self, entries: Iterable[IntakeItem],
+                          update_totals: bool = True) -> int:
+        return await self._write(self.db.log_intakes, list(entries), update_totals)
+
+    async def update_entry_amount(self, entry_id: int, amount_ml: int):
+        await self._write(self.db.update_entry_amount, entry_id, amount_ml)
+
+    async def update_entry_timestamp(self, entry_id: int, timestamp_iso: str):
+        await self._write(self.db.update_entry_timestamp, entry_id, timestamp_iso)
+
+    async def delete_entry(self, entry_id: int):
+        await self._write(self.db.delete_entry, entry_id)
+
+    async def clear_entries_for_date(self, date_str: str):
+        await self._write(self.db.clear_entries_for_date, date_str)
+
+    async def rebuild_daily_totals(self, dates: Optional[Iterable[str]] = None):
+        await self._write(self.db.rebuild_daily_totals, None if dates is None else list(dates))
+
+    # Queries
+    async def get_intake_for_date(self, dt: str) -> int:
+        return await self._read(self.db.get_intake_for_date, dt)
+
+    async def get_entries_for_date(self, dt: str) -> List:
+        return await self._read(self.db.get_entries_for_date, dt)
+
+    async def get_entry_by_id(self, entry_id: int):
+        return await self._read(self.db.get_entry_by_id, entry_id)
+
+    async def get_history(self, limit: int = 14) -> List[Tuple[str, int]]:
+        return await self._read(self.db.get_history, limit)
+
+    async def totals_between(self, start: str, end: str) -> List[Tuple[str, int]]:
+        return await self._read(self.db.totals_between, start, end)
+
+    async def count_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        return await self._read(self.db.count_entries, start, end)
+
+    async def count_days(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        return await self._read(self.db.count_days, start, end)
+
+    async def packed_entries(self, start: Optional[str] = None, end: Optional[str] = None
+                             ) -> List[int]:
+        return await self._read(self.db.packed_entries, start, end)
+
+    async def packed_entry_chunks(self, start: Optional[str] = None, end: Optional[str] = None
+                                  ) -> List[Sequence[int]]:
+        return await self._read(self.db.packed_entry_chunks, start, end)
+
+    async def existing_intake_keys(self, start_ms: int, end_ms: int) -> set:
+        return await self._read(self.db.existing_intake_keys, start_ms, end_ms)
+
+    # Change notification
+    def add_listener(self, callback: Callable[[Change], None]):
+        """Database.add_listener(); callbacks run on the write executor's thread."""
+        self.db.add_listener(callback)
+
+    def remove_listener(self, callback: Callable[[Change], None]):
+        self.db.remove_listener(callback)
+
+    async def check_external_change(self) -> bool:
+        return await self._read(self.db.check_external_change)
+
+    async def data_version(self) -> Tuple[int, int]:
+        return await self._read(self.db.data_version)
+
+    async def schema_version(self) -> int:
+        return await self._read(self.db.schema_version)
+
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]):
+        self.db.set_trace_callback(callback)
+
+    # Retention and maintenance
+    async def compact_entries(self, before: str, granularity: str = COMPACT_DAY) -> Tuple[int, int]:
+        return await self._write(self.db.compact_entries, before, granularity)
+
+    async def seal_archive(self, through: Optional[str] = None) -> Tuple[int, int]:
+        return await self._write(self.db.seal_archive, through)
+
+    async def file_stats(self) -> Dict[str, int]:
+        return await self._read(self.db.file_stats)
+
+    async def enable_incremental_vacuum(self) -> bool:
+        return await self._write(self.db.enable_incremental_vacuum)
+
+    async def incremental_vacuum(self, max_pages: int = 0) -> int:
+        return await self._write(self.db.incremental_vacuum, max_pages)
+
+    # Streaming
+    def iter_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                     batch_size: int = 5000, prefetch: int = 2) -> AsyncIterator[List]:
+        """Async iterator over batches of intake rows (see Database.iter_entries)."""
+        return self._stream(lambda: self.db.iter_entries(start, end, batch_size), prefetch)
+
+    def iter_daily_totals(self, start: Optional[str] = None, end: Optional[str] = None,
+                          batch_size: int = 5000, descending: bool = False,
+                          prefetch: int = 2) -> AsyncIterator[List]:
+        return self._stream(
+            lambda: self.db.iter_daily_totals(start, end, batch_size, descending), prefetch
+        )
+
+    async def _stream(self, make_batches: Callable, prefetch: int) -> AsyncIterator[List]:
+        # One producer thread owns the cursor for the whole stream (reader
+        # connections are checked out per thread); a bounded queue keeps it
+        # at most `prefetch` batches ahead of the consumer.
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, prefetch))
+        stop = threading.Event()
+
+        def produce():
+            batches = make_batches()
+            try:
+                for rows in batches:
+                    if stop.is_set():
+                        break
+                    asyncio.run_coroutine_threadsafe(queue.put(rows), loop).result()
+            except BaseException as e:
+                if not stop.is_set():
+                    asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+                return
+            finally:
+                batches.close()
+            if not stop.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(_STREAM_END), loop).result()
+
+        producer = loop.run_in_executor(self._read_executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # unblock a producer waiting on a full queue
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.shield(producer)
+
+    # Export / import
+    async def export(self, path: str, progress: Optional[Callable[[int, int], None]] = None,
+                     **options) -> int:
+        """exporter.export() on the read executor; cancelling the task stops it."""
+        import exporter
+        cancel = threading.Event()
+        try:
+            return await self._read(
+                lambda: exporter.export(self.db, path, progress=progress,
+                                        cancelled=cancel.is_set, **options)
+            )
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    async def export_history_txt(self, file_path: str) -> bool:
+        return await self._read(self.db.export_history_txt, file_path)
+
+    async def import_file(self, path: str, **options):
+        import importer
+        return await self._write(lambda: importer.import_file(self.db, path, **options))
+
+    # Lifecycle
+    async def flush(self):
+        await self._write(self.db.flush)
+
+    async def close(self):
+        # waiting for the executors and closing SQLite both block, so they
+        # run on a thread of their own rather than on the event loop
+        await asyncio.to_thread(self._close)
+
+    def _close(self):
+        if self._owns_executors:
+            self._read_executor.shutdown(wait=True)
+            self._write_executor.shutdown(wait=True)
+        if self._owns_db:
+            self.db.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
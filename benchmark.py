@@ -0,0 +1,581 @@
+# benchmark.py
+"""
+Benchmark harness for the Database layer.
+
+Generates synthetic intake histories, times the main Database operations
+against them and writes the results as JSON. A previous results file can
+be passed with --compare to flag regressions.
+
+    python benchmark.py --sizes 10k,1M --out bench.json
+    python benchmark.py --sizes 10k,1M --compare bench.json
+    python benchmark.py --sizes 10k --backends
+
+--backends times the storage backends' reads and writes side by side
+(tests/test_backends.py checks that they all behave like SQLite).
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from database import Database, DURABILITY_NORMAL
+from log_database import LogDatabase
+from memory_database import MemoryDatabase
+from storage import Storage
+import analytics
+import exporter
+import reminders
+
+# Relative weight of drinking in each hour of the day: nothing overnight,
+# a morning peak, lunch, and a tail into the evening.
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 6, 9, 7, 5, 5, 8, 7, 5, 5, 6, 6, 5, 4, 3, 2, 1, 0]
+AMOUNTS = [150, 200, 250, 330, 500, 750]
+AMOUNT_WEIGHTS = [10, 25, 35, 15, 12, 3]
+# Histories are spread over about ten years; bigger datasets get more
+# entries per day (think shared office dispensers) rather than more days.
+HISTORY_DAYS = 3650
+MIN_ENTRIES_PER_DAY = 8
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def size_label(n: int) -> str:
+    if n >= 1_000_000 and n % 1_000_000 == 0:
+        return f"{n // 1_000_000}M"
+    if n >= 1_000 and n % 1_000 == 0:
+        return f"{n // 1_000}k"
+    return str(n)
+
+
+# ---------- Synthetic data ----------
+def generate_history(n_entries: int, seed: int = 42,
+                     end: date = None) -> Iterator[Tuple[int, datetime]]:
+    """Yields (amount_ml, timestamp) pairs in chronological order."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    per_day = max(MIN_ENTRIES_PER_DAY, -(-n_entries // HISTORY_DAYS))
+    days = -(-n_entries // per_day)
+    first = end - timedelta(days=days - 1)
+    hours = range(24)
+    remaining = n_entries
+    for offset in range(days):
+        day = datetime.combine(first + timedelta(days=offset), datetime.min.time())
+        count = min(remaining, per_day)
+        # a little day-to-day variation, but keep the overall total exact
+        picks = sorted(
+            (h * 3600 + rng.randrange(3600))
+            for h in rng.choices(hours, weights=HOUR_WEIGHTS, k=count)
+        )
+        amounts = rng.choices(AMOUNTS, weights=AMOUNT_WEIGHTS, k=count)
+        for seconds, amount in zip(picks, amounts):
+            yield amount, day + timedelta(seconds=seconds)
+        remaining -= count
+
+
+def build_dataset(path: str, n_entries: int, seed: int = 42, users: int = 1) -> float:
+    """Spreads n_entries evenly over `users` profiles, each with its own seed."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    started = time.perf_counter()
+    db = Database(path, durability=DURABILITY_NORMAL)
+    batch: List[Tuple[int, datetime]] = []
+    for u in range(users):
+        profile = db if u == 0 else db.for_user(db.create_user(f"user{u:05d}"))
+        share = n_entries // users + (1 if u < n_entries % users else 0)
+        for entry in generate_history(share, seed + u):
+            batch.append(entry)
+            if len(batch) >= 100_000:
+                profile.log_intakes(batch, update_totals=False)
+                batch.clear()
+        profile.log_intakes(batch, update_totals=False)
+        batch.clear()
+        profile.rebuild_daily_totals()
+    # fold the WAL back so every run starts from the same file layout
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close()
+    return time.perf_counter() - started
+
+
+# ---------- Timing ----------
+def time_calls(fn: Callable, args_list: List[tuple]) -> Dict[str, float]:
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "calls": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "min_ms": samples[0] * 1000,
+    }
+
+
+def peak_kb(fn: Callable[[], object]) -> float:
+    """Peak Python/NumPy heap allocated while fn runs (mapped files are not counted)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_long_range(db: Database, suffix: str = "") -> Dict[str, Dict]:
+    """Multi-year reads and full-history scans; peak_kb is the scans' heap high-water mark."""
+    today = date.today()
+    results = {
+        "get_history_3650": time_calls(db.get_history, [(3650,)] * 20),
+        "totals_between_3650": time_calls(
+            db.totals_between, [((today - timedelta(days=3649)).isoformat(), today.isoformat())] * 20),
+        "packed_entries_all": time_calls(db.packed_entries, [()] * 3),
+        "load_packed_all": time_calls(analytics.load_packed, [(db,)] * 3),
+    }
+    results["packed_entries_all"]["peak_kb"] = peak_kb(db.packed_entries)
+    results["load_packed_all"]["peak_kb"] = peak_kb(lambda: analytics.load_packed(db))
+    return {op + suffix: stats for op, stats in results.items()}
+
+
+def run_size(n_entries: int, workdir: str, seed: int, keep_data: bool,
+             users: int = 1) -> Dict[str, Dict]:
+    label = size_label(n_entries)
+    name = f"bench_{label}_{seed}" + (f"_u{users}" if users > 1 else "")
+    pristine = os.path.join(workdir, f"{name}.db")
+    results: Dict[str, Dict] = {}
+    if not (keep_data and os.path.exists(pristine)):
+        print(f"[{label}] generating {n_entries:,} entries for {users:,} profile(s)…", file=sys.stderr)
+        results["generate"] = {
+            "calls": 1, "mean_ms": build_dataset(pristine, n_entries, seed, users) * 1000
+        }
+    path = os.path.join(workdir, f"{name}.work.db")
+    shutil.copyfile(pristine, path)
+
+    root = Database(path, durability=DURABILITY_NORMAL)
+    rng = random.Random(seed)
+    # with several profiles, every op runs against one picked at random
+    db = root.for_user(rng.choice([u["id"] for u in root.get_users()])) if users > 1 else root
+    days = [d for d, _ in db.get_history(HISTORY_DAYS * 2)]
+    sample_days = [(rng.choice(days),) for _ in range(500)]
+    print(f"[{label}] timing reads over {len(days):,} days…", file=sys.stderr)
+
+    results["get_intake_for_date"] = time_calls(db.get_intake_for_date, sample_days)
+    results["get_entries_for_date"] = time_calls(db.get_entries_for_date, sample_days[:200])
+    results["get_history_7"] = time_calls(db.get_history, [(7,)] * 200)
+    today = date.today()
+    results["totals_between_7"] = time_calls(
+        db.totals_between, [((today - timedelta(days=6)).isoformat(), today.isoformat())] * 200)
+    results.update(run_long_range(db))
+    export_path = os.path.join(workdir, f"bench_{label}.export")
+    results["export_days_csv"] = time_calls(
+        lambda: exporter.export(db, export_path, fmt=exporter.FORMAT_CSV,
+                                granularity=exporter.GRANULARITY_DAY), [()] * 10)
+    results["export_entries_csv"] = time_calls(
+        lambda: exporter.export(db, export_path, fmt=exporter.FORMAT_CSV,
+                                granularity=exporter.GRANULARITY_ENTRY),
+        [()] * (5 if n_entries <= 1_000_000 else 1))
+    os.remove(export_path)
+
+    print(f"[{label}] sealing closed days into the archive…", file=sys.stderr)
+    results["seal_archive"] = time_calls(db.seal_archive, [()])
+    results["get_history_7_archived"] = time_calls(db.get_history, [(7,)] * 200)
+    results.update(run_long_range(db, "_archived"))
+
+    print(f"[{label}] timing writes…", file=sys.stderr)
+    results["log_intake"] = time_calls(db.log_intake, [(250,)] * 200)
+    results["clear_entries_for_date"] = time_calls(
+        db.clear_entries_for_date, [(d,) for d in rng.sample(days, min(20, len(days)))])
+    root.close()
+    _remove_files(path)
+    if not keep_data:
+        os.remove(pristine)
+    return results
+
+
+# ---------- Event-loop latency (AsyncDatabase) ----------
+def run_async_latency(workdir: str, concurrency: int = 1000) -> Dict[str, Dict]:
+    """
+    Fire `concurrency` log_intake calls at once, first by calling Database
+    directly from the loop, then through AsyncDatabase, while a ticker
+    task measures how late its 1 ms sleeps wake up.
+    """
+    from async_database import AsyncDatabase
+
+    async def measure(log_all) -> Dict[str, float]:
+        lags: List[float] = []
+        done = asyncio.Event()
+
+        async def ticker():
+            loop = asyncio.get_running_loop()
+            while not done.is_set():
+                t0 = loop.time()
+                await asyncio.sleep(0.001)
+                lags.append((loop.time() - t0 - 0.001) * 1000)
+
+        tick = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        await log_all()
+        elapsed = time.perf_counter() - started
+        done.set()
+        await tick
+        lags.sort()
+        return {
+            "calls": concurrency,
+            "mean_ms": elapsed * 1000,
+            "loop_lag_p50_ms": lags[len(lags) // 2],
+            "loop_lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+            "loop_lag_max_ms": lags[-1],
+        }
+
+    path = os.path.join(workdir, "bench_async.db")
+    results = {}
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = Database(path, durability=DURABILITY_NORMAL)
+
+    async def blocking():
+        async def one():
+            db.log_intake(250)
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+
+    results["log_intake_blocking"] = asyncio.run(measure(blocking))
+
+    async def via_async():
+        adb = AsyncDatabase(db=db)
+        await asyncio.gather(*(adb.log_intake(250) for _ in range(concurrency)))
+        await adb.close()
+
+    results["log_intake_async"] = asyncio.run(measure(via_async))
+    db.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return results
+
+
+# ---------- CLI startup ----------
+# Modules the CLI must never load: the GUI stack and charting.
+CLI_FORBIDDEN = ("PyQt6", "matplotlib", "numpy", "GUI", "charts", "workers")
+_CLI_PROBE = """
+import runpy, sys
+forbidden, sys.argv = sys.argv[1].split(","), ["water"] + sys.argv[2:]
+try:
+    runpy.run_module("water", run_name="__main__")
+except SystemExit:
+    pass
+loaded = sorted({m.split(".")[0] for m in sys.modules} & set(forbidden))
+print("loaded:" + ",".join(loaded))
+"""
+
+
+def run_cli_startup(workdir: str, runs: int = 20) -> Tuple[Dict[str, Dict], List[str]]:
+    """
+    Times `python -m water` commands end to end, interpreter start
+    included, and returns (results, forbidden modules they loaded).
+    """
+    path = os.path.join(workdir, "bench_cli.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    Database(path).close()
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        "cli_log": ["log", "250"],
+        "cli_today": ["today"],
+        "cli_history_30": ["history", "--days", "30"],
+    }
+    results, loaded = {}, set()
+
+    def call(argv):
+        proc = subprocess.run(
+            [sys.executable, "-c", _CLI_PROBE, ",".join(CLI_FORBIDDEN), "--db", path] + argv,
+            cwd=here, capture_output=True, text=True, check=True,
+        )
+        report = proc.stdout.rstrip().rsplit("\n", 1)[-1]
+        loaded.update(m for m in report[len("loaded:"):].split(",") if m)
+
+    for name, argv in commands.items():
+        results[name] = time_calls(call, [(argv,)] * runs)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return results, sorted(loaded)
+
+
+# ---------- Storage backends ----------
+BACKENDS = ("sqlite", "memory", "log")
+
+
+def open_backend(kind: str, path: str) -> Storage:
+    """path is used by the file backends; pass it again to reopen."""
+    if kind == "memory":
+        return MemoryDatabase()
+    if kind == "log":
+        return LogDatabase(path, durability=DURABILITY_NORMAL)
+    return Database(path, durability=DURABILITY_NORMAL)
+
+
+def _remove_files(path: str):
+    """A database or log file with its journals and archives."""
+    for name in [path + s for s in ("", "-wal", "-shm", ".tmp")] + glob.glob(path + ".u*.archive"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def run_backend_latency(n_entries: int, workdir: str, seed: int) -> Dict[str, Dict]:
+    """Read and write latency of every backend on the same synthetic history."""
+    results: Dict[str, Dict] = {}
+    history = list(generate_history(n_entries, seed))
+    today = date.today()
+    days = [(today - timedelta(days=i)).isoformat() for i in range(0, 365, 3)]
+    for kind in BACKENDS:
+        path = os.path.join(workdir, f"bench_backend_{kind}.db")
+        _remove_files(path)
+        print(f"[backends] {kind}: loading {size_label(n_entries)} entries…", file=sys.stderr)
+        db = open_backend(kind, path)
+        results[f"{kind}.load"] = time_calls(
+            lambda: (db.log_intakes(history, update_totals=False), db.rebuild_daily_totals()), [()])
+        timings = {
+            "get_intake_for_date": time_calls(db.get_intake_for_date, [(d,) for d in days]),
+            "get_entries_for_date": time_calls(db.get_entries_for_date, [(d,) for d in days]),
+            "get_history_30": time_calls(db.get_history, [(30,)] * 50),
+            "totals_between_7": time_calls(db.totals_between, [
+                ((today - timedelta(days=6)).isoformat(), today.isoformat())] * 200),
+            "packed_entries_all": time_calls(db.packed_entries, [()] * 5),
+            "log_intake": time_calls(db.log_intake, [(250,)] * 200),
+        }
+        for op, stats in timings.items():
+            results[f"{kind}.{op}"] = stats
+        db.close()
+        if kind != "memory":
+            results[f"{kind}.reopen"] = time_calls(lambda: open_backend(kind, path).close(), [()] * 3)
+        _remove_files(path)
+    return results
+
+
+# ---------- Reminders ----------
+class _ManualTimer:
+    """reminders.ThreadTimer stand-in on a simulated clock: the caller fires it."""
+
+    def __init__(self, callback, clock):
+        self.callback = callback
+        self.clock = clock
+        self.due: Optional[datetime] = None
+
+    def arm(self, delay_s: float):
+        self.due = self.clock() + timedelta(seconds=max(0.0, delay_s))
+
+    def cancel(self):
+        self.due = None
+
+    def close(self):
+        self.due = None
+
+    def fire(self):
+        self.due = None
+        self.callback()
+
+
+def run_reminder_simulation(profiles: int = 200, days: int = 3, seed: int = 42) -> Dict[str, Dict]:
+    """
+    Simulated days of drinking for many profiles on a MemoryDatabase with
+    a manual clock and timer: time per simulated day, and timer wake-ups
+    against a once-a-minute poll of every profile. The reminders' rules
+    are checked in tests/test_reminders.py.
+    """
+    rng = random.Random(seed)
+    now = [datetime(2026, 3, 2, 0, 0)]
+    clock = lambda: now[0]  # noqa: E731
+    db = MemoryDatabase()
+    settings, drinks = {}, []
+    for i in range(profiles):
+        user = db.for_user(db.create_user(f"profile {i}"))
+        enabled = i % 5 != 0
+        interval, target = rng.choice((30, 45, 60, 90)), rng.choice((1500, 2000, 2500))
+        user.set_reminder_enabled(enabled)
+        user.set_reminder_minutes(interval)
+        user.set_daily_target_ml(target)
+        settings[user.user_id] = (enabled, interval, target)
+        # steady drinkers stay on pace; the rest forget for hours at a time
+        gap = (20, 40) if i % 3 == 0 else (60, 240)
+        for day in range(days):
+            t = datetime.combine(now[0].date() + timedelta(days=day), datetime.min.time()) \
+                + timedelta(hours=7, minutes=rng.randrange(90))
+            while t.hour < 23:
+                drinks.append((t, user.user_id, rng.choice(AMOUNTS)))
+                t += timedelta(minutes=rng.randrange(*gap))
+    drinks.sort()
+
+    notifier = reminders.RecordingNotifier()
+    timer = None
+
+    def make_timer(callback):
+        nonlocal timer
+        timer = _ManualTimer(callback, clock)
+        return timer
+
+    scheduler = reminders.ReminderScheduler(db, notifier, clock=clock, timer_factory=make_timer)
+    scheduler.start()
+    end = datetime.combine(now[0].date() + timedelta(days=days), datetime.min.time())
+    started = time.perf_counter()
+    i = 0
+    while True:
+        next_drink = drinks[i][0] if i < len(drinks) else None
+        if timer.due is not None and (next_drink is None or timer.due <= next_drink):
+            if timer.due >= end:
+                break
+            now[0] = max(now[0], timer.due)
+            timer.fire()
+        elif next_drink is not None and next_drink < end:
+            now[0], user_id, amount = drinks[i]
+            db.for_user(user_id).log_intake(amount, now[0])
+            i += 1
+        else:
+            break
+    elapsed = time.perf_counter() - started
+    scheduler.stop()
+
+    enabled_profiles = sum(1 for enabled, _, _ in settings.values() if enabled)
+    polls = enabled_profiles * days * 24 * 60
+    return {"simulated_day": {
+        "calls": days, "mean_ms": elapsed * 1000 / days,
+        "profiles": profiles, "reminders": len(notifier.sent), "drinks": i,
+        "wakeups": scheduler.wakeups, "recomputed": scheduler.recomputed,
+        "per_minute_polls": polls,
+    }}
+
+
+def run_reminder_idle(seconds: float = 2.0) -> Dict[str, Dict]:
+    """CPU time and wake-ups of a real ThreadTimer scheduler with nothing due."""
+    db = MemoryDatabase()
+    for i in range(50):
+        user = db.for_user(db.create_user(f"profile {i}"))
+        user.set_reminder_enabled(True)
+        user.set_daily_target_ml(1000)
+        user.log_intake(1000)   # target met: next reminder is tomorrow
+    scheduler = reminders.ReminderScheduler(db, reminders.RecordingNotifier())
+    scheduler.start()
+    time.sleep(0.2)             # first wake-up loads every profile
+    woken, cpu0 = scheduler.wakeups, time.process_time()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu0
+    idle_wakeups = scheduler.wakeups - woken
+    scheduler.stop()
+    return {"idle": {"calls": 1, "mean_ms": cpu * 1000, "seconds": seconds,
+                     "wakeups": idle_wakeups}}
+
+
+# ---------- Comparison ----------
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Lines describing ops whose p50 (or mean) slowed by more than threshold."""
+    regressions = []
+    for size, ops in current["results"].items():
+        for op, stats in ops.items():
+            base = baseline.get("results", {}).get(size, {}).get(op)
+            if not base:
+                continue
+            key = "p50_ms" if "p50_ms" in stats and "p50_ms" in base else "mean_ms"
+            if base[key] <= 0:
+                continue
+            ratio = stats[key] / base[key]
+            marker = "REGRESSION" if ratio > 1 + threshold else ""
+            line = f"{size:>5} {op:<24} {base[key]:10.3f} -> {stats[key]:10.3f} ms  x{ratio:5.2f} {marker}"
+            print(line)
+            if marker:
+                regressions.append(line)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Water Intake database layer")
+    parser.add_argument("--sizes", default="10k,1M", help="comma separated entry counts, e.g. 10k,1M,10M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=tempfile.gettempdir())
+    parser.add_argument("--keep-data", action="store_true",
+                        help="keep generated databases in --workdir and reuse them on later runs")
+    parser.add_argument("--users", type=int, default=1,
+                        help="spread each size over this many profiles and time one of them")
+    parser.add_argument("--async-latency", action="store_true",
+                        help="also measure event-loop lag under 1,000 concurrent AsyncDatabase logs")
+    parser.add_argument("--cli-startup", action="store_true",
+                        help="also time `python -m water` commands and fail if they import GUI/charting modules")
+    parser.add_argument("--backends", action="store_true",
+                        help="also time every storage backend on the first size")
+    parser.add_argument("--reminders", action="store_true",
+                        help="also time reminder scheduling for many profiles and count its wake-ups")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression (default 0.25)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes.split(","):
+        n = parse_size(size)
+        results[size_label(n)] = run_size(n, args.workdir, args.seed, args.keep_data,
+                                          max(1, args.users))
+    if args.async_latency:
+        results["async"] = run_async_latency(args.workdir)
+    if args.backends:
+        results["backends"] = run_backend_latency(parse_size(args.sizes.split(",")[0]),
+                                                  args.workdir, args.seed)
+    if args.reminders:
+        results["reminders"] = run_reminder_simulation(seed=args.seed)
+        results["reminders"].update(run_reminder_idle())
+    cli_loaded = []
+    if args.cli_startup:
+        results["cli"], cli_loaded = run_cli_startup(args.workdir)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "users": args.users,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}", file=sys.stderr)
+
+    if cli_loaded:
+        print(f"CLI imported GUI/charting modules: {', '.join(cli_loaded)}", file=sys.stderr)
+        return 1
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
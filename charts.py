@@ -0,0 +1,295 @@
+# charts.py
+"""
+Matplotlib charts for the report window.
+Kept out of GUI.py so the main window can start without loading
+matplotlib; GUI.py imports this module on first use.
+
+Finished renders are kept in CHART_CACHE (see CachedCanvas), so showing
+data that has not changed since it was last drawn at this size, such as
+reopening the report, paints a stored pixmap instead of running
+matplotlib.
+"""
+
+import functools
+from datetime import date, timedelta
+
+import matplotlib
+import numpy as np
+matplotlib.use("QtAgg")
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qtagg import NavigationToolbar2QT
+from matplotlib.figure import Figure
+from PyQt6.QtGui import QImage, QPainter, QPixmap
+
+import diagnostics
+from render_cache import RenderCache
+
+# renders of every chart canvas, shared so a new report window reuses them
+CHART_CACHE = RenderCache()
+
+
+class CachedCanvas(FigureCanvas):
+    """
+    FigureCanvas whose renders are kept in CHART_CACHE.
+
+    Plot methods hand show_plot() a key for their data and a function that
+    builds the figure without drawing it. When the key has already been
+    rendered at the current size, DPI and device pixel ratio, the cached
+    pixmap is painted and build is not even run; it runs the first time a
+    draw actually needs the figure, e.g. after resizing to a size that is
+    not cached. A key of None draws as usual, and so does everything after
+    the user starts interacting with the chart (zoom, pan, key presses),
+    until the next plot.
+    """
+
+    def __init__(self, figure):
+        self._data_key = None
+        self._build = None    # builds the figure for _data_key, if not done yet
+        self._pixmap = None   # cached render shown instead of the figure
+        super().__init__(figure)
+
+    def show_plot(self, key, build):
+        """Show build's chart; key identifies its data (None: don't cache)."""
+        self._data_key = key
+        self._build = build
+        self.draw()
+
+    def _render_key(self):
+        if self._data_key is None:
+            return None
+        width, height = self.get_width_height(physical=True)
+        return (type(self).__name__, self._data_key, width, height,
+                self.figure.dpi, self.device_pixel_ratio)
+
+    def draw(self):
+        key = self._render_key()
+        pixmap = CHART_CACHE.get(key) if key is not None else None
+        if pixmap is not None:
+            self._pixmap = pixmap
+            self.update()
+            return
+        self._pixmap = None
+        if self._build is not None:
+            build, self._build = self._build, None
+            build()
+        with diagnostics.span("chart.render"):
+            super().draw()
+        if key is not None:
+            self._store(key)
+
+    def _store(self, key):
+        renderer = self.get_renderer()
+        width, height = int(renderer.width), int(renderer.height)
+        image = QImage(self.buffer_rgba(), width, height, QImage.Format.Format_RGBA8888)
+        pixmap = QPixmap.fromImage(image)   # copies out of the renderer's buffer
+        pixmap.setDevicePixelRatio(self.device_pixel_ratio)
+        CHART_CACHE.put(key, pixmap, width * height * 4)
+
+    def _go_live(self):
+        # the figure is about to change under the user's hands: stop caching
+        if self._data_key is None:
+            return
+        self._data_key = None
+        if self._pixmap is not None:
+            self.draw()
+
+    def paintEvent(self, event):
+        self._draw_idle()   # a pending draw_idle() may switch to a cached render
+        if self._pixmap is None:
+            super().paintEvent(event)
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._pixmap)
+        painter.end()
+
+    def mousePressEvent(self, event):
+        self._go_live()
+        super().mousePressEvent(event)
+
+    def keyPressEvent(self, event):
+        self._go_live()
+        super().keyPressEvent(event)
+
+
+class WeeklyChartCanvas(CachedCanvas):
+    def __init__(self, parent=None, db=None, data=None):
+        self.db = db
+        self.fig = Figure(figsize=(4, 3), facecolor="#2a2b2f")
+        super().__init__(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self.fig.tight_layout(pad=3)
+        self.plot_weekly_data(data)
+
+    @staticmethod
+    def load_weekly_series(db):
+        """(date_str, total_ml) for the last 7 days, oldest first, in one query (use off the GUI thread)."""
+        today = date.today()
+        return db.totals_between((today - timedelta(days=6)).isoformat(), today.isoformat())
+
+    @classmethod
+    def load_weekly_data(cls, db):
+        """Totals for the last 7 days, oldest first (runs SQL; use off the GUI thread)."""
+        return [total for _, total in cls.load_weekly_series(db)]
+
+    @diagnostics.timed("chart.plot_weekly_data")
+    def plot_weekly_data(self, data=None, key=None):
+        """
+        data: 7 daily totals, oldest first; loaded from self.db if omitted.
+        key: identifies data for the render cache (see CachedCanvas).
+        """
+        if data is None:
+            data = self.load_weekly_data(self.db)
+        self.show_plot(key, functools.partial(self._build_weekly, data))
+
+    def _build_weekly(self, data):
+        self.ax.clear()
+        self.ax.set_facecolor("#2a2b2f")
+
+        # Get last 7 days
+        today = date.today()
+        labels = [(today - timedelta(days=i)).strftime("%a") for i in range(6, -1, -1)]
+
+        # Plot bar chart
+        bars = self.ax.bar(labels, data, color="#4fc3f7", edgecolor="#1e1f23")
+
+        # Add values on top of bars
+        for bar in bars:
+            height = bar.get_height()
+            if height > 0:
+                self.ax.text(
+                    bar.get_x() + bar.get_width()/2, height + 30,
+                    f"{int(height)}", ha="center", va="bottom",
+                    color="#e6eef6", fontsize=8
+                )
+
+        # Chart styling
+        self.ax.set_title("Weekly Water Intake", color="#e6eef6", fontsize=12, pad=10)
+        self.ax.tick_params(colors="#a0b3c6")
+        for spine in self.ax.spines.values():
+            spine.set_color("#a0b3c6")
+        self.ax.set_ylabel("ml", color="#a0b3c6")
+
+
+class TrendsCanvas(CachedCanvas):
+    """
+    Long-range views for the report: daily trend, months, years, hour
+    heatmap, and the zoomable all-history line. Every plot method takes
+    the key of its data for the render cache (see CachedCanvas).
+    """
+    # points drawn for the all-history line at any zoom level
+    MAX_POINTS = 500
+
+    def __init__(self, parent=None):
+        self.fig = Figure(figsize=(4, 3), facecolor="#2a2b2f")
+        super().__init__(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self._colorbar = None
+        self._series = None  # (epoch days, totals) behind the all-history line
+        self._line = None
+
+    def make_toolbar(self, parent=None):
+        """Zoom/pan toolbar for the all-history view."""
+        return NavigationToolbar2QT(self, parent)
+
+    def _style(self, title, ylabel="ml / day"):
+        self.ax.set_title(title, color="#e6eef6", fontsize=12, pad=10)
+        self.ax.tick_params(colors="#a0b3c6", labelsize=8)
+        for spine in self.ax.spines.values():
+            spine.set_color("#a0b3c6")
+        if ylabel:
+            self.ax.set_ylabel(ylabel, color="#a0b3c6")
+
+    def _reset(self):
+        if self._colorbar is not None:
+            self._colorbar.remove()
+            self._colorbar = None
+        self._series = self._line = None
+        self.fig.clear()
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_facecolor("#2a2b2f")
+
+    @diagnostics.timed("chart.plot_trend")
+    def plot_trend(self, dates, totals, avg_7, avg_30, target, key=None):
+        """Daily totals with trailing 7- and 30-day averages; dates are datetime64[D]."""
+        self.show_plot(key, functools.partial(self._build_trend, dates, totals, avg_7, avg_30, target))
+
+    def _build_trend(self, dates, totals, avg_7, avg_30, target):
+        self._reset()
+        self.ax.bar(dates, totals, width=1.0, color="#4fc3f7", alpha=0.35, label="daily")
+        self.ax.plot(dates, avg_7, color="#4fc3f7", linewidth=1.5, label="7-day avg")
+        self.ax.plot(dates, avg_30, color="#ffb74d", linewidth=1.5, label="30-day avg")
+        self.ax.axhline(target, color="#81c784", linestyle="--", linewidth=1, label="target")
+        self.ax.legend(fontsize=7, facecolor="#2a2b2f", labelcolor="#e6eef6", frameon=False)
+        self.fig.autofmt_xdate()
+        self._style("Daily Intake")
+
+    @diagnostics.timed("chart.plot_periods")
+    def plot_periods(self, labels, means, target, title, key=None):
+        """Average ml per day for each month or year."""
+        self.show_plot(key, functools.partial(self._build_periods, labels, means, target, title))
+
+    def _build_periods(self, labels, means, target, title):
+        self._reset()
+        bars = self.ax.bar(labels, means, color="#4fc3f7", edgecolor="#1e1f23")
+        for bar, mean in zip(bars, means):
+            bar.set_color("#81c784" if mean >= target else "#4fc3f7")
+        self.ax.axhline(target, color="#81c784", linestyle="--", linewidth=1)
+        if len(labels) > 12:
+            self.ax.tick_params(axis="x", labelrotation=60)
+        self._style(title)
+
+    @diagnostics.timed("chart.plot_heatmap")
+    def plot_heatmap(self, matrix, key=None):
+        """7 x 24 matrix of ml per weekday (Monday first) and hour."""
+        self.show_plot(key, functools.partial(self._build_heatmap, matrix))
+
+    def _build_heatmap(self, matrix):
+        self._reset()
+        image = self.ax.imshow(matrix, aspect="auto", cmap="Blues", interpolation="nearest")
+        self.ax.set_yticks(range(7))
+        self.ax.set_yticklabels(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+        self.ax.set_xticks(range(0, 24, 3))
+        self.ax.set_xlabel("hour", color="#a0b3c6")
+        self._colorbar = self.fig.colorbar(image, ax=self.ax)
+        self._colorbar.ax.tick_params(colors="#a0b3c6", labelsize=7)
+        self._style("When You Drink", ylabel=None)
+
+    @diagnostics.timed("chart.plot_long_range")
+    def plot_long_range(self, days, totals, target, key=None):
+        """
+        Every day of history (days as epoch-day ints) as one line,
+        downsampled with LTTB to MAX_POINTS. Zooming in resamples the
+        visible range, so detail appears without drawing every day.
+        """
+        self.show_plot(key, functools.partial(self._build_long_range, days, totals, target))
+
+    def _build_long_range(self, days, totals, target):
+        self._reset()
+        self._series = (days, totals)
+        self._line, = self.ax.plot(days.astype("datetime64[D]"), totals, color="#4fc3f7",
+                                   linewidth=1.0)
+        self.ax.axhline(target, color="#81c784", linestyle="--", linewidth=1)
+        self._resample(days[0], days[-1])
+        self.ax.set_xlim(days[0].astype("datetime64[D]"), days[-1].astype("datetime64[D]"))
+        self.ax.callbacks.connect("xlim_changed", self._on_xlim_changed)
+        self.fig.autofmt_xdate()
+        self._style("All History")
+
+    @diagnostics.timed("chart.resample")
+    def _resample(self, lo, hi):
+        from analytics import lttb_indices
+        days, totals = self._series
+        # one point of margin on each side keeps the line running off-screen
+        first = max(0, int(np.searchsorted(days, lo)) - 1)
+        last = min(len(days), int(np.searchsorted(days, hi, side="right")) + 1)
+        idx = first + lttb_indices(days[first:last], totals[first:last], self.MAX_POINTS)
+        self._line.set_data(days[idx].astype("datetime64[D]"), totals[idx])
+
+    def _on_xlim_changed(self, ax):
+        if self._series is None:
+            return
+        # matplotlib date numbers are days since 1970-01-01, like epoch days
+        lo, hi = ax.get_xlim()
+        self._data_key = None   # zoomed: this view is not what the key stands for
+        self._resample(lo, hi)
+        self.draw_idle()
@@ -1,91 +1,502 @@
 # database.py
 """
 SQLite wrapper for Water Intake Tracker.
-Manages settings and intake logs.
+Manages settings and intake logs. The API is defined by storage.Storage;
+this is its SQLite backend and the default.
 """
 
+import glob
+import itertools
+import os
 import sqlite3
-from datetime import date, datetime
-from typing import List, Tuple, Optional
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Optional
+
+import archive
+from pool import ConnectionPool
+from storage import (  # noqa: F401  (re-exported for callers of database.py)
+    Change, COMPACT_DAY, COMPACT_HOUR, DEFAULT_USER_ID, DEFAULT_USER_NAME, DURABILITY_FULL,
+    DURABILITY_NORMAL, DailyTotalRow, IntakeItem, Storage, _SharedState, open_database,
+    split_intake, to_epoch_ms,
+)
 
 DB_FILE = "water_intake.db"
 
+# How often get_setting() checks PRAGMA data_version for writes made by
+# other processes; in between, cached settings are served as-is.
+SETTINGS_RECHECK_S = 1.0
 
-class Database:
-    def __init__(self, db_path: str = DB_FILE):
-        self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self._create_tables()
+# Database.packed_entries encoding, as an SQL expression over an intake row
+_PACKED_SQL = ("(CAST(julianday(date) - 2440587.5 AS INTEGER) << 37)"
+               " | (CAST(substr(timestamp, 12, 2) AS INTEGER) << 32) | amount_ml")
+# rows _PACKED_SQL can encode; legacy rows and update_entry_timestamp()'s
+# fallback can leave a date that is not one, which would pack to NULL
+_PACKABLE_SQL = "julianday(date) IS NOT NULL"
 
-    def _create_tables(self):
-        c = self.conn.cursor()
+
+def _rebuild_daily_totals(c: sqlite3.Cursor, user_id: Optional[int] = None):
+    if user_id is None:
+        c.execute("DELETE FROM daily_totals")
         c.execute(
             """
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
+            INSERT INTO daily_totals (user_id, date, total_ml, entries)
+            SELECT user_id, date, SUM(amount_ml), SUM(entries) FROM intake GROUP BY user_id, date
+            """
+        )
+        return
+    c.execute("DELETE FROM daily_totals WHERE user_id = ?", (user_id,))
+    c.execute(
+        """
+        INSERT INTO daily_totals (user_id, date, total_ml, entries)
+        SELECT user_id, date, SUM(amount_ml), SUM(entries) FROM intake
+        WHERE user_id = ? GROUP BY user_id, date
+        """,
+        (user_id,),
+    )
+
+
+# ---------- Schema migrations ----------
+# Each step upgrades the schema by one version; PRAGMA user_version records
+# the last step applied. Steps must stay idempotent so databases created
+# before versioning existed upgrade cleanly.
+
+def _migrate_v1(c: sqlite3.Cursor):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS intake (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            amount_ml INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_v2(c: sqlite3.Cursor):
+    # Per-day rollup of intake, kept in sync by every write so totals and
+    # history never have to rescan the raw log.
+    c.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'daily_totals'"
+    )
+    if c.fetchone() is not None:
+        return
+    c.execute(
+        """
+        CREATE TABLE daily_totals (
+            date TEXT PRIMARY KEY,
+            total_ml INTEGER NOT NULL,
+            entries INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    c.execute(
+        """
+        INSERT INTO daily_totals (date, total_ml, entries)
+        SELECT date, SUM(amount_ml), COUNT(*) FROM intake GROUP BY date
+        """
+    )
+
+
+def _migrate_v3(c: sqlite3.Cursor):
+    # Integer epoch-ms timestamps next to the ISO text, plus indexes so
+    # every per-day query is a range scan.
+    c.execute("PRAGMA table_info(intake)")
+    if "ts_ms" not in [r[1] for r in c.fetchall()]:
+        c.execute("ALTER TABLE intake ADD COLUMN ts_ms INTEGER")
+    c.execute("SELECT id, timestamp FROM intake WHERE ts_ms IS NULL")
+    updates = []
+    for entry_id, timestamp_str in c.fetchall():
+        try:
+            updates.append((to_epoch_ms(datetime.fromisoformat(timestamp_str)), entry_id))
+        except ValueError:
+            continue
+    c.executemany("UPDATE intake SET ts_ms = ? WHERE id = ?", updates)
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_intake_date_ts ON intake (date, timestamp, amount_ml)"
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_intake_ts_ms ON intake (ts_ms)")
+
+
+def _columns(c: sqlite3.Cursor, table: str) -> List[str]:
+    c.execute(f"PRAGMA table_info({table})")
+    return [r[1] for r in c.fetchall()]
+
+
+def _migrate_v4(c: sqlite3.Cursor):
+    # Profiles: a users table, and user_id leading every key and index so
+    # each profile's rows form one contiguous range in the b-trees.
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_ms INTEGER NOT NULL
+        )
+        """
+    )
+    c.execute(
+        "INSERT OR IGNORE INTO users (id, name, created_ms) VALUES (?, ?, ?)",
+        (DEFAULT_USER_ID, DEFAULT_USER_NAME, to_epoch_ms(datetime.now())),
+    )
+
+    if "user_id" not in _columns(c, "intake"):
+        c.execute(f"ALTER TABLE intake ADD COLUMN user_id INTEGER NOT NULL DEFAULT {DEFAULT_USER_ID}")
+    c.execute("DROP INDEX IF EXISTS idx_intake_date_ts")
+    c.execute("DROP INDEX IF EXISTS idx_intake_ts_ms")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_intake_user_date_ts "
+        "ON intake (user_id, date, timestamp, amount_ml)"
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_intake_user_ts_ms ON intake (user_id, ts_ms)")
+
+    # settings and daily_totals need user_id in their primary keys, which
+    # SQLite can only change by rebuilding the table
+    if "user_id" not in _columns(c, "settings"):
+        c.execute(
+            """
+            CREATE TABLE settings_v4 (
+                user_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (user_id, key)
+            ) WITHOUT ROWID
             """
         )
+        c.execute(
+            "INSERT INTO settings_v4 (user_id, key, value) SELECT ?, key, value FROM settings",
+            (DEFAULT_USER_ID,),
+        )
+        c.execute("DROP TABLE settings")
+        c.execute("ALTER TABLE settings_v4 RENAME TO settings")
+    if "user_id" not in _columns(c, "daily_totals"):
         c.execute(
             """
-            CREATE TABLE IF NOT EXISTS intake (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE daily_totals_v4 (
+                user_id INTEGER NOT NULL,
                 date TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                amount_ml INTEGER NOT NULL
-            )
+                total_ml INTEGER NOT NULL,
+                entries INTEGER NOT NULL,
+                PRIMARY KEY (user_id, date)
+            ) WITHOUT ROWID
             """
         )
-        self.conn.commit()
-
-    # Settings (simple key/value)
-    def set_setting(self, key: str, value: str):
-        c = self.conn.cursor()
+        c.execute("DROP TABLE daily_totals")
+        c.execute("ALTER TABLE daily_totals_v4 RENAME TO daily_totals")
         c.execute(
-            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value)
+            """
+            INSERT INTO daily_totals (user_id, date, total_ml, entries)
+            SELECT user_id, date, SUM(amount_ml), COUNT(*) FROM intake GROUP BY user_id, date
+            """
         )
-        self.conn.commit()
+    # cross-profile reports for one day
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_daily_totals_date ON daily_totals (date, user_id, total_ml)"
+    )
 
-    def get_setting(self, key: str) -> Optional[str]:
+
+def _migrate_v5(c: sqlite3.Cursor):
+    # Compacted rows (see compact_entries) stand for several drinks; the
+    # rollup counts entries by this column instead of by rows.
+    if "entries" not in _columns(c, "intake"):
+        c.execute("ALTER TABLE intake ADD COLUMN entries INTEGER NOT NULL DEFAULT 1")
+
+
+def _migrate_v6(c: sqlite3.Cursor):
+    # Columnar archives (see seal_archive): one row per sealed profile. Any
+    # change to an intake row dated on or before the cut-off bumps the
+    # generation, which retires the archive file written for the old one.
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_seal (
+            user_id INTEGER PRIMARY KEY,
+            through TEXT NOT NULL,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    sealed = "{row}.date <= (SELECT through FROM archive_seal WHERE user_id = {row}.user_id)"
+    bump = "UPDATE archive_seal SET generation = generation + 1 WHERE user_id = {row}.user_id;"
+    c.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS intake_sealed_insert AFTER INSERT ON intake
+        WHEN {sealed.format(row="NEW")}
+        BEGIN {bump.format(row="NEW")} END
+        """
+    )
+    c.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS intake_sealed_delete AFTER DELETE ON intake
+        WHEN {sealed.format(row="OLD")}
+        BEGIN {bump.format(row="OLD")} END
+        """
+    )
+    c.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS intake_sealed_update AFTER UPDATE ON intake
+        WHEN {sealed.format(row="OLD")} OR {sealed.format(row="NEW")}
+        BEGIN {bump.format(row="OLD")} {bump.format(row="NEW")} END
+        """
+    )
+
+
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5, _migrate_v6]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+class Database(Storage):
+    def __init__(self, db_path: str = DB_FILE, durability: str = DURABILITY_FULL,
+                 group_commit_ms: int = 0, max_readers: int = 4,
+                 user_id: int = DEFAULT_USER_ID):
+        """
+        durability: DURABILITY_FULL or DURABILITY_NORMAL (WAL)
+        group_commit_ms: when > 0, writes arriving within this window share
+            one transaction and are committed together (see flush()).
+        max_readers: read-only connections available to concurrent readers
+        user_id: profile that every read and write is scoped to; see
+            for_user() for other profiles on the same connections
+        """
+        if durability not in (DURABILITY_FULL, DURABILITY_NORMAL):
+            raise ValueError(f"Unknown durability mode: {durability!r}")
+        self.db_path = db_path
+        # archive files live next to the database file
+        self._archive_base = None if db_path == ":memory:" or db_path.startswith("file:") else db_path
+        self.durability = durability
+        self.group_commit_ms = max(0, int(group_commit_ms))
+        self._pool = ConnectionPool(db_path, max_readers=max_readers,
+                                    group_commit_ms=self.group_commit_ms)
+        # the writer connection, kept for callers that used the old attribute
+        self.conn = self._pool.writer
+        self._configure_journal()
+        self._migrate()
+        self.user_id = int(user_id)
+        self._owns_storage = True
+        # user id -> ((through, generation), Archive or None), shared by views
+        self._archives: Dict[int, tuple] = {}
+        self._state = _SharedState()
+        self._state.data_version = self._current_data_version()
+        self._state.checked = time.monotonic()
+        if self.get_user(self.user_id) is None:
+            raise ValueError(f"Unknown user id: {user_id!r}")
+
+    def _configure_journal(self):
         c = self.conn.cursor()
-        c.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        row = c.fetchone()
-        return row["value"] if row else None
+        if c.execute("PRAGMA page_count").fetchone()[0] == 0:
+            # only settable before the first table exists; older files are
+            # switched over by enable_incremental_vacuum()
+            c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if self.durability == DURABILITY_NORMAL:
+            c.execute("PRAGMA journal_mode = WAL")
+            c.execute("PRAGMA synchronous = NORMAL")
+        else:
+            c.execute("PRAGMA synchronous = FULL")
+
+    def _migrate(self):
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.execute("PRAGMA user_version")
+            version = c.fetchone()[0]
+            for step in range(version, SCHEMA_VERSION):
+                c.execute("BEGIN IMMEDIATE")
+                try:
+                    MIGRATIONS[step](c)
+                    c.execute(f"PRAGMA user_version = {step + 1}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+    def flush(self):
+        """Commit any writes still waiting on the group-commit window."""
+        self._pool.flush()
 
-    # Target helpers
-    def set_daily_target_ml(self, ml: int):
-        self.set_setting("daily_target_ml", str(int(ml)))
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]):
+        """sqlite3 trace callback for every connection of the pool (see diagnostics.py)."""
+        self._pool.set_trace_callback(callback)
 
-    def get_daily_target_ml(self) -> int:
-        val = self.get_setting("daily_target_ml")
-        if val:
+    # Profiles
+    def create_user(self, name: str) -> int:
+        name = name.strip()
+        if not name:
+            raise ValueError("Profile name must not be empty")
+        with self._pool.write() as conn:
             try:
-                return int(val)
-            except ValueError:
-                return 2000
-        return 2000  # default 2000 ml
+                c = conn.execute(
+                    "INSERT INTO users (name, created_ms) VALUES (?, ?)",
+                    (name, to_epoch_ms(datetime.now())),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Profile already exists: {name!r}")
+            user_id = c.lastrowid
+            self._pool.commit()
+            self._notify(Change("users", user_id=user_id))
+            return user_id
 
-    # Reminder settings
-    def set_reminder_enabled(self, enabled: bool):
-        self.set_setting("reminder_enabled", "1" if enabled else "0")
+    def rename_user(self, user_id: int, name: str):
+        name = name.strip()
+        if not name:
+            raise ValueError("Profile name must not be empty")
+        with self._pool.write() as conn:
+            try:
+                conn.execute("UPDATE users SET name = ? WHERE id = ?", (name, int(user_id)))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Profile already exists: {name!r}")
+            self._pool.commit()
+            self._notify(Change("users", user_id=int(user_id)))
 
-    def get_reminder_enabled(self) -> bool:
-        val = self.get_setting("reminder_enabled")
-        return val == "1"
+    def delete_user(self, user_id: int):
+        """Remove a profile with all its intake and settings."""
+        user_id = int(user_id)
+        if user_id == DEFAULT_USER_ID:
+            raise ValueError("The default profile cannot be deleted")
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM intake WHERE user_id = ?", (user_id,))
+            c.execute("DELETE FROM daily_totals WHERE user_id = ?", (user_id,))
+            c.execute("DELETE FROM settings WHERE user_id = ?", (user_id,))
+            c.execute("DELETE FROM archive_seal WHERE user_id = ?", (user_id,))
+            c.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            self._pool.commit()
+            with self._state.lock:
+                self._state.settings.pop(user_id, None)
+            self._drop_archives(user_id)
+            self._notify(Change("users", user_id=user_id))
 
-    def set_reminder_minutes(self, minutes: int):
-        self.set_setting("reminder_minutes", str(int(minutes)))
+    def get_user(self, user_id: int) -> Optional[sqlite3.Row]:
+        with self._pool.read() as conn:
+            return conn.execute(
+                "SELECT id, name, created_ms FROM users WHERE id = ?", (int(user_id),)
+            ).fetchone()
 
-    def get_reminder_minutes(self) -> int:
-        val = self.get_setting("reminder_minutes")
-        if val:
-            try:
-                return int(val)
-            except ValueError:
-                return 60
-        return 60
+    def get_user_by_name(self, name: str) -> Optional[sqlite3.Row]:
+        with self._pool.read() as conn:
+            return conn.execute(
+                "SELECT id, name, created_ms FROM users WHERE name = ?", (name.strip(),)
+            ).fetchone()
+
+    def get_users(self) -> List[sqlite3.Row]:
+        """All profiles (id, name, created_ms), ordered by name."""
+        with self._pool.read() as conn:
+            return conn.execute(
+                "SELECT id, name, created_ms FROM users ORDER BY name COLLATE NOCASE"
+            ).fetchall()
+
+    def get_user_totals_for_date(self, dt: str) -> List[Tuple[int, str, int]]:
+        """(user_id, name, total_ml) for every profile that logged intake on dt."""
+        with self._pool.read() as conn:
+            c = conn.execute(
+                """
+                SELECT d.user_id, u.name, d.total_ml
+                FROM daily_totals d JOIN users u ON u.id = d.user_id
+                WHERE d.date = ?
+                ORDER BY d.user_id
+                """,
+                (dt,),
+            )
+            return [(r[0], r[1], int(r[2])) for r in c]
+
+    # Change notification
+    def check_external_change(self) -> bool:
+        """
+        Detect commits made by other connections or processes via PRAGMA
+        data_version. Reloads cached settings and notifies listeners with
+        an "external" Change when something changed.
+        """
+        version = self._current_data_version()
+        if version == self._state.data_version:
+            return False
+        with self._state.lock:
+            self._state.settings.clear()
+            self._state.data_version = version
+        self._notify(Change("external"))
+        return True
+
+    def data_version(self) -> Tuple[int, int]:
+        """
+        A value that changes after every write by any connection: PRAGMA
+        data_version for other connections and processes, plus the
+        writer's change count for our own. Cheap enough to key caches on.
+        """
+        with self._pool.write() as conn:
+            return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+    def schema_version(self) -> int:
+        with self._pool.read() as conn:
+            c = conn.cursor()
+            c.execute("PRAGMA user_version")
+            return c.fetchone()[0]
+
+    # Daily totals maintenance
+    def _adjust_daily_total(self, c: sqlite3.Cursor, date_str: str, delta_ml: int, delta_entries: int):
+        c.execute(
+            """
+            INSERT INTO daily_totals (user_id, date, total_ml, entries) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id, date) DO UPDATE SET
+                total_ml = total_ml + excluded.total_ml,
+                entries = entries + excluded.entries
+            """,
+            (self.user_id, date_str, int(delta_ml), int(delta_entries)),
+        )
+        c.execute(
+            "DELETE FROM daily_totals WHERE user_id = ? AND date = ? AND entries <= 0",
+            (self.user_id, date_str),
+        )
+
+    # Settings (simple key/value, cached in-process)
+    def _current_data_version(self) -> int:
+        # data_version only changes when *another* connection commits, so it
+        # is read on the writer, whose own commits keep the cache up to date
+        with self._pool.write() as conn:
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load_settings(self) -> Dict[str, str]:
+        # read on the writer, and cache under its lock, so a concurrent
+        # set_setting() can neither be missed nor overwritten
+        with self._pool.write() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM settings WHERE user_id = ?", (self.user_id,)
+            ).fetchall()
+            with self._state.lock:
+                return self._state.settings.setdefault(
+                    self.user_id, {r["key"]: r["value"] for r in rows}
+                )
+
+    def _check_settings_fresh(self):
+        now = time.monotonic()
+        if now - self._state.checked < SETTINGS_RECHECK_S:
+            return
+        self._state.checked = now
+        self.check_external_change()
+
+    def set_setting(self, key: str, value: str):
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.execute(
+                "INSERT OR REPLACE INTO settings (user_id, key, value) VALUES (?, ?, ?)",
+                (self.user_id, key, value),
+            )
+            self._pool.commit()
+            with self._state.lock:
+                cached = self._state.settings.get(self.user_id)
+                if cached is not None:
+                    cached[key] = value
+            self._notify(Change("settings", key=key, user_id=self.user_id))
+
+    def get_setting(self, key: str) -> Optional[str]:
+        self._check_settings_fresh()
+        settings = self._state.settings.get(self.user_id)
+        if settings is None:
+            settings = self._load_settings()
+        return settings.get(key)
 
     # Intake logging
     def log_intake(self, amount_ml: int, ts: Optional[datetime] = None):
@@ -93,103 +504,562 @@ class Database:
             ts = datetime.now()
         date_str = ts.date().isoformat()
         timestamp_str = ts.isoformat()
-        c = self.conn.cursor()
-        c.execute(
-            "INSERT INTO intake (date, timestamp, amount_ml) VALUES (?,?,?)",
-            (date_str, timestamp_str, int(amount_ml)),
-        )
-        self.conn.commit()
-        return c.lastrowid
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO intake (user_id, date, timestamp, ts_ms, amount_ml) VALUES (?,?,?,?,?)",
+                (self.user_id, date_str, timestamp_str, to_epoch_ms(ts), int(amount_ml)),
+            )
+            entry_id = c.lastrowid
+            self._adjust_daily_total(c, date_str, int(amount_ml), 1)
+            self._pool.commit()
+            self._notify(Change("intake", (date_str,), user_id=self.user_id))
+            return entry_id
+
+    def log_intakes(self, entries: Iterable[IntakeItem],
+                    update_totals: bool = True) -> int:
+        """
+        Bulk version of log_intake. entries yields amounts, (amount_ml, ts)
+        pairs or (amount_ml, ts, entries) triples; everything is inserted
+        in one transaction.
+        With update_totals=False the daily rollup is left alone and the
+        caller must call rebuild_daily_totals() for the affected dates.
+        Returns the number of entries logged.
+        """
+        now = datetime.now()
+        rows = []
+        deltas = {}
+        for entry in entries:
+            amount_ml, ts, weight = split_intake(entry, now)
+            date_str = ts.date().isoformat()
+            rows.append((self.user_id, date_str, ts.isoformat(), to_epoch_ms(ts), amount_ml, weight))
+            total, count = deltas.get(date_str, (0, 0))
+            deltas[date_str] = (total + amount_ml, count + weight)
+        if not rows:
+            return 0
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.executemany(
+                "INSERT INTO intake (user_id, date, timestamp, ts_ms, amount_ml, entries) "
+                "VALUES (?,?,?,?,?,?)",
+                rows,
+            )
+            if update_totals:
+                for date_str, (total, count) in deltas.items():
+                    self._adjust_daily_total(c, date_str, total, count)
+            self._pool.commit()
+            if update_totals:
+                self._notify(Change("intake", tuple(deltas), user_id=self.user_id))
+        return len(rows)
+
+    def rebuild_daily_totals(self, dates: Optional[Iterable[str]] = None):
+        """
+        Recompute this profile's daily rollup from the raw intake rows, for
+        the given dates or (dates=None) for its whole history.
+        """
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            if dates is None:
+                _rebuild_daily_totals(c, self.user_id)
+                changed = ()
+            else:
+                changed = tuple(sorted(set(dates)))
+                for i in range(0, len(changed), 500):
+                    chunk = changed[i:i + 500]
+                    marks = ",".join("?" * len(chunk))
+                    c.execute(
+                        f"DELETE FROM daily_totals WHERE user_id = ? AND date IN ({marks})",
+                        (self.user_id,) + chunk,
+                    )
+                    c.execute(
+                        f"""
+                        INSERT INTO daily_totals (user_id, date, total_ml, entries)
+                        SELECT user_id, date, SUM(amount_ml), SUM(entries) FROM intake
+                        WHERE user_id = ? AND date IN ({marks}) GROUP BY user_id, date
+                        """,
+                        (self.user_id,) + chunk,
+                    )
+            self._pool.commit()
+            self._notify(Change("intake", changed, user_id=self.user_id))
 
     def update_entry_amount(self, entry_id: int, amount_ml: int):
-        c = self.conn.cursor()
-        c.execute(
-            "UPDATE intake SET amount_ml = ? WHERE id = ?", (int(amount_ml), int(entry_id))
-        )
-        self.conn.commit()
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT date, amount_ml, entries FROM intake WHERE id = ? AND user_id = ?",
+                (int(entry_id), self.user_id),
+            )
+            old = c.fetchone()
+            if old is None:
+                return
+            c.execute(
+                "UPDATE intake SET amount_ml = ? WHERE id = ?", (int(amount_ml), int(entry_id))
+            )
+            self._adjust_daily_total(c, old["date"], int(amount_ml) - old["amount_ml"], 0)
+            self._pool.commit()
+            self._notify(Change("intake", (old["date"],), user_id=self.user_id))
 
     def update_entry_timestamp(self, entry_id: int, timestamp_iso: str):
-        c = self.conn.cursor()
-        # also update date column to match new timestamp's date
-        try:
-            dt = datetime.fromisoformat(timestamp_iso)
-            date_str = dt.date().isoformat()
-        except Exception:
-            date_str = timestamp_iso.split("T")[0] if "T" in timestamp_iso else timestamp_iso
-        c.execute(
-            "UPDATE intake SET timestamp = ?, date = ? WHERE id = ?",
-            (timestamp_iso, date_str, int(entry_id))
-        )
-        self.conn.commit()
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            # also update date column to match new timestamp's date
+            try:
+                dt = datetime.fromisoformat(timestamp_iso)
+                date_str = dt.date().isoformat()
+                ts_ms = to_epoch_ms(dt)
+            except Exception:
+                date_str = timestamp_iso.split("T")[0] if "T" in timestamp_iso else timestamp_iso
+                ts_ms = None
+            c.execute(
+                "SELECT date, amount_ml, entries FROM intake WHERE id = ? AND user_id = ?",
+                (int(entry_id), self.user_id),
+            )
+            old = c.fetchone()
+            if old is None:
+                return
+            c.execute(
+                "UPDATE intake SET timestamp = ?, ts_ms = ?, date = ? WHERE id = ?",
+                (timestamp_iso, ts_ms, date_str, int(entry_id))
+            )
+            if old["date"] != date_str:
+                self._adjust_daily_total(c, old["date"], -old["amount_ml"], -old["entries"])
+                self._adjust_daily_total(c, date_str, old["amount_ml"], old["entries"])
+            self._pool.commit()
+            self._notify(Change("intake", tuple({old["date"], date_str}), user_id=self.user_id))
 
     def get_intake_for_date(self, dt: str) -> int:
         """
         dt: date string 'YYYY-MM-DD'
         returns total ml for that date
         """
-        c = self.conn.cursor()
-        c.execute(
-            "SELECT SUM(amount_ml) as total FROM intake WHERE date = ?", (dt,)
-        )
-        row = c.fetchone()
-        return int(row["total"]) if row and row["total"] is not None else 0
+        with self._pool.read() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT total_ml as total FROM daily_totals WHERE user_id = ? AND date = ?",
+                (self.user_id, dt),
+            )
+            row = c.fetchone()
+            return int(row["total"]) if row and row["total"] is not None else 0
 
     def get_entries_for_date(self, dt: str) -> List[sqlite3.Row]:
-        c = self.conn.cursor()
-        c.execute(
-            "SELECT id, date, timestamp, amount_ml FROM intake WHERE date = ? ORDER BY timestamp ASC",
-            (dt,),
-        )
-        return c.fetchall()
+        with self._pool.read() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT id, date, timestamp, amount_ml FROM intake "
+                "WHERE user_id = ? AND date = ? ORDER BY timestamp ASC",
+                (self.user_id, dt),
+            )
+            return c.fetchall()
 
     def get_entry_by_id(self, entry_id: int) -> Optional[sqlite3.Row]:
-        c = self.conn.cursor()
-        c.execute("SELECT id, date, timestamp, amount_ml FROM intake WHERE id = ?", (entry_id,))
-        return c.fetchone()
+        with self._pool.read() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT id, date, timestamp, amount_ml FROM intake WHERE id = ? AND user_id = ?",
+                (entry_id, self.user_id),
+            )
+            return c.fetchone()
 
     def delete_entry(self, entry_id: int):
-        c = self.conn.cursor()
-        c.execute("DELETE FROM intake WHERE id = ?", (int(entry_id),))
-        self.conn.commit()
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT date, amount_ml, entries FROM intake WHERE id = ? AND user_id = ?",
+                (int(entry_id), self.user_id),
+            )
+            old = c.fetchone()
+            if old is None:
+                return
+            c.execute("DELETE FROM intake WHERE id = ?", (int(entry_id),))
+            self._adjust_daily_total(c, old["date"], -old["amount_ml"], -old["entries"])
+            self._pool.commit()
+            self._notify(Change("intake", (old["date"],), user_id=self.user_id))
 
     def get_history(self, limit: int = 14) -> List[Tuple[str, int]]:
         """
         Returns list of tuples (date_str, total_ml) ordered DESC by date.
+        A negative limit returns every day.
         """
-        c = self.conn.cursor()
-        c.execute(
-            """
-            SELECT date, SUM(amount_ml) as total
-            FROM intake
-            GROUP BY date
-            ORDER BY date DESC
-            LIMIT ?
-            """,
-            (limit,),
-        )
-        rows = c.fetchall()
-        return [(r["date"], int(r["total"] or 0)) for r in rows]
+        with self._pool.read() as conn:
+            a = self._archive(conn)
+            c = conn.cursor()
+            c.execute(
+                """
+                SELECT date, total_ml as total
+                FROM daily_totals
+                WHERE user_id = ? AND date > ?
+                ORDER BY date DESC
+                LIMIT ?
+                """,
+                (self.user_id, a.through if a else "", limit),
+            )
+            rows = [(r["date"], int(r["total"] or 0)) for r in c.fetchall()]
+        if a is not None and (limit < 0 or len(rows) < limit):
+            hi = a.n_days
+            lo = 0 if limit < 0 else max(0, hi - (limit - len(rows)))
+            rows += zip(a.dates[lo:hi][::-1], a.column("total_ml")[lo:hi].tolist()[::-1])
+        return rows
+
+    def totals_between(self, start: str, end: str) -> List[Tuple[str, int]]:
+        """
+        (date_str, total_ml) for every day from start to end inclusive
+        ('YYYY-MM-DD'), oldest first, with 0 for days without intake.
+        One range scan of daily_totals.
+        """
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        with self._pool.read() as conn:
+            a = self._archive(conn)
+            c = conn.cursor()
+            c.row_factory = None
+            c.execute(
+                "SELECT date, total_ml FROM daily_totals WHERE user_id = ? AND date BETWEEN ? AND ?",
+                (self.user_id, max(first.isoformat(), self._after(a)), last.isoformat()),
+            )
+            totals = dict(c.fetchall())
+        if a is not None:
+            lo, hi = a.day_range(first.isoformat(), last.isoformat())
+            totals.update(zip(a.dates[lo:hi], a.column("total_ml")[lo:hi].tolist()))
+        days = (first + timedelta(days=i) for i in range((last - first).days + 1))
+        return [(d, int(totals.get(d, 0))) for d in map(date.isoformat, days)]
 
     def clear_entries_for_date(self, date_str):
-        cur = self.conn.cursor()
-        cur.execute("DELETE FROM intake WHERE DATE(timestamp) = ?", (date_str,))
-        self.conn.commit()
+        with self._pool.write() as conn:
+            cur = conn.cursor()
+            # the date column always mirrors DATE(timestamp), so filter on it to
+            # stay on idx_intake_user_date_ts
+            cur.execute("DELETE FROM intake WHERE user_id = ? AND date = ?", (self.user_id, date_str))
+            cur.execute(
+                "DELETE FROM daily_totals WHERE user_id = ? AND date = ?", (self.user_id, date_str)
+            )
+            self._pool.commit()
+            self._notify(Change("intake", (date_str,), user_id=self.user_id))
 
-    def export_history_txt(self, file_path: str):
-        try:
-            rows = self.get_history(3650)  # get up to 10 years of data
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write("Water Intake History\n")
-                f.write("=====================\n\n")
-                for dt, total in rows:
-                    f.write(f"{dt}: {total} ml\n")
-            return True  # success
-        except Exception as e:
-            print(f"Error exporting history: {e}")
+    # Streaming reads (exports, imports, reports)
+    def _date_range_sql(self, start: Optional[str], end: Optional[str],
+                        a: Optional[archive.Archive] = None) -> Tuple[str, tuple]:
+        """WHERE clause for this profile's rows between start and end, minus what a holds."""
+        clauses, params = ["user_id = ?"], [self.user_id]
+        if a is not None:
+            start = max(start or "", self._after(a))
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        return " WHERE " + " AND ".join(clauses), tuple(params)
+
+    def count_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Number of intake rows between start and end (inclusive 'YYYY-MM-DD')."""
+        with self._pool.read() as conn:
+            a = self._archive(conn)
+            where, params = self._date_range_sql(start, end, a)
+            row = conn.execute(f"SELECT SUM(entries) FROM daily_totals{where}", params).fetchone()
+        archived = 0
+        if a is not None:
+            lo, hi = a.day_range(start, end)
+            archived = sum(a.column("entries")[lo:hi])
+        return int(row[0] or 0) + archived
+
+    def count_days(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        with self._pool.read() as conn:
+            a = self._archive(conn)
+            where, params = self._date_range_sql(start, end, a)
+            n = conn.execute(f"SELECT COUNT(*) FROM daily_totals{where}", params).fetchone()[0]
+        if a is not None:
+            lo, hi = a.day_range(start, end)
+            n += hi - lo
+        return n
+
+    def iter_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                     batch_size: int = 5000) -> Iterator[List[sqlite3.Row]]:
+        """
+        Yields batches of intake rows (id, date, timestamp, ts_ms, amount_ml,
+        entries) in chronological order, holding one reader connection open while
+        the caller consumes them so memory stays bounded.
+        """
+        where, params = self._date_range_sql(start, end)
+        with self._pool.read() as conn:
+            c = conn.execute(
+                f"SELECT id, date, timestamp, ts_ms, amount_ml, entries FROM intake{where} "
+                "ORDER BY date, timestamp",
+                params,
+            )
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def iter_daily_totals(self, start: Optional[str] = None, end: Optional[str] = None,
+                          batch_size: int = 5000, descending: bool = False
+                          ) -> Iterator[List[sqlite3.Row]]:
+        """Yields batches of daily_totals rows (date, total_ml, entries)."""
+        order = "DESC" if descending else "ASC"
+        with self._pool.read() as conn:
+            a = self._archive(conn)
+            if a is not None and not descending:
+                yield from self._archived_daily_totals(a, start, end, batch_size, descending)
+            where, params = self._date_range_sql(start, end, a)
+            c = conn.execute(
+                f"SELECT date, total_ml, entries FROM daily_totals{where} ORDER BY date {order}",
+                params,
+            )
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            if a is not None and descending:
+                yield from self._archived_daily_totals(a, start, end, batch_size, descending)
+
+    @staticmethod
+    def _archived_daily_totals(a: archive.Archive, start: Optional[str], end: Optional[str],
+                               batch_size: int, descending: bool) -> Iterator[List[DailyTotalRow]]:
+        lo, hi = a.day_range(start, end)
+        steps = range(hi, lo, -batch_size) if descending else range(lo, hi, batch_size)
+        for i in steps:
+            j, k = (max(lo, i - batch_size), i) if descending else (i, min(hi, i + batch_size))
+            rows = list(map(DailyTotalRow, zip(a.dates[j:k], a.column("total_ml")[j:k].tolist(),
+                                                a.column("entries")[j:k].tolist())))
+            yield rows[::-1] if descending else rows
+
+    def packed_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> List[int]:
+        """
+        Every entry between start and end, in chronological order, packed
+        into one integer for bulk array loading:
+            epoch_day << 37 | hour << 32 | amount_ml
+        epoch_day counts local calendar days from 1970-01-01. One column
+        per row keeps the per-row Python overhead to a minimum.
+        """
+        chunks = self.packed_entry_chunks(start, end)
+        if len(chunks) == 1:
+            return chunks[0]
+        archived, recent = chunks
+        return archived.tolist() + recent
+
+    def packed_entry_chunks(self, start: Optional[str] = None, end: Optional[str] = None
+                            ) -> List[Sequence[int]]:
+        """
+        packed_entries() in consecutive pieces: a zero-copy int64 view of
+        the sealed archive, if there is one, then a list for the days after
+        it. np.asarray() takes the view without converting its items.
+        """
+        with self._pool.read() as conn:
+            a = self._archive(conn)
+            where, params = self._date_range_sql(start, end, a)
+            c = conn.cursor()
+            c.row_factory = None
+            c.execute(
+                f"SELECT {_PACKED_SQL} FROM intake{where} AND {_PACKABLE_SQL} "
+                "ORDER BY date, timestamp", params
+            )
+            recent = list(itertools.chain.from_iterable(c))
+        if a is None:
+            return [recent]
+        lo, hi = a.entry_range(*a.day_range(start, end))
+        return [a.column("packed")[lo:hi], recent]
+
+    def existing_intake_keys(self, start_ms: int, end_ms: int) -> set:
+        """(ts_ms, amount_ml) pairs already stored between start_ms and end_ms inclusive."""
+        with self._pool.read() as conn:
+            c = conn.execute(
+                "SELECT ts_ms, amount_ml FROM intake WHERE user_id = ? AND ts_ms BETWEEN ? AND ?",
+                (self.user_id, int(start_ms), int(end_ms)),
+            )
+            return {(r[0], r[1]) for r in c}
+
+    # Columnar archive of closed days (see archive.py)
+    def seal_archive(self, through: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Write this profile's entries dated up to `through` (default:
+        yesterday) to a columnar archive file, which the long-range reads
+        then use for those days instead of SQLite. The rows are read in
+        one snapshot on a reader connection, so writes carry on meanwhile;
+        a later write to a sealed day retires the archive until the next
+        seal. Returns (days, entries) in the archive; (0, 0) for in-memory
+        databases.
+        """
+        if self._archive_base is None:
+            return 0, 0
+        through = through or (date.today() - timedelta(days=1)).isoformat()
+        with self._pool.read() as conn:
+            current = self._archive(conn)
+        if current is not None and current.through == through:
+            return current.n_days, current.n_entries
+        with self._pool.write() as conn:
+            conn.execute(
+                "INSERT INTO archive_seal (user_id, through) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET through = excluded.through",
+                (self.user_id, through),
+            )
+            self._pool.commit()
+        self.flush()
+        with self._pool.read() as conn:
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute(
+                    "SELECT generation FROM archive_seal WHERE user_id = ? AND through = ?",
+                    (self.user_id, through),
+                ).fetchone()
+                if row is None:
+                    return 0, 0   # re-sealed by another process meanwhile
+                path = archive.archive_name(self._archive_base, self.user_id, through, row[0])
+                c = conn.cursor()
+                c.row_factory = None
+                c.execute(
+                    f"SELECT date, ts_ms, {_PACKED_SQL}, amount_ml, entries FROM intake "
+                    f"WHERE user_id = ? AND date <= ? AND {_PACKABLE_SQL} ORDER BY date, timestamp",
+                    (self.user_id, through),
+                )
+                counts = archive.write_archive(path, self.user_id, through, row[0], c)
+            finally:
+                conn.rollback()
+        self._drop_archives(self.user_id, keep=path)
+        return counts
+
+    def _archive(self, conn: sqlite3.Connection) -> Optional[archive.Archive]:
+        """This profile's archive, if it is sealed and still matches the database."""
+        if self._archive_base is None:
+            return None
+        row = conn.execute(
+            "SELECT through, generation FROM archive_seal WHERE user_id = ?", (self.user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        key = (row[0], row[1])
+        cached = self._archives.get(self.user_id)
+        if cached is None or cached[0] != key:
+            with self._state.lock:
+                try:
+                    a = archive.Archive(archive.archive_name(self._archive_base, self.user_id, *key))
+                except OSError:
+                    # seal_archive() records the seal before writing the
+                    # file; not cached, so the next read looks again
+                    return None
+                except ValueError:
+                    a = None   # written by a newer version
+                if a is not None and (a.user_id, a.through, a.generation) != (self.user_id,) + key:
+                    a.close()
+                    a = None
+                # a replaced archive is left for the garbage collector to
+                # unmap: other threads may still be reading it
+                cached = self._archives[self.user_id] = (key, a)
+        return cached[1]
+
+    @staticmethod
+    def _after(a: Optional[archive.Archive]) -> str:
+        """First date SQLite is asked for when a holds the days before it."""
+        return archive.day_to_iso(a.through_day + 1) if a is not None else ""
+
+    def _drop_archives(self, user_id: int, keep: Optional[str] = None):
+        """Forget a profile's cached archive and delete its files (except keep)."""
+        if self._archive_base is None:
+            return
+        with self._state.lock:
+            self._archives.pop(user_id, None)
+        pattern = f"{glob.escape(self._archive_base)}.u{int(user_id)}.*{archive.SUFFIX}"
+        for path in glob.glob(pattern):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass   # still mapped by a reader (Windows); removed next time
+
+    # Retention / compaction
+    def compact_entries(self, before: str, granularity: str = COMPACT_DAY) -> Tuple[int, int]:
+        """
+        Replace this profile's raw entries dated before `before`
+        ('YYYY-MM-DD', exclusive) with one aggregate row per day or per
+        hour, in one transaction. An aggregate row keeps the earliest
+        timestamp, the summed amount and the number of entries it stands
+        for, so daily totals and entry counts are unchanged. Buckets that
+        already hold a single row are left alone.
+        Returns (rows removed, aggregate rows written).
+        """
+        if granularity not in (COMPACT_DAY, COMPACT_HOUR):
+            raise ValueError(f"Unknown compaction granularity: {granularity!r}")
+        bucket = "date" if granularity == COMPACT_DAY else "substr(timestamp, 1, 13)"
+        scope = (self.user_id, before)
+        with self._pool.write() as conn:
+            c = conn.cursor()
+            if not conn.in_transaction:
+                # ids above last_id must all be ours, so hold the write lock
+                # from the start
+                c.execute("BEGIN IMMEDIATE")
+            last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM intake").fetchone()[0]
+            c.execute(
+                f"""
+                INSERT INTO intake (user_id, date, timestamp, ts_ms, amount_ml, entries)
+                SELECT user_id, date, MIN(timestamp), MIN(ts_ms), SUM(amount_ml), SUM(entries)
+                FROM intake WHERE user_id = ? AND date < ?
+                GROUP BY date, {bucket} HAVING COUNT(*) > 1
+                """,
+                scope,
+            )
+            written = c.rowcount
+            c.execute(
+                f"""
+                DELETE FROM intake
+                WHERE user_id = ? AND date < ? AND id <= ? AND (date, {bucket}) IN (
+                    SELECT date, {bucket} FROM intake
+                    WHERE user_id = ? AND date < ? AND id > ?
+                )
+                """,
+                scope + (last_id,) + scope + (last_id,),
+            )
+            removed = c.rowcount
+            self._pool.commit()
+            if written:
+                self._notify(Change("intake", user_id=self.user_id))
+            return removed, written
+
+    def file_stats(self) -> Dict[str, int]:
+        """page_size, page_count, freelist_count and auto_vacuum mode (2 = incremental)."""
+        with self._pool.write() as conn:
+            return {
+                name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")
+            }
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Switch a file created before auto_vacuum=INCREMENTAL was the
+        default over to it. That takes one full VACUUM, which rewrites the
+        whole file, so call it when idle. Returns True if it ran.
+        """
+        if self.file_stats()["auto_vacuum"] == 2:
             return False
+        self.flush()
+        with self._pool.write() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        return True
+
+    def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """
+        Return up to max_pages free pages (0: all) to the file system.
+        Needs auto_vacuum=INCREMENTAL. Returns the number of bytes freed.
+        """
+        self.flush()
+        with self._pool.write() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # the pragma frees one page per step and execute() steps only
+            # once; executescript() runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return (before - after) * page_size
 
     def close(self):
-        self.conn.close()
+        """Close the connections and archives (views from for_user() leave them open)."""
+        if self._owns_storage:
+            with self._state.lock:
+                for _key, a in self._archives.values():
+                    if a is not None:
+                        a.close()
+                self._archives.clear()
+            self._pool.close()
 
 
 if __name__ == "__main__":
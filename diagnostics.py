@@ -0,0 +1,324 @@
+# diagnostics.py
+"""
+Opt-in latency instrumentation for the Water Intake Tracker.
+
+While enabled:
+- every public method of the storage backends (Database, MemoryDatabase,
+  LogDatabase) is timed (the classes are patched on enable() and restored
+  on disable(), so a disabled tracker runs the original methods untouched)
+- each SQL statement on an attached Database is timed through sqlite3's
+  trace callback, from the statement starting to the next statement on the
+  same thread or the Database call returning, and grouped by its text with
+  literals replaced by '?'
+- span("name") blocks and @timed("name") functions in the GUI, chart
+  and server code are timed
+
+Timings go into per-name histograms: fixed buckets for the Prometheus
+dump plus a ring buffer of the most recent samples for percentiles.
+When disabled, span() returns a shared no-op context manager.
+
+Standard library only, so the CLI and server can use it as well.
+
+    diagnostics.enable(db)
+    ...
+    diagnostics.dump("timings.prom")   # or .json
+"""
+
+import functools
+import json
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+# histogram bucket upper bounds, seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# recent samples kept per name for percentiles
+RING_SIZE = 1024
+
+SQL_PREFIX = "sql "
+FORMAT_JSON = "json"
+FORMAT_PROMETHEUS = "prometheus"
+
+# storage methods left unwrapped: generators (a span would only time
+# creating them) and the listener and trace plumbing
+_SKIP = {"add_listener", "remove_listener", "set_trace_callback", "iter_entries", "iter_daily_totals"}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement text with whitespace collapsed and literals replaced by '?'."""
+    sql = _LITERALS.sub("?", " ".join(sql.split()))
+    return _LISTS.sub("(?, ...)", sql)
+
+
+class Histogram:
+    __slots__ = ("count", "total", "max", "buckets", "recent")
+
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)   # last one is +Inf
+        self.recent = deque(maxlen=ring_size)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        """q-th percentile (0..100) of the recent samples, in seconds."""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "max_ms": self.max * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "t0")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Recorder:
+    """Histograms by name, plus the SQL statement timer."""
+
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.ring_size = ring_size
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._local = threading.local()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            h = self._histograms.get(name)
+            if h is None:
+                h = self._histograms[name] = Histogram(self.ring_size)
+            h.add(seconds)
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.started = time.time()
+
+    # SQL statements
+    def trace_sql(self, sql: str):
+        """sqlite3 trace callback: a statement is starting on this thread."""
+        now = time.perf_counter()
+        self.finish_sql(now)
+        self._local.open = (sql, now)
+
+    def finish_sql(self, now: Optional[float] = None):
+        open_stmt = getattr(self._local, "open", None)
+        if open_stmt is None:
+            return
+        self._local.open = None
+        sql, t0 = open_stmt
+        self.record(SQL_PREFIX + normalize_sql(sql), (now or time.perf_counter()) - t0)
+
+    # Output
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {name: h.to_dict() for name, h in sorted(self._histograms.items())}
+
+    def to_json(self) -> str:
+        return json.dumps({"started": self.started, "timings": self.snapshot()}, indent=1)
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            items = sorted(self._histograms.items())
+            rows = [(name, h.count, h.total, list(h.buckets)) for name, h in items]
+        lines: List[str] = []
+        for metric, label, sql in (("water_span_seconds", "name", False),
+                                   ("water_sql_seconds", "statement", True)):
+            selected = [r for r in rows if r[0].startswith(SQL_PREFIX) == sql]
+            if not selected:
+                continue
+            lines.append(f"# TYPE {metric} histogram")
+            for name, count, total, buckets in selected:
+                value = _label(name[len(SQL_PREFIX):] if sql else name)
+                cumulative = 0
+                for bound, n in zip([str(b) for b in BUCKETS] + ["+Inf"], buckets):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}="{value}"}} {total:.6f}')
+                lines.append(f'{metric}_count{{{label}="{value}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ---------- Module state ----------
+_recorder: Optional[Recorder] = None
+_state_lock = threading.Lock()
+_originals: Dict[tuple, object] = {}   # (class, attribute) -> original
+_attached: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def recorder() -> Optional[Recorder]:
+    return _recorder
+
+
+def span(name: str):
+    """Time a block under name while enabled; a shared no-op otherwise."""
+    rec = _recorder
+    return _NULL_SPAN if rec is None else _Span(rec, name)
+
+
+def timed(name: str):
+    """Decorator: time every call as a span named name while enabled."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rec = _recorder
+            if rec is None:
+                return fn(*args, **kwargs)
+            with _Span(rec, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _timed_method(name: str, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        rec = _recorder
+        if rec is None:
+            return fn(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            now = time.perf_counter()
+            rec.finish_sql(now)
+            rec.record(name, now - t0)
+    return wrapper
+
+
+def _storage_classes():
+    from database import Database
+    from log_database import LogDatabase
+    from memory_database import MemoryDatabase
+    from storage import Storage
+    return Storage, Database, MemoryDatabase, LogDatabase
+
+
+def _patch_database():
+    import inspect
+    for cls in _storage_classes():
+        for attr, value in list(vars(cls).items()):
+            if (attr.startswith("_") or attr in _SKIP or not inspect.isfunction(value)
+                    or inspect.isgeneratorfunction(value) or getattr(value, "__isabstractmethod__", False)):
+                continue
+            _originals[cls, attr] = value
+            setattr(cls, attr, _timed_method(f"db.{attr}", value))
+
+
+def _unpatch_database():
+    for (cls, attr), value in _originals.items():
+        setattr(cls, attr, value)
+    _originals.clear()
+
+
+def attach(db):
+    """Time db's SQL statements (enable() does this for the dbs it is given)."""
+    rec = _recorder
+    if rec is not None:
+        db.set_trace_callback(rec.trace_sql)
+        _attached.add(db)
+
+
+def enable(*dbs, ring_size: int = RING_SIZE) -> Recorder:
+    """Start recording (no-op if already recording); attaches dbs."""
+    global _recorder
+    with _state_lock:
+        if _recorder is None:
+            _recorder = Recorder(ring_size)
+            _patch_database()
+    for db in dbs:
+        attach(db)
+    return _recorder
+
+
+def disable():
+    """Stop recording and restore the original storage methods."""
+    global _recorder
+    with _state_lock:
+        if _recorder is None:
+            return
+        _recorder = None
+        _unpatch_database()
+        for db in list(_attached):
+            db.set_trace_callback(None)
+        _attached.clear()
+
+
+def format_for_path(path: str) -> str:
+    return FORMAT_JSON if path.lower().endswith(".json") else FORMAT_PROMETHEUS
+
+
+def dump(path: str, fmt: Optional[str] = None):
+    """Write the current timings as JSON or Prometheus text (by extension by default)."""
+    rec = _recorder
+    if rec is None:
+        raise RuntimeError("diagnostics are not enabled")
+    fmt = fmt or format_for_path(path)
+    text = rec.to_json() if fmt == FORMAT_JSON else rec.to_prometheus()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
@@ -0,0 +1,152 @@
+# exporter.py
+"""
+Streaming export of intake history.
+Rows are read from the database in batches and written straight to the
+output file, so memory use does not grow with the size of the history.
+
+Formats:
+- txt: the original "Water Intake History" report (daily totals, newest first)
+- csv: header row, then one row per entry or per day
+- jsonl: one JSON object per line
+- bin: gzip-compressed little-endian records after a small header
+    header: b"WIEX", version (u8), granularity (u8: 0 = entry, 1 = day)
+    entry record: ts_ms (i64, 0 if unknown), amount_ml (i32), entries (i32)
+    day record: date ordinal (i32), total_ml (i32), entries (i32)
+"""
+
+import csv
+import gzip
+import json
+import os
+import struct
+from datetime import date
+from typing import Callable, Optional
+
+FORMAT_TXT = "txt"
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMAT_BIN = "bin"
+FORMATS = (FORMAT_TXT, FORMAT_CSV, FORMAT_JSONL, FORMAT_BIN)
+
+GRANULARITY_ENTRY = "entry"
+GRANULARITY_DAY = "day"
+
+BIN_MAGIC = b"WIEX"
+# version 2 added entries to entry records
+BIN_VERSION = 2
+_ENTRY_RECORD = struct.Struct("<qii")
+_DAY_RECORD = struct.Struct("<iii")
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def format_for_path(path: str) -> str:
+    """Guess the export format from a file extension (defaults to csv)."""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("gz", "wiex"):
+        return FORMAT_BIN
+    if ext in ("json", "ndjson"):
+        return FORMAT_JSONL
+    return ext if ext in FORMATS else FORMAT_CSV
+
+
+def export(db, path: str, fmt: str = FORMAT_CSV, granularity: str = GRANULARITY_DAY,
+           start: Optional[str] = None, end: Optional[str] = None,
+           progress: Optional[Callable[[int, int], None]] = None,
+           cancelled: Optional[Callable[[], bool]] = None,
+           batch_size: int = 5000) -> int:
+    """
+    Export intake between start and end ('YYYY-MM-DD', inclusive, None for
+    open-ended) to path. progress(done, total) is called after every batch;
+    if cancelled() returns True the partial file is removed and
+    ExportCancelled is raised. Returns the number of records written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    if granularity not in (GRANULARITY_ENTRY, GRANULARITY_DAY):
+        raise ValueError(f"Unknown granularity: {granularity!r}")
+    if fmt == FORMAT_TXT:
+        granularity = GRANULARITY_DAY
+
+    if granularity == GRANULARITY_ENTRY:
+        total = db.count_entries(start, end)
+        batches = db.iter_entries(start, end, batch_size=batch_size)
+    else:
+        total = db.count_days(start, end)
+        batches = db.iter_daily_totals(start, end, batch_size=batch_size,
+                                       descending=(fmt == FORMAT_TXT))
+
+    # write next to the target and rename at the end, so a failed or
+    # cancelled export never leaves a truncated file behind
+    tmp_path = path + ".part"
+    done = 0
+    try:
+        with _open_output(tmp_path, fmt) as f:
+            write = _writer(f, fmt, granularity)
+            for rows in batches:
+                if cancelled is not None and cancelled():
+                    raise ExportCancelled()
+                write(rows)
+                done += len(rows)
+                if progress is not None:
+                    progress(done, total)
+        os.replace(tmp_path, path)
+    except BaseException:
+        batches.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return done
+
+
+def _open_output(path: str, fmt: str):
+    if fmt == FORMAT_BIN:
+        return gzip.open(path, "wb", compresslevel=6)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def _writer(f, fmt: str, granularity: str) -> Callable:
+    per_entry = granularity == GRANULARITY_ENTRY
+
+    if fmt == FORMAT_TXT:
+        f.write("Water Intake History\n")
+        f.write("=====================\n\n")
+        return lambda rows: f.writelines(f"{r['date']}: {r['total_ml']} ml\n" for r in rows)
+
+    if fmt == FORMAT_CSV:
+        w = csv.writer(f)
+        if per_entry:
+            w.writerow(["id", "date", "timestamp", "amount_ml", "entries"])
+            return lambda rows: w.writerows(
+                (r["id"], r["date"], r["timestamp"], r["amount_ml"], r["entries"]) for r in rows
+            )
+        w.writerow(["date", "total_ml", "entries"])
+        return lambda rows: w.writerows((r["date"], r["total_ml"], r["entries"]) for r in rows)
+
+    if fmt == FORMAT_JSONL:
+        dumps = json.JSONEncoder(separators=(",", ":")).encode
+        if per_entry:
+            return lambda rows: f.writelines(
+                dumps({"id": r["id"], "date": r["date"], "timestamp": r["timestamp"],
+                       "amount_ml": r["amount_ml"], "entries": r["entries"]}) + "\n"
+                for r in rows
+            )
+        return lambda rows: f.writelines(
+            dumps({"date": r["date"], "total_ml": r["total_ml"], "entries": r["entries"]}) + "\n"
+            for r in rows
+        )
+
+    f.write(BIN_MAGIC + bytes([BIN_VERSION, 0 if per_entry else 1]))
+    if per_entry:
+        pack = _ENTRY_RECORD.pack
+        # ts_ms is NULL for legacy timestamps that never parsed; 0 stands in
+        # for it, as in archive.py
+        return lambda rows: f.write(b"".join(
+            pack(r["ts_ms"] or 0, r["amount_ml"], r["entries"]) for r in rows
+        ))
+    pack = _DAY_RECORD.pack
+    return lambda rows: f.write(b"".join(
+        pack(date.fromisoformat(r["date"]).toordinal(), r["total_ml"], r["entries"]) for r in rows
+    ))
@@ -0,0 +1,228 @@
+# importer.py
+"""
+Bulk import of intake histories from CSV or JSON Lines.
+Input is parsed as a stream and inserted in chunked transactions; the
+daily rollup is rebuilt once, for the touched days, at the end.
+
+Each record needs a timestamp and an amount. Accepted field names:
+- timestamp: "timestamp", "time", "datetime", "ts"
+- amount: "amount_ml", "amount", "ml", "volume_ml"
+An optional "entries" field gives the number of entries a compacted row
+stands for (1 if missing), so exported aggregates keep their counts.
+Timestamps may be ISO 8601 (with or without a UTC offset, which is
+converted to local time) or Unix epoch seconds/milliseconds. Files
+written by exporter.py with per-entry granularity import as-is.
+"""
+
+import csv
+import json
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from database import to_epoch_ms
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+
+TIMESTAMP_FIELDS = ("timestamp", "time", "datetime", "ts")
+AMOUNT_FIELDS = ("amount_ml", "amount", "ml", "volume_ml")
+ENTRIES_FIELDS = ("entries",)
+MAX_AMOUNT_ML = 10_000
+MAX_REJECTS_KEPT = 1000
+
+
+@dataclass
+class ImportReport:
+    rows_read: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    elapsed_s: float = 0.0
+    # (line number, reason, raw text) for the first MAX_REJECTS_KEPT rejects
+    rejects: List[Tuple[int, str, str]] = field(default_factory=list)
+    reject_reasons: Counter = field(default_factory=Counter)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows_read / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def summary(self) -> str:
+        lines = [
+            f"read {self.rows_read}, inserted {self.inserted}, duplicates {self.duplicates}, "
+            f"rejected {self.rejected} in {self.elapsed_s:.2f}s ({self.rows_per_sec:,.0f} rows/s)"
+        ]
+        for reason, count in self.reject_reasons.most_common():
+            lines.append(f"  {count} × {reason}")
+        return "\n".join(lines)
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+def format_for_path(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return FORMAT_JSONL if ext in (".jsonl", ".ndjson", ".json") else FORMAT_CSV
+
+
+def parse_timestamp(value) -> datetime:
+    """Normalize an ISO string or epoch number to a naive local datetime."""
+    if value is None or value == "":
+        raise RejectedRow("missing timestamp")
+    if isinstance(value, (int, float)) or str(value).replace(".", "", 1).isdigit():
+        num = float(value)
+        # anything past ~5138 AD in seconds is really milliseconds
+        seconds = num / 1000.0 if num > 1e11 else num
+        try:
+            return datetime.fromtimestamp(seconds)
+        except (OverflowError, OSError, ValueError):
+            raise RejectedRow("timestamp out of range")
+    text = str(value).strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        raise RejectedRow("unparseable timestamp")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def parse_amount(value) -> int:
+    if value is None or value == "":
+        raise RejectedRow("missing amount")
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise RejectedRow("non-numeric amount")
+    if amount != amount or amount <= 0 or amount > MAX_AMOUNT_ML:
+        raise RejectedRow("amount out of range")
+    rounded = int(round(amount))
+    if rounded < 1:
+        raise RejectedRow("amount out of range")
+    return rounded
+
+
+def parse_entries(value) -> int:
+    """Entries a row stands for; 1 when the field is missing or empty."""
+    if value is None or value == "":
+        return 1
+    try:
+        entries = float(value)
+    except (TypeError, ValueError):
+        raise RejectedRow("non-numeric entries")
+    if entries != int(entries) or entries < 1:
+        raise RejectedRow("entries out of range")
+    return int(entries)
+
+
+def _pick(record: Dict, names) -> Optional[object]:
+    for name in names:
+        if name in record:
+            return record[name]
+    return None
+
+
+def _read_csv(f) -> Iterator[Tuple[int, Optional[Dict], str]]:
+    reader = csv.DictReader(f)
+    if reader.fieldnames:
+        reader.fieldnames = [n.strip().lower() for n in reader.fieldnames]
+    for record in reader:
+        yield reader.line_num, record, ",".join(str(v) for v in record.values())
+
+
+def _read_jsonl(f) -> Iterator[Tuple[int, Optional[Dict], str]]:
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, line
+            continue
+        if isinstance(record, dict):
+            record = {str(k).lower(): v for k, v in record.items()}
+        else:
+            record = None
+        yield line_no, record, line
+
+
+def import_file(db, path: str, fmt: Optional[str] = None, chunk_size: int = 10_000,
+                progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """
+    Import intake rows from path into db. Rows matching an existing
+    (timestamp, amount) pair, in the database or earlier in the file, are
+    skipped. progress(report) is called after every committed chunk.
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt not in (FORMAT_CSV, FORMAT_JSONL):
+        raise ValueError(f"Unknown import format: {fmt!r}")
+    report = ImportReport()
+    started = time.perf_counter()
+    touched_dates = set()
+    chunk: List[Tuple[int, datetime, int, int]] = []
+
+    def reject(line_no, reason, raw):
+        report.rejected += 1
+        report.reject_reasons[reason] += 1
+        if len(report.rejects) < MAX_REJECTS_KEPT:
+            report.rejects.append((line_no, reason, raw[:200]))
+
+    def flush():
+        if not chunk:
+            return
+        lo = min(item[0] for item in chunk)
+        hi = max(item[0] for item in chunk)
+        existing = db.existing_intake_keys(lo, hi)
+        # rows from earlier chunks are already in the database by now, so
+        # in-file duplicates only need tracking within the chunk
+        seen = set()
+        fresh = []
+        dates = set()
+        for ts_ms, ts, amount, entries in chunk:
+            key = (ts_ms, amount)
+            if key in existing or key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            fresh.append((amount, ts, entries))
+            dates.add(ts.date().isoformat())
+        report.inserted += db.log_intakes(fresh, update_totals=False)
+        touched_dates.update(dates)
+        chunk.clear()
+        if progress is not None:
+            report.elapsed_s = time.perf_counter() - started
+            progress(report)
+
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            records = _read_jsonl(f) if fmt == FORMAT_JSONL else _read_csv(f)
+            for line_no, record, raw in records:
+                report.rows_read += 1
+                if record is None:
+                    reject(line_no, "malformed record", raw)
+                    continue
+                try:
+                    ts = parse_timestamp(_pick(record, TIMESTAMP_FIELDS))
+                    amount = parse_amount(_pick(record, AMOUNT_FIELDS))
+                    entries = parse_entries(_pick(record, ENTRIES_FIELDS))
+                except RejectedRow as e:
+                    reject(line_no, str(e), raw)
+                    continue
+                chunk.append((to_epoch_ms(ts), ts, amount, entries))
+                if len(chunk) >= chunk_size:
+                    flush()
+            flush()
+    finally:
+        # chunks skip the rollup, so bring it in line with whatever was
+        # committed, even when the import stops half-way
+        if touched_dates:
+            db.rebuild_daily_totals(touched_dates)
+    report.elapsed_s = time.perf_counter() - started
+    return report
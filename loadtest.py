@@ -0,0 +1,185 @@
+# loadtest.py
+"""
+Load test for server.py over localhost.
+
+Starts a server on a scratch database (or targets --url), then runs a
+fixed number of keep-alive client threads for --seconds against a mix of
+single logs, batched logs, totals and conditional history reads, and
+reports requests per second and latency percentiles per endpoint.
+
+    python loadtest.py --clients 16 --seconds 10
+    python loadtest.py --url http://127.0.0.1:8765 --mix log=1
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_MIX = "log=4,batch=1,totals=3,history=2"
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("log", "batch", "totals", "history"):
+            raise ValueError(f"Unknown operation in mix: {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class Client:
+    def __init__(self, host: str, port: int, batch_size: int):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.batch_body = json.dumps([{"amount_ml": 250}] * batch_size)
+        self.etag = None
+
+    def request(self, op: str) -> int:
+        headers = {"Content-Type": "application/json"}
+        if op == "log":
+            self.conn.request("POST", "/intake", '{"amount_ml": 250}', headers)
+        elif op == "batch":
+            self.conn.request("POST", "/intake/batch", self.batch_body, headers)
+        elif op == "totals":
+            self.conn.request("GET", "/totals")
+        else:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            self.conn.request("GET", "/history?limit=30", headers=headers)
+        resp = self.conn.getresponse()
+        resp.read()
+        if op == "history" and resp.getheader("ETag"):
+            self.etag = resp.getheader("ETag")
+        return resp.status
+
+
+def run(host: str, port: int, clients: int, seconds: float, mix: Dict[str, int],
+        batch_size: int, seed: int) -> Dict:
+    ops, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[int, int] = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        client = Client(host, port, batch_size)
+        local: Dict[str, List[float]] = defaultdict(list)
+        local_status: Dict[int, int] = defaultdict(int)
+        while time.perf_counter() < deadline:
+            op = rng.choices(ops, weights)[0]
+            t0 = time.perf_counter()
+            status = client.request(op)
+            local[op].append(time.perf_counter() - t0)
+            local_status[status] += 1
+        client.conn.close()
+        with lock:
+            for op, samples in local.items():
+                latencies[op].extend(samples)
+            for status, count in local_status.items():
+                statuses[status] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    report = {"clients": clients, "seconds": elapsed, "statuses": dict(statuses), "ops": {}}
+    everything = []
+    for op, samples in latencies.items():
+        samples.sort()
+        everything.extend(samples)
+        report["ops"][op] = {
+            "requests": len(samples),
+            "rps": len(samples) / elapsed,
+            "p50_ms": percentile(samples, 0.50) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "max_ms": samples[-1] * 1000,
+        }
+    everything.sort()
+    if everything:
+        report["total"] = {
+            "requests": len(everything),
+            "rps": len(everything) / elapsed,
+            "p50_ms": percentile(everything, 0.50) * 1000,
+            "p99_ms": percentile(everything, 0.99) * 1000,
+            "max_ms": everything[-1] * 1000,
+        }
+    return report
+
+
+def print_report(report: Dict):
+    print(f"{report['clients']} clients for {report['seconds']:.1f}s, statuses {report['statuses']}")
+    print(f"{'op':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    rows = sorted(report["ops"].items()) + ([("total", report["total"])] if "total" in report else [])
+    for op, s in rows:
+        print(f"{op:<10} {s['requests']:>9} {s['rps']:>9.0f} {s['p50_ms']:>8.2f} "
+              f"{s['p99_ms']:>8.2f} {s['max_ms']:>8.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the Water Intake HTTP API")
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="weighted operations, default %(default)s")
+    parser.add_argument("--batch-size", type=int, default=50, help="entries per batch request")
+    parser.add_argument("--group-commit-ms", type=int, default=0,
+                        help="group commit window for the server started here")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    server = service = None
+    workdir = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        from database import Database, DURABILITY_NORMAL
+        from server import make_server
+        workdir = tempfile.mkdtemp(prefix="water-loadtest-")
+        db = Database(os.path.join(workdir, "loadtest.db"), durability=DURABILITY_NORMAL,
+                      group_commit_ms=args.group_commit_ms, max_readers=args.clients)
+        server, service = make_server(db, port=0, quiet=True)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        report = run(host, port, args.clients, args.seconds, mix, args.batch_size, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            service.close()
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# log_database.py
+"""
+Append-only log Storage backend.
+The in-memory engine from memory_database.py, plus a log file: every
+write record is appended as one JSON line, and opening the file replays
+the records to rebuild the in-memory index. Reads never touch the disk.
+
+- durability "full" fsyncs after every record; "normal" only flushes to
+  the OS, so a power loss may drop the last few writes
+- a torn last line (crash mid-append) is dropped on open
+- incremental_vacuum() (run by retention.apply and
+  'python -m water compact') rewrites the log as a snapshot of the live
+  data, which discards deleted and superseded records
+
+The file is meant for one process at a time; there is no cross-process
+locking or change detection.
+"""
+
+import json
+import os
+from typing import Dict
+
+from memory_database import MemoryDatabase
+from storage import DEFAULT_USER_ID, DURABILITY_FULL, DURABILITY_NORMAL
+
+# records per "log" line when writing a snapshot
+SNAPSHOT_BATCH = 5000
+
+
+class LogDatabase(MemoryDatabase):
+    def __init__(self, path: str, durability: str = DURABILITY_FULL,
+                 user_id: int = DEFAULT_USER_ID):
+        if durability not in (DURABILITY_FULL, DURABILITY_NORMAL):
+            raise ValueError(f"Unknown durability mode: {durability!r}")
+        self.log_path = path
+        self.durability = durability
+        self._file = None
+        super().__init__(user_id=user_id)
+        self.db_path = path
+
+    # Records
+    def _open(self):
+        good = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete record")
+                        record = json.loads(line)
+                    except ValueError:
+                        if f.read(1):
+                            raise ValueError(f"{self.log_path}: corrupt record on line {line_no}")
+                        break  # torn last append
+                    self._apply(record)
+                    good += len(line)
+        self._file = open(self.log_path, "ab")
+        if self._file.tell() != good:
+            self._file.truncate(good)
+
+    def _journal(self, record: list):
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        end = self._file.tell()
+        try:
+            self._file.write(line)
+            self._file.flush()
+            if self.durability == DURABILITY_FULL:
+                os.fsync(self._file.fileno())
+        except OSError:
+            # drop a partial line, or later records would follow garbage
+            try:
+                self._file.truncate(end)
+            except OSError:
+                pass
+            raise
+
+    def _snapshot(self):
+        """The live data as records, in an order that replays to the same state."""
+        s = self._store
+        for user in sorted(s.users.values(), key=lambda u: u["id"]):
+            yield ["user", user["id"], user["name"], user["created_ms"]]
+        for user_id, settings in sorted(s.settings.items()):
+            for key, value in sorted(settings.items()):
+                yield ["set", user_id, key, value]
+        for user_id, profile in sorted(s.profiles.items()):
+            rows = []
+            for d in profile.dates:
+                for e in profile.days[d].entries:
+                    rows.append(e.record())
+                    if len(rows) >= SNAPSHOT_BATCH:
+                        yield ["log", user_id, rows]
+                        rows = []
+            if rows:
+                yield ["log", user_id, rows]
+        yield ["ids", s.next_user_id, s.next_entry_id]
+
+    # Maintenance
+    def file_stats(self) -> Dict[str, int]:
+        """The log's size as page_count (page_size 1), for retention reports."""
+        with self._store.lock:
+            return {"page_size": 1, "page_count": os.path.getsize(self.log_path),
+                    "freelist_count": 0, "auto_vacuum": 0}
+
+    def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """Rewrite the log as a snapshot of the live data; returns bytes freed."""
+        tmp = self.log_path + ".tmp"
+        with self._store.lock:
+            before = os.path.getsize(self.log_path)
+            with open(tmp, "wb") as f:
+                for record in self._snapshot():
+                    f.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.log_path)
+            self._file = open(self.log_path, "ab")
+            return max(0, before - self._file.tell())
+
+    def flush(self):
+        with self._store.lock:
+            if self._file is not None and not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the log file (views from for_user() leave it open)."""
+        if self._owns_storage:
+            with self._store.lock:
+                if not self._file.closed:
+                    self.flush()
+                    self._file.close()
@@ -1,13 +1,67 @@
 # main.py
+import argparse
 import sys
-from PyQt6.QtWidgets import QApplication
-from GUI import MainWindow
+import time
+
 
 def main():
-    app = QApplication(sys.argv)
-    w = MainWindow()
+    parser = argparse.ArgumentParser(description="Water Intake Tracker")
+    parser.add_argument("--db", help="database file, 'log:PATH' or 'memory:' "
+                                     "(default water_intake.db)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import and construction timings by phase")
+    parser.add_argument("--diagnostics", nargs="?", const="", metavar="FILE",
+                        help="record Database, SQL and GUI timings from startup (Ctrl+Shift+D "
+                             "shows them); with FILE, also write them there (.json or "
+                             "Prometheus text) on exit")
+    args, qt_args = parser.parse_known_args()
+
+    phases = []
+    mark = time.perf_counter()
+
+    def phase(name):
+        nonlocal mark
+        now = time.perf_counter()
+        phases.append((name, now - mark))
+        mark = now
+
+    if args.diagnostics is not None:
+        import diagnostics
+        diagnostics.enable()
+
+    from PyQt6.QtWidgets import QApplication
+    phase("import PyQt6")
+    from GUI import MainWindow
+    phase("import GUI")
+
+    app = QApplication([sys.argv[0]] + qt_args)
+    phase("QApplication()")
+    w = MainWindow(db_spec=args.db) if args.db else MainWindow()
+    phase("MainWindow()")
     w.show()
-    sys.exit(app.exec())
+    phase("show()")
+
+    if args.profile_startup:
+        from PyQt6.QtCore import QTimer
+
+        def report():
+            phase("first paint")
+            total = sum(t for _, t in phases)
+            print("Startup profile:", file=sys.stderr)
+            for name, t in phases:
+                print(f"  {name:<16} {t * 1000:8.1f} ms", file=sys.stderr)
+            print(f"  {'total':<16} {total * 1000:8.1f} ms", file=sys.stderr)
+            loaded = "loaded" if "matplotlib" in sys.modules else "not loaded"
+            print(f"  matplotlib {loaded} at first paint", file=sys.stderr)
+
+        QTimer.singleShot(0, report)
+
+    status = app.exec()
+    if args.diagnostics:
+        import diagnostics
+        if diagnostics.enabled():
+            diagnostics.dump(args.diagnostics)
+    sys.exit(status)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,518 @@
+# memory_database.py
+"""
+Pure in-memory Storage backend: no files, no SQL.
+
+Each profile keeps a dict of days plus a sorted list of its dates; a day
+holds its entries sorted like the SQLite index (timestamp, amount, id)
+and its running total, so per-day reads are dict lookups and range
+queries are a bisect on the date list.
+
+Every write is expressed as a record (a small JSON-friendly list) that
+_apply() executes. The in-memory engine drops the records;
+log_database.LogDatabase appends them to a file and replays them on open.
+"""
+
+import itertools
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from storage import (
+    COMPACT_DAY, COMPACT_HOUR, DEFAULT_USER_ID, DEFAULT_USER_NAME, MEMORY_SPEC, Change,
+    DailyTotalRow, EntryExportRow, EntryRow, IntakeItem, Storage, UserRow, _SharedState,
+    split_intake, to_epoch_ms,
+)
+
+# reported by schema_version(); bump when the record format changes
+RECORD_VERSION = 1
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class _Entry:
+    __slots__ = ("id", "user_id", "date", "timestamp", "ts_ms", "amount_ml", "entries")
+
+    def __init__(self, entry_id, user_id, date_str, timestamp, ts_ms, amount_ml, entries=1):
+        self.id = entry_id
+        self.user_id = user_id
+        self.date = date_str
+        self.timestamp = timestamp
+        self.ts_ms = ts_ms
+        self.amount_ml = amount_ml
+        self.entries = entries
+
+    @property
+    def key(self):
+        # the order SQLite returns a day's rows in (idx_intake_user_date_ts)
+        return (self.timestamp, self.amount_ml, self.id)
+
+    def record(self) -> list:
+        return [self.id, self.date, self.timestamp, self.ts_ms, self.amount_ml, self.entries]
+
+
+class _Day:
+    """One profile's entries on one date, kept sorted, with their totals."""
+    __slots__ = ("keys", "entries", "total_ml", "count")
+
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.entries: List[_Entry] = []
+        self.total_ml = 0
+        self.count = 0
+
+    def add(self, e: _Entry):
+        i = bisect_right(self.keys, e.key)
+        self.keys.insert(i, e.key)
+        self.entries.insert(i, e)
+        self.total_ml += e.amount_ml
+        self.count += e.entries
+
+    def remove(self, e: _Entry):
+        i = bisect_left(self.keys, e.key)
+        del self.keys[i], self.entries[i]
+        self.total_ml -= e.amount_ml
+        self.count -= e.entries
+
+
+class _Profile:
+    __slots__ = ("days", "dates")
+
+    def __init__(self):
+        self.days: Dict[str, _Day] = {}
+        self.dates: List[str] = []   # sorted keys of days
+
+    def add(self, e: _Entry):
+        day = self.days.get(e.date)
+        if day is None:
+            day = self.days[e.date] = _Day()
+            insort(self.dates, e.date)
+        day.add(e)
+
+    def remove(self, e: _Entry):
+        day = self.days[e.date]
+        day.remove(e)
+        if not day.entries:
+            self.drop(e.date)
+
+    def drop(self, date_str: str):
+        del self.days[date_str]
+        del self.dates[bisect_left(self.dates, date_str)]
+
+    def dates_between(self, start: Optional[str], end: Optional[str]) -> List[str]:
+        lo = bisect_left(self.dates, start) if start else 0
+        hi = bisect_right(self.dates, end) if end else len(self.dates)
+        return self.dates[lo:hi]
+
+
+_NO_PROFILE = _Profile()
+
+
+class _Store:
+    """Everything a MemoryDatabase and its profile views share."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users: Dict[int, UserRow] = {}
+        self.settings: Dict[int, Dict[str, str]] = {}
+        self.profiles: Dict[int, _Profile] = {}
+        self.entries: Dict[int, _Entry] = {}
+        self.next_user_id = 1
+        self.next_entry_id = 1
+        self.version = 0
+
+
+def _hour(timestamp: str) -> int:
+    hour = timestamp[11:13]
+    return int(hour) if hour.isdigit() else 0
+
+
+class MemoryDatabase(Storage):
+    def __init__(self, user_id: int = DEFAULT_USER_ID):
+        self.db_path = MEMORY_SPEC
+        self.user_id = int(user_id)
+        self._owns_storage = True
+        self._store = _Store()
+        self._state = _SharedState()
+        self._open()
+        with self._store.lock:
+            if DEFAULT_USER_ID not in self._store.users:
+                self._write(["user", DEFAULT_USER_ID, DEFAULT_USER_NAME, to_epoch_ms(datetime.now())])
+        if self.get_user(self.user_id) is None:
+            raise ValueError(f"Unknown user id: {user_id!r}")
+
+    # Records
+    def _open(self):
+        """Load existing records (LogDatabase replays its file here)."""
+
+    def _journal(self, record: list):
+        """Persist a record before it is applied (LogDatabase appends it)."""
+
+    def _write(self, record: list):
+        # callers hold the store lock. Journal first: if persisting fails,
+        # readers must not see a write the log never recorded
+        self._check(record)
+        self._journal(record)
+        result = self._apply(record)
+        self._store.version += 1
+        return result
+
+    def _check(self, record: list):
+        """Raise if record could not be applied, before anything is journaled."""
+        if not hasattr(self, "_op_" + record[0]):
+            raise ValueError(f"Unknown record: {record[0]!r}")
+        if record[0] in ("amount", "ts", "del") and record[2] not in self._store.entries:
+            raise ValueError(f"Unknown entry id: {record[2]!r}")
+
+    def _apply(self, record: list):
+        return getattr(self, "_op_" + record[0])(*record[1:])
+
+    def _read_profile(self) -> _Profile:
+        return self._store.profiles.get(self.user_id, _NO_PROFILE)
+
+    def _profile(self, user_id: int) -> _Profile:
+        profile = self._store.profiles.get(user_id)
+        if profile is None:
+            profile = self._store.profiles[user_id] = _Profile()
+        return profile
+
+    def _op_user(self, user_id, name, created_ms):
+        s = self._store
+        s.users[user_id] = UserRow((user_id, name, created_ms))
+        s.next_user_id = max(s.next_user_id, user_id + 1)
+
+    def _op_rename(self, user_id, name):
+        user = self._store.users.get(user_id)
+        if user is not None:
+            self._store.users[user_id] = UserRow((user_id, name, user["created_ms"]))
+
+    def _op_deluser(self, user_id):
+        s = self._store
+        profile = s.profiles.pop(user_id, None)
+        if profile is not None:
+            for day in profile.days.values():
+                for e in day.entries:
+                    del s.entries[e.id]
+        s.settings.pop(user_id, None)
+        s.users.pop(user_id, None)
+
+    def _op_set(self, user_id, key, value):
+        self._store.settings.setdefault(user_id, {})[key] = value
+
+    def _op_log(self, user_id, rows):
+        # rows: [id, date, timestamp, ts_ms, amount_ml, entries]
+        s, profile = self._store, self._profile(user_id)
+        for entry_id, date_str, timestamp, ts_ms, amount_ml, entries in rows:
+            e = _Entry(entry_id, user_id, date_str, timestamp, ts_ms, amount_ml, entries)
+            s.entries[entry_id] = e
+            profile.add(e)
+            s.next_entry_id = max(s.next_entry_id, entry_id + 1)
+
+    def _op_ids(self, next_user_id, next_entry_id):
+        self._store.next_user_id = max(self._store.next_user_id, next_user_id)
+        self._store.next_entry_id = max(self._store.next_entry_id, next_entry_id)
+
+    def _op_amount(self, user_id, entry_id, amount_ml):
+        e = self._store.entries[entry_id]
+        profile = self._profile(user_id)
+        profile.remove(e)
+        e.amount_ml = amount_ml
+        profile.add(e)
+
+    def _op_ts(self, user_id, entry_id, timestamp, ts_ms, date_str):
+        e = self._store.entries[entry_id]
+        profile = self._profile(user_id)
+        profile.remove(e)
+        e.timestamp, e.ts_ms, e.date = timestamp, ts_ms, date_str
+        profile.add(e)
+
+    def _op_del(self, user_id, entry_id):
+        self._profile(user_id).remove(self._store.entries.pop(entry_id))
+
+    def _op_clear(self, user_id, date_str):
+        profile = self._profile(user_id)
+        day = profile.days.get(date_str)
+        if day is not None:
+            for e in day.entries:
+                del self._store.entries[e.id]
+            profile.drop(date_str)
+
+    def _op_compact(self, user_id, before, granularity, first_id):
+        s, profile = self._store, self._profile(user_id)
+        next_id = first_id
+        removed, aggregates = 0, []
+        for date_str in profile.dates_between(None, None):
+            if date_str >= before:
+                break
+            entries = profile.days[date_str].entries
+            if granularity == COMPACT_DAY:
+                groups = [list(entries)] if len(entries) > 1 else []
+            else:
+                by_hour: Dict[str, List[_Entry]] = {}
+                for e in entries:
+                    by_hour.setdefault(e.timestamp[:13], []).append(e)
+                groups = [by_hour[h] for h in sorted(by_hour) if len(by_hour[h]) > 1]
+            for group in groups:
+                ts_values = [e.ts_ms for e in group if e.ts_ms is not None]
+                aggregates.append(_Entry(
+                    next_id, user_id, date_str, min(e.timestamp for e in group),
+                    min(ts_values) if ts_values else None,
+                    sum(e.amount_ml for e in group), sum(e.entries for e in group)))
+                next_id += 1
+                for e in group:
+                    profile.remove(e)
+                    del s.entries[e.id]
+                removed += len(group)
+        for e in aggregates:
+            s.entries[e.id] = e
+            profile.add(e)
+        s.next_entry_id = max(s.next_entry_id, next_id)
+        return removed, len(aggregates)
+
+    # Profiles
+    def _check_name(self, name: str, user_id: Optional[int] = None) -> str:
+        name = name.strip()
+        if not name:
+            raise ValueError("Profile name must not be empty")
+        if any(u["name"] == name and u["id"] != user_id for u in self._store.users.values()):
+            raise ValueError(f"Profile already exists: {name!r}")
+        return name
+
+    def create_user(self, name: str) -> int:
+        with self._store.lock:
+            name = self._check_name(name)
+            user_id = self._store.next_user_id
+            self._write(["user", user_id, name, to_epoch_ms(datetime.now())])
+            self._notify(Change("users", user_id=user_id))
+            return user_id
+
+    def rename_user(self, user_id: int, name: str):
+        with self._store.lock:
+            name = self._check_name(name, int(user_id))
+            self._write(["rename", int(user_id), name])
+            self._notify(Change("users", user_id=int(user_id)))
+
+    def delete_user(self, user_id: int):
+        user_id = int(user_id)
+        if user_id == DEFAULT_USER_ID:
+            raise ValueError("The default profile cannot be deleted")
+        with self._store.lock:
+            self._write(["deluser", user_id])
+            self._notify(Change("users", user_id=user_id))
+
+    def get_user(self, user_id: int) -> Optional[UserRow]:
+        return self._store.users.get(int(user_id))
+
+    def get_user_by_name(self, name: str) -> Optional[UserRow]:
+        name = name.strip()
+        with self._store.lock:
+            return next((u for u in self._store.users.values() if u["name"] == name), None)
+
+    def get_users(self) -> List[UserRow]:
+        with self._store.lock:
+            return sorted(self._store.users.values(), key=lambda u: (u["name"].lower(), u["id"]))
+
+    def get_user_totals_for_date(self, dt: str) -> List[Tuple[int, str, int]]:
+        s = self._store
+        with s.lock:
+            return [(uid, s.users[uid]["name"], s.profiles[uid].days[dt].total_ml)
+                    for uid in sorted(s.profiles)
+                    if dt in s.profiles[uid].days and uid in s.users]
+
+    # Change notification
+    def check_external_change(self) -> bool:
+        return False
+
+    def data_version(self) -> Tuple[int, int]:
+        return 0, self._store.version
+
+    def schema_version(self) -> int:
+        return RECORD_VERSION
+
+    # Settings
+    def set_setting(self, key: str, value: str):
+        with self._store.lock:
+            self._write(["set", self.user_id, key, value])
+            self._notify(Change("settings", key=key, user_id=self.user_id))
+
+    def get_setting(self, key: str) -> Optional[str]:
+        return self._store.settings.get(self.user_id, {}).get(key)
+
+    # Intake logging
+    def log_intake(self, amount_ml: int, ts: Optional[datetime] = None) -> int:
+        ts = ts or datetime.now()
+        date_str = ts.date().isoformat()
+        with self._store.lock:
+            entry_id = self._store.next_entry_id
+            self._write(["log", self.user_id, [
+                [entry_id, date_str, ts.isoformat(), to_epoch_ms(ts), int(amount_ml), 1]]])
+            self._notify(Change("intake", (date_str,), user_id=self.user_id))
+            return entry_id
+
+    def log_intakes(self, entries: Iterable[IntakeItem],
+                    update_totals: bool = True) -> int:
+        # totals are always kept current here; update_totals=False only
+        # holds back the change event until rebuild_daily_totals()
+        now = datetime.now()
+        rows, dates = [], set()
+        for entry in entries:
+            amount_ml, ts, weight = split_intake(entry, now)
+            date_str = ts.date().isoformat()
+            rows.append([0, date_str, ts.isoformat(), to_epoch_ms(ts), amount_ml, weight])
+            dates.add(date_str)
+        if not rows:
+            return 0
+        with self._store.lock:
+            for entry_id, row in enumerate(rows, self._store.next_entry_id):
+                row[0] = entry_id
+            self._write(["log", self.user_id, rows])
+            if update_totals:
+                self._notify(Change("intake", tuple(dates), user_id=self.user_id))
+        return len(rows)
+
+    def rebuild_daily_totals(self, dates: Optional[Iterable[str]] = None):
+        changed = () if dates is None else tuple(sorted(set(dates)))
+        with self._store.lock:
+            self._notify(Change("intake", changed, user_id=self.user_id))
+
+    def _own_entry(self, entry_id: int) -> Optional[_Entry]:
+        e = self._store.entries.get(int(entry_id))
+        return e if e is not None and e.user_id == self.user_id else None
+
+    def update_entry_amount(self, entry_id: int, amount_ml: int):
+        with self._store.lock:
+            e = self._own_entry(entry_id)
+            if e is None:
+                return
+            self._write(["amount", self.user_id, e.id, int(amount_ml)])
+            self._notify(Change("intake", (e.date,), user_id=self.user_id))
+
+    def update_entry_timestamp(self, entry_id: int, timestamp_iso: str):
+        try:
+            dt = datetime.fromisoformat(timestamp_iso)
+            date_str = dt.date().isoformat()
+            ts_ms = to_epoch_ms(dt)
+        except Exception:
+            date_str = timestamp_iso.split("T")[0] if "T" in timestamp_iso else timestamp_iso
+            ts_ms = None
+        with self._store.lock:
+            e = self._own_entry(entry_id)
+            if e is None:
+                return
+            old_date = e.date
+            self._write(["ts", self.user_id, e.id, timestamp_iso, ts_ms, date_str])
+            self._notify(Change("intake", tuple({old_date, date_str}), user_id=self.user_id))
+
+    def get_intake_for_date(self, dt: str) -> int:
+        day = self._read_profile().days.get(dt)
+        return day.total_ml if day is not None else 0
+
+    def get_entries_for_date(self, dt: str) -> List[EntryRow]:
+        with self._store.lock:
+            day = self._read_profile().days.get(dt)
+            if day is None:
+                return []
+            return [EntryRow((e.id, e.date, e.timestamp, e.amount_ml)) for e in day.entries]
+
+    def get_entry_by_id(self, entry_id: int) -> Optional[EntryRow]:
+        with self._store.lock:
+            e = self._own_entry(entry_id)
+            return None if e is None else EntryRow((e.id, e.date, e.timestamp, e.amount_ml))
+
+    def delete_entry(self, entry_id: int):
+        with self._store.lock:
+            e = self._own_entry(entry_id)
+            if e is None:
+                return
+            self._write(["del", self.user_id, e.id])
+            self._notify(Change("intake", (e.date,), user_id=self.user_id))
+
+    def get_history(self, limit: int = 14) -> List[Tuple[str, int]]:
+        limit = int(limit)
+        with self._store.lock:
+            profile = self._read_profile()
+            # a negative limit means no limit, as in SQL
+            dates = profile.dates if limit < 0 else profile.dates[max(0, len(profile.dates) - limit):] if limit else []
+            return [(d, profile.days[d].total_ml) for d in reversed(dates)]
+
+    def totals_between(self, start: str, end: str) -> List[Tuple[str, int]]:
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        with self._store.lock:
+            profile = self._read_profile()
+            totals = {d: profile.days[d].total_ml
+                      for d in profile.dates_between(first.isoformat(), last.isoformat())}
+        days = (first + timedelta(days=i) for i in range((last - first).days + 1))
+        return [(d, totals.get(d, 0)) for d in map(date.isoformat, days)]
+
+    def clear_entries_for_date(self, date_str: str):
+        with self._store.lock:
+            self._write(["clear", self.user_id, date_str])
+            self._notify(Change("intake", (date_str,), user_id=self.user_id))
+
+    # Streaming reads (exports, imports, reports)
+    def count_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        with self._store.lock:
+            profile = self._read_profile()
+            return sum(profile.days[d].count for d in profile.dates_between(start, end))
+
+    def count_days(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        with self._store.lock:
+            return len(self._read_profile().dates_between(start, end))
+
+    def _entries_between(self, start: Optional[str], end: Optional[str]) -> Iterator[_Entry]:
+        profile = self._read_profile()
+        return itertools.chain.from_iterable(
+            profile.days[d].entries for d in profile.dates_between(start, end))
+
+    def iter_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                     batch_size: int = 5000) -> Iterator[List[EntryExportRow]]:
+        # rows are copied out under the lock, so writes can't reorder a batch
+        with self._store.lock:
+            rows = [EntryExportRow((e.id, e.date, e.timestamp, e.ts_ms, e.amount_ml, e.entries))
+                    for e in self._entries_between(start, end)]
+        for i in range(0, len(rows), batch_size):
+            yield rows[i:i + batch_size]
+
+    def iter_daily_totals(self, start: Optional[str] = None, end: Optional[str] = None,
+                          batch_size: int = 5000, descending: bool = False
+                          ) -> Iterator[List[DailyTotalRow]]:
+        with self._store.lock:
+            profile = self._read_profile()
+            dates = profile.dates_between(start, end)
+            if descending:
+                dates.reverse()
+            rows = [DailyTotalRow((d, profile.days[d].total_ml, profile.days[d].count)) for d in dates]
+        for i in range(0, len(rows), batch_size):
+            yield rows[i:i + batch_size]
+
+    def packed_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> List[int]:
+        with self._store.lock:
+            profile = self._read_profile()
+            packed = []
+            for d in profile.dates_between(start, end):
+                try:
+                    day = (date.fromisoformat(d).toordinal() - _EPOCH_ORDINAL) << 37
+                except ValueError:
+                    continue   # not a date (update_entry_timestamp's fallback); not packable
+                packed.extend(day | _hour(e.timestamp) << 32 | e.amount_ml
+                              for e in profile.days[d].entries)
+            return packed
+
+    def existing_intake_keys(self, start_ms: int, end_ms: int) -> set:
+        # ts_ms and date agree up to the UTC offset, so a day either side covers it
+        first = (datetime.fromtimestamp(start_ms / 1000) - timedelta(days=1)).date().isoformat()
+        last = (datetime.fromtimestamp(end_ms / 1000) + timedelta(days=1)).date().isoformat()
+        with self._store.lock:
+            return {(e.ts_ms, e.amount_ml) for e in self._entries_between(first, last)
+                    if e.ts_ms is not None and start_ms <= e.ts_ms <= end_ms}
+
+    # Retention / compaction
+    def compact_entries(self, before: str, granularity: str = COMPACT_DAY) -> Tuple[int, int]:
+        if granularity not in (COMPACT_DAY, COMPACT_HOUR):
+            raise ValueError(f"Unknown compaction granularity: {granularity!r}")
+        with self._store.lock:
+            removed, written = self._write(
+                ["compact", self.user_id, before, granularity, self._store.next_entry_id])
+            if written:
+                self._notify(Change("intake", user_id=self.user_id))
+            return removed, written
@@ -0,0 +1,157 @@
+# pool.py
+"""
+SQLite connection pool for the Water Intake Tracker database.
+One writer connection serialized behind a lock, plus a bounded set of
+read-only connections checked out per call.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+from urllib.request import pathname2url
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, max_readers: int = 4, group_commit_ms: int = 0,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None):
+        """
+        db_path: SQLite file (":memory:" shares the writer for reads)
+        max_readers: upper bound on concurrently open read-only connections
+        group_commit_ms: when > 0, commit() defers the commit by up to this
+            many milliseconds so bursts of writes share one transaction
+        on_connect: called with every new connection (pragmas, etc.)
+        """
+        self.db_path = db_path
+        self.max_readers = max(1, int(max_readers))
+        self.group_commit_ms = max(0, int(group_commit_ms))
+        self._on_connect = on_connect
+        self._trace: Optional[Callable[[str], None]] = None
+        self._write_lock = threading.RLock()
+        self._commit_timer: Optional[threading.Timer] = None
+        self._shared = db_path == ":memory:" or db_path.startswith("file::memory:")
+        self.writer = self._connect(self.db_path)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def _connect(self, path: str, uri: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, uri=uri, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        if self._on_connect is not None:
+            self._on_connect(conn)
+        if self._trace is not None:
+            conn.set_trace_callback(self._trace)
+        return conn
+
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]):
+        """Install an sqlite3 trace callback on every connection, now and later (None removes it)."""
+        self._trace = callback
+        with self._write_lock, self._readers_lock:
+            if self._closed:
+                return
+            for conn in [self.writer] + self._readers:
+                conn.set_trace_callback(callback)
+
+    def _open_reader(self) -> sqlite3.Connection:
+        # the path is quoted: '?', '#' or '%' in it would otherwise be read
+        # as URI syntax
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        conn = self._connect(uri, uri=True)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    # Writer
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Exclusive access to the writer connection. If the block raises,
+        its statements are rolled back; writes still waiting on the
+        group-commit window are kept (the block runs in a savepoint then).
+        """
+        with self._write_lock:
+            conn = self.writer
+            savepoint = conn.in_transaction
+            if savepoint:
+                conn.execute("SAVEPOINT pool_write")
+            try:
+                yield conn
+            except BaseException:
+                if savepoint and conn.in_transaction:
+                    conn.execute("ROLLBACK TO pool_write")
+                    conn.execute("RELEASE pool_write")
+                elif not self._closed:
+                    conn.rollback()
+                raise
+            if savepoint and conn.in_transaction:
+                conn.execute("RELEASE pool_write")
+
+    def commit(self):
+        """Commit the writer now, or within the group-commit window."""
+        with self._write_lock:
+            if self.group_commit_ms <= 0:
+                self.writer.commit()
+                return
+            if self._commit_timer is None:
+                self._commit_timer = threading.Timer(self.group_commit_ms / 1000.0, self.flush)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+
+    def flush(self):
+        """Commit any writes still waiting on the group-commit window."""
+        with self._write_lock:
+            if self._commit_timer is not None:
+                self._commit_timer.cancel()
+                self._commit_timer = None
+            if not self._closed:
+                self.writer.commit()
+
+    # Readers
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """
+        A read-only connection for the duration of the block. Reads that
+        must see uncommitted writes (pending group commit) and in-memory
+        databases use the writer instead.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        if self._shared or self.writer.in_transaction:
+            with self._write_lock:
+                yield self.writer
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._readers_lock:
+            if len(self._readers) < self.max_readers:
+                conn = self._open_reader()
+                self._readers.append(conn)
+                return conn
+        return self._idle.get()
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            self._closed = True
+            with self._readers_lock:
+                for conn in self._readers:
+                    conn.close()
+                self._readers.clear()
+            self.writer.close()
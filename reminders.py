@@ -0,0 +1,326 @@
+# reminders.py
+"""
+Hydration reminders for every profile that has them switched on
+(Storage.set_reminder_enabled / set_reminder_minutes).
+
+A profile is reminded when it falls behind pace: its daily target spread
+evenly over the active hours (08:00-22:00) says it should have drunk more
+than it has. It is never reminded within reminder_minutes of its last
+drink or its last reminder. next_deadline() turns that into one point in
+time per profile, so nothing is polled. The scheduler keeps every
+profile's deadline in one heap and one timer sleeps until the earliest.
+
+Deadlines are only recomputed when something they depend on changes:
+today's intake, the three settings involved, the profile list, or another
+process writing (Change events), plus the profile whose deadline is due.
+Before reminding, that profile is re-read from the database, and the
+reminder is dropped if a drink logged meanwhile put it back on pace.
+
+Qt-free. The notifier (plyer, a stream, or RecordingNotifier for tests)
+and the timer (ThreadTimer, or a manual one for simulations) are both
+swappable.
+
+    scheduler = ReminderScheduler(db, PlyerNotifier())
+    scheduler.start()
+    ...
+    scheduler.stop()
+"""
+
+import heapq
+import sys
+import threading
+from datetime import datetime, time, timedelta
+from time import monotonic
+from typing import Callable, Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+ACTIVE_START = time(8, 0)
+ACTIVE_END = time(22, 0)
+# shortest gap between reminders, whatever reminder_minutes says
+MIN_INTERVAL_MINUTES = 5
+# settings a deadline depends on
+SETTINGS_KEYS = ("reminder_enabled", "reminder_minutes", "daily_target_ml")
+
+TITLE = "Water Intake Tracker"
+
+
+class ReminderState(NamedTuple):
+    """What a profile's deadline is computed from, as of one day."""
+    user_id: int
+    name: str
+    day: str                        # 'YYYY-MM-DD' the figures below are for
+    interval_minutes: int
+    target_ml: int
+    consumed_ml: int
+    last_intake: Optional[datetime]  # latest entry of that day
+
+
+def next_deadline(state: ReminderState, last_reminder: Optional[datetime],
+                  active: Tuple[time, time] = (ACTIVE_START, ACTIVE_END)) -> datetime:
+    """
+    When state's profile is next due a reminder: the moment the pace line
+    passes what it has drunk, but no sooner than interval after its last
+    drink or reminder, and within the active hours. Once the day's target
+    is met (or the hours are over), the first reminder of the next day.
+    """
+    day = datetime.fromisoformat(state.day).date()
+    start, end = datetime.combine(day, active[0]), datetime.combine(day, active[1])
+    interval = timedelta(minutes=max(MIN_INTERVAL_MINUTES, state.interval_minutes))
+    if state.target_ml <= 0 or state.consumed_ml < state.target_ml:
+        share = state.consumed_ml / state.target_ml if state.target_ml > 0 else 0.0
+        behind_at = start + (end - start) * share
+        quiet_since = max((t for t in (state.last_intake, last_reminder)
+                           if t is not None and t.date() == day), default=start)
+        deadline = max(behind_at, quiet_since + interval)
+        if deadline < end:
+            return deadline
+    return datetime.combine(day + timedelta(days=1), active[0]) + interval
+
+
+def load_state(db, day: str) -> Optional[ReminderState]:
+    """db's profile as of day, or None if its reminders are off."""
+    if not db.get_reminder_enabled():
+        return None
+    user = db.get_user(db.user_id)
+    entries = db.get_entries_for_date(day)
+    last = None
+    if entries:
+        try:
+            last = datetime.fromisoformat(entries[-1]["timestamp"])
+        except ValueError:
+            pass
+    return ReminderState(db.user_id, user["name"] if user else str(db.user_id), day,
+                         db.get_reminder_minutes(), db.get_daily_target_ml(),
+                         db.get_intake_for_date(day), last)
+
+
+def reminder_message(state: ReminderState) -> str:
+    if state.target_ml <= 0:
+        return f"{state.name}: time for a glass of water."
+    left = max(0, state.target_ml - state.consumed_ml)
+    return f"{state.name}: {state.consumed_ml} of {state.target_ml} ml so far, {left} ml to go."
+
+
+# ---------- Notifiers ----------
+class PlyerNotifier:
+    """Desktop notifications through plyer (optional dependency)."""
+
+    def notify(self, title: str, message: str) -> bool:
+        """False if plyer is missing or the platform has no notification service."""
+        try:
+            from plyer import notification
+            notification.notify(title=title, message=message, app_name=TITLE, timeout=10)
+            return True
+        except Exception:
+            return False
+
+
+class StreamNotifier:
+    """One line per reminder on a text stream (stderr by default)."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+
+    def notify(self, title: str, message: str) -> bool:
+        stream = self.stream or sys.stderr
+        stream.write(f"[{datetime.now():%H:%M}] {title}: {message}\n")
+        stream.flush()
+        return True
+
+
+class RecordingNotifier:
+    """Test stub: keeps (title, message) of every reminder in sent."""
+
+    def __init__(self):
+        self.sent: List[Tuple[str, str]] = []
+
+    def notify(self, title: str, message: str) -> bool:
+        self.sent.append((title, message))
+        return True
+
+
+# ---------- Timers ----------
+class ThreadTimer:
+    """
+    One daemon thread that sleeps until the armed deadline and then calls
+    callback. Re-arming only moves the deadline; the thread wakes for
+    nothing else.
+    """
+
+    def __init__(self, callback: Callable[[], None]):
+        self._callback = callback
+        self._cond = threading.Condition()
+        self._due: Optional[float] = None   # seconds on the monotonic clock
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+
+    def arm(self, delay_s: float):
+        with self._cond:
+            self._due = monotonic() + max(0.0, delay_s)
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self._due = None
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._due is not None:
+                        wait = self._due - monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+                self._due = None
+            self._callback()
+
+
+# ---------- Scheduler ----------
+class ReminderScheduler:
+    def __init__(self, db, notifier, clock: Callable[[], datetime] = datetime.now,
+                 timer_factory: Callable[[Callable[[], None]], object] = ThreadTimer,
+                 active: Tuple[time, time] = (ACTIVE_START, ACTIVE_END)):
+        """
+        db: any Storage; its profiles are reached through db.for_user()
+        notifier: object with notify(title, message)
+        clock: current local time (swapped for simulations)
+        timer_factory: builds the timer from the wake-up callback; the
+            timer has arm(delay_s), cancel() and close()
+        """
+        self.db = db
+        self.notifier = notifier
+        self.clock = clock
+        self.active = active
+        self._timer = timer_factory(self._wake)
+        self._lock = threading.Lock()
+        self._wake_lock = threading.Lock()
+        # heap of (deadline, generation, user_id); an entry is live only
+        # while its generation matches _generation[user_id]
+        self._heap: List[Tuple[datetime, int, int]] = []
+        self._generation: Dict[int, int] = {}
+        self._states: Dict[int, ReminderState] = {}
+        self._last_reminder: Dict[int, datetime] = {}
+        self._dirty: set = set()
+        self._reload_all = False
+        self._started = False
+        self.wakeups = 0
+        self.recomputed = 0
+        self.notifications = 0
+
+    # Lifecycle
+    def start(self):
+        with self._lock:
+            self._started = True
+            self._reload_all = True
+        self.db.add_listener(self._on_change)
+        self._timer.arm(0)
+
+    def stop(self):
+        self.db.remove_listener(self._on_change)
+        with self._lock:
+            self._started = False
+        self._timer.close()
+
+    def deadlines(self) -> Dict[int, datetime]:
+        """Live deadline of every profile with reminders on."""
+        with self._lock:
+            return {uid: d for d, gen, uid in self._heap if self._generation.get(uid) == gen}
+
+    # Change events (writing thread, write lock held: no queries here)
+    def _on_change(self, change):
+        if change.kind == "intake":
+            today = self.clock().date().isoformat()
+            if change.dates and today not in change.dates:
+                return   # only today's intake moves a deadline
+        elif change.kind == "settings":
+            if change.key not in SETTINGS_KEYS:
+                return
+        with self._lock:
+            if not self._started:
+                return
+            if change.kind == "intake" and change.user_id not in self._states:
+                return   # reminders off for that profile
+            if change.kind in ("users", "external") or change.user_id is None:
+                self._reload_all = True
+            else:
+                self._dirty.add(change.user_id)
+        self._timer.arm(0)
+
+    # Timer thread
+    def _wake(self):
+        with self._wake_lock:
+            self.wakeups += 1
+            now = self.clock()
+            today = now.date().isoformat()
+            with self._lock:
+                reload_all, dirty = self._reload_all, self._dirty
+                self._reload_all, self._dirty = False, set()
+            if reload_all:
+                dirty = {u["id"] for u in self.db.get_users()} | set(self._states)
+            for user_id in dirty:
+                self._reschedule(user_id, today)
+            for user_id in self._pop_due(now):
+                # re-read first: the figures may be from an earlier day, or
+                # a write from another process may not have been seen
+                state = self._reschedule(user_id, today, now)
+                if state is not None and next_deadline(state, self._last_reminder.get(user_id),
+                                                       self.active) <= now:
+                    self.notifier.notify(TITLE, reminder_message(state))
+                    self.notifications += 1
+                    self._last_reminder[user_id] = now
+                    self._reschedule(user_id, today, state=state)
+            self._arm(now)
+
+    def _reschedule(self, user_id: int, today: str, now: Optional[datetime] = None,
+                    state: Optional[ReminderState] = None) -> Optional[ReminderState]:
+        """Reload (unless state is given) and push user_id's next deadline."""
+        if state is None:
+            try:
+                state = load_state(self.db.for_user(user_id), today)
+            except ValueError:
+                state = None   # profile deleted
+        self.recomputed += 1
+        with self._lock:
+            gen = self._generation.get(user_id, 0) + 1
+            self._generation[user_id] = gen
+            if state is None:
+                self._states.pop(user_id, None)
+                return None
+            self._states[user_id] = state
+            deadline = next_deadline(state, self._last_reminder.get(user_id), self.active)
+            if now is None or deadline > now:
+                heapq.heappush(self._heap, (deadline, gen, user_id))
+        return state
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, gen, user_id = heapq.heappop(self._heap)
+                if self._generation.get(user_id) == gen:
+                    due.append(user_id)
+        return due
+
+    def _arm(self, now: datetime):
+        with self._lock:
+            while self._heap and self._generation.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)   # superseded
+            if not self._started:
+                return
+            if self._heap:
+                self._timer.arm((self._heap[0][0] - now).total_seconds())
+            else:
+                self._timer.cancel()
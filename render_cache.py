@@ -0,0 +1,69 @@
+# render_cache.py
+"""
+Least-recently-used cache of finished renders (chart and donut pixmaps),
+capped by memory rather than by count.
+
+A key is everything the picture depends on: what is drawn (normally the
+profile and Storage.data_version() it was loaded at, plus any view
+parameters) and how (widget size in device pixels, DPI, device pixel
+ratio). Nothing is ever invalidated; a write gives the next load a new
+data version, so stale entries just stop being asked for and age out.
+
+Qt-free: the values are opaque, callers pass their size in bytes.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+# default memory cap; one 600 x 400 chart at a device pixel ratio of 2 is ~3.7 MB
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class RenderCache:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()   # key -> (value, nbytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: object, nbytes: int):
+        """Store value, evicting the least recently used entries to stay under max_bytes."""
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return   # would evict everything else and still not fit
+            self._items[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _key, (_value, size) = self._items.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
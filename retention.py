@@ -0,0 +1,145 @@
+# retention.py
+"""
+Retention policy for raw intake entries.
+Entries older than keep_raw_days are compacted into one aggregate row per
+day or per hour (Database.compact_entries), so the intake table and every
+full-history scan stop growing with time while daily totals, entry counts
+and exports keep the same numbers. Space freed by compaction is handed
+back to the file system with incremental vacuum steps, which callers run
+when idle (idle_vacuum).
+
+The policy is stored per profile in settings:
+- retention_days: days of raw entries to keep (0 or unset: keep forever)
+- retention_granularity: "day" or "hour"
+"""
+
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+from database import COMPACT_DAY, COMPACT_HOUR
+
+# pages returned to the file system per idle_vacuum() call
+VACUUM_STEP_PAGES = 256
+
+
+@dataclass
+class RetentionPolicy:
+    keep_raw_days: int = 90
+    granularity: str = COMPACT_DAY
+
+    def cutoff(self, today: Optional[date] = None) -> str:
+        """First day whose raw entries are kept."""
+        return ((today or date.today()) - timedelta(days=self.keep_raw_days)).isoformat()
+
+    @classmethod
+    def from_settings(cls, db) -> Optional["RetentionPolicy"]:
+        """The profile's stored policy, or None when raw entries are kept forever."""
+        days = db.get_retention_days()
+        return cls(days, db.get_retention_granularity()) if days > 0 else None
+
+    def save(self, db):
+        db.set_retention_days(self.keep_raw_days)
+        db.set_retention_granularity(self.granularity)
+
+
+@dataclass
+class CompactionReport:
+    rows_before: int = 0
+    rows_after: int = 0
+    aggregates_written: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    # full-history entry scan (what analytics and per-entry exports read)
+    scan_ms_before: float = 0.0
+    scan_ms_after: float = 0.0
+    elapsed_s: float = 0.0
+
+    @property
+    def bytes_freed(self) -> int:
+        return max(0, self.bytes_before - self.bytes_after)
+
+    @property
+    def scan_speedup(self) -> float:
+        return self.scan_ms_before / self.scan_ms_after if self.scan_ms_after > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"rows {self.rows_before:,} -> {self.rows_after:,} "
+            f"({self.aggregates_written:,} aggregate rows written), "
+            f"file {self.bytes_before / 1e6:.1f} -> {self.bytes_after / 1e6:.1f} MB "
+            f"({self.bytes_freed / 1e6:.1f} MB freed), "
+            f"full scan {self.scan_ms_before:.1f} -> {self.scan_ms_after:.1f} ms "
+            f"(x{self.scan_speedup:.1f}) in {self.elapsed_s:.2f}s"
+        )
+
+
+def _used_bytes(db) -> int:
+    stats = db.file_stats()
+    return (stats["page_count"] - stats["freelist_count"]) * stats["page_size"]
+
+
+def _file_bytes(db) -> int:
+    stats = db.file_stats()
+    return stats["page_count"] * stats["page_size"]
+
+
+def _timed_scan(db):
+    t0 = time.perf_counter()
+    rows = len(db.packed_entries())
+    return rows, (time.perf_counter() - t0) * 1000
+
+
+def apply(db, policy: RetentionPolicy, vacuum: bool = True,
+          today: Optional[date] = None) -> CompactionReport:
+    """
+    Compact db's profile according to policy. With vacuum=True all freed
+    pages are returned to the file system right away (converting an old
+    file to auto_vacuum=INCREMENTAL first); otherwise leave that to
+    idle_vacuum(). bytes_after then reflects the space in use.
+    """
+    if policy.granularity not in (COMPACT_DAY, COMPACT_HOUR):
+        raise ValueError(f"Unknown compaction granularity: {policy.granularity!r}")
+    started = time.perf_counter()
+    report = CompactionReport()
+    report.bytes_before = _file_bytes(db)
+    report.rows_before, report.scan_ms_before = _timed_scan(db)
+
+    _, report.aggregates_written = db.compact_entries(policy.cutoff(today), policy.granularity)
+
+    if vacuum:
+        if not db.enable_incremental_vacuum():
+            db.incremental_vacuum()
+        report.bytes_after = _file_bytes(db)
+    else:
+        report.bytes_after = _used_bytes(db)
+    report.rows_after, report.scan_ms_after = _timed_scan(db)
+    report.elapsed_s = time.perf_counter() - started
+    return report
+
+
+def apply_stored(db, today: Optional[date] = None) -> Dict[int, CompactionReport]:
+    """
+    Apply every profile's stored policy, leaving the vacuuming to
+    idle_vacuum(). Returns the reports by user id.
+    """
+    reports = {}
+    for user in db.get_users():
+        profile = db.for_user(user["id"])
+        policy = RetentionPolicy.from_settings(profile)
+        if policy is not None:
+            reports[user["id"]] = apply(profile, policy, vacuum=False, today=today)
+    return reports
+
+
+def idle_vacuum(db, max_pages: int = VACUUM_STEP_PAGES) -> int:
+    """
+    One small incremental-vacuum step, for idle timers. Returns bytes
+    freed; 0 means nothing is left to reclaim (or the file predates
+    auto_vacuum=INCREMENTAL, see Database.enable_incremental_vacuum).
+    """
+    stats = db.file_stats()
+    if stats["auto_vacuum"] != 2 or stats["freelist_count"] == 0:
+        return 0
+    return db.incremental_vacuum(max_pages)
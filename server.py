@@ -0,0 +1,399 @@
+# server.py
+"""
+Headless HTTP/JSON API over Database, for dispensers, badge readers and
+other clients that log intake without the GUI. Binds to localhost by
+default; there is no authentication.
+
+    python server.py --port 8765
+
+Endpoints (all take an optional ?user=<id> to select a profile):
+    POST   /intake              {"amount_ml": 250, "timestamp": "..."} -> {"id": ...}
+    POST   /intake/batch        [{"amount_ml": ..., "timestamp": ...}, ...] -> {"logged": n}
+    PATCH  /entries/<id>        {"amount_ml": ...} and/or {"timestamp": "..."}
+    DELETE /entries/<id>
+    GET    /entries?date=YYYY-MM-DD
+    GET    /totals?date=YYYY-MM-DD   -> {"date", "total_ml", "target_ml"}
+    GET    /history?limit=14         -> [{"date", "total_ml"}], with ETag
+    GET    /export?format=csv&granularity=day&start=&end=
+    GET    /health
+    GET    /metrics                  Prometheus text, when started with --diagnostics
+
+History responses carry an ETag derived from a counter that every
+database change bumps, so a client sending If-None-Match gets a 304
+without a query while nothing has changed. The counter restarts with
+the process, so tags also carry a random per-process token.
+"""
+
+import argparse
+import json
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+from datetime import date, datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from database import Database, DB_FILE, DEFAULT_USER_ID, DURABILITY_NORMAL, open_database
+import diagnostics
+import exporter
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_BATCH = 100_000
+MAX_AMOUNT_ML = 10_000
+
+EXPORT_TYPES = {
+    exporter.FORMAT_CSV: "text/csv; charset=utf-8",
+    exporter.FORMAT_JSONL: "application/x-ndjson; charset=utf-8",
+    exporter.FORMAT_TXT: "text/plain; charset=utf-8",
+    exporter.FORMAT_BIN: "application/octet-stream",
+}
+
+_ENTRY_PATH = re.compile(r"^/entries/(\d+)$")
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class IntakeService:
+    """The Database side of the API: profile views and the change counter."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._views: Dict[int, Database] = {db.user_id: db}
+        self._views_lock = threading.Lock()
+        # bumped by every committed change; ETags are built from it and
+        # from instance, which keeps tags from an earlier run from matching
+        self.generation = 0
+        self.instance = secrets.token_hex(8)
+        self._generation_lock = threading.Lock()
+        db.add_listener(self._on_change)
+
+    def _on_change(self, _change):
+        with self._generation_lock:
+            self.generation += 1
+
+    def for_user(self, user_id: Optional[str]) -> Database:
+        if user_id is None:
+            return self.db
+        try:
+            uid = int(user_id)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid user: {user_id!r}")
+        with self._views_lock:
+            view = self._views.get(uid)
+        if view is None:
+            try:
+                view = self.db.for_user(uid)
+            except ValueError as e:
+                raise ApiError(HTTPStatus.NOT_FOUND, str(e))
+            with self._views_lock:
+                self._views[uid] = view
+        return view
+
+    def current_generation(self) -> int:
+        # notices writes made by other processes (e.g. the GUI) as well
+        self.db.check_external_change()
+        return self.generation
+
+    def close(self):
+        self.db.remove_listener(self._on_change)
+        self.db.close()
+
+
+def parse_entry(item) -> Tuple[int, Optional[datetime]]:
+    if not isinstance(item, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Each entry must be a JSON object")
+    amount = item.get("amount_ml")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "amount_ml must be a number")
+    # checked after rounding too: 0.3 would otherwise be stored as 0 ml
+    if not 0 < amount <= MAX_AMOUNT_ML or round(amount) < 1:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"amount_ml must be between 1 and {MAX_AMOUNT_ML}")
+    ts = item.get("timestamp")
+    if ts is not None:
+        try:
+            ts = datetime.fromisoformat(str(ts))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid timestamp: {ts!r}")
+        if ts.tzinfo is not None:
+            ts = ts.astimezone().replace(tzinfo=None)
+    return int(round(amount)), ts
+
+
+def parse_date(value: Optional[str], default: Optional[str] = None) -> Optional[str]:
+    if value is None:
+        return default
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid date: {value!r}")
+
+
+def entry_json(row) -> Dict:
+    return {"id": row["id"], "date": row["date"], "timestamp": row["timestamp"],
+            "amount_ml": row["amount_ml"]}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # keep-alive, so clients and the load test reuse connections
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; without TCP_NODELAY each
+    # response waits ~40 ms on the client's delayed ACK
+    disable_nagle_algorithm = True
+    server_version = "WaterIntakeAPI/1.0"
+    service: IntakeService = None  # set by make_server()
+    quiet = False
+
+    # Plumbing
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._body_read = False
+        try:
+            handler, args = self._route(method, url.path)
+            with diagnostics.span(f"http.{handler.__name__}"):
+                handler(*args)
+        except ApiError as e:
+            self._send_error(e.status, str(e))
+        except ValueError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception as e:
+            self.log_error("%s %s failed: %r", method, self.path, e)
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "internal error")
+
+    def _send_error(self, status: HTTPStatus, message: str):
+        if not self._body_read and int(self.headers.get("Content-Length") or 0):
+            # the unread body would be parsed as the next request
+            self.close_connection = True
+        self._send_json({"error": message}, status)
+
+    def _route(self, method: str, path: str):
+        routes = {
+            ("GET", "/health"): self.get_health,
+            ("GET", "/metrics"): self.get_metrics,
+            ("POST", "/intake"): self.post_intake,
+            ("POST", "/intake/batch"): self.post_intake_batch,
+            ("GET", "/entries"): self.get_entries,
+            ("GET", "/totals"): self.get_totals,
+            ("GET", "/history"): self.get_history,
+            ("GET", "/export"): self.get_export,
+        }
+        handler = routes.get((method, path.rstrip("/") or "/"))
+        if handler is not None:
+            return handler, ()
+        m = _ENTRY_PATH.match(path)
+        if m and method == "PATCH":
+            return self.patch_entry, (int(m.group(1)),)
+        if m and method == "DELETE":
+            return self.delete_entry, (int(m.group(1)),)
+        if m or any(p == path for _, p in routes):
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No such endpoint: {path}")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = self.rfile.read(length)
+        self._body_read = True
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+
+    def _send_json(self, payload, status: HTTPStatus = HTTPStatus.OK,
+                   headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @property
+    def db(self) -> Database:
+        return self.service.for_user(self.query.get("user"))
+
+    # Endpoints
+    def get_health(self):
+        self._send_json({"status": "ok", "schema_version": self.service.db.schema_version()})
+
+    def get_metrics(self):
+        rec = diagnostics.recorder()
+        if rec is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Diagnostics are off (start with --diagnostics)")
+        body = rec.to_prometheus().encode("utf-8")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def post_intake(self):
+        amount, ts = parse_entry(self._read_json())
+        entry_id = self.db.log_intake(amount, ts)
+        self._send_json({"id": entry_id}, HTTPStatus.CREATED)
+
+    def post_intake_batch(self):
+        payload = self._read_json()
+        if isinstance(payload, dict):
+            payload = payload.get("entries")
+        if not isinstance(payload, list):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Expected a list of entries")
+        if len(payload) > MAX_BATCH:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH} entries per batch")
+        # validate everything first so a bad entry rejects the whole batch
+        entries = [parse_entry(item) for item in payload]
+        logged = self.db.log_intakes(entries)
+        self._send_json({"logged": logged}, HTTPStatus.CREATED)
+
+    def patch_entry(self, entry_id: int):
+        db = self.db
+        if db.get_entry_by_id(entry_id) is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No entry {entry_id}")
+        payload = self._read_json()
+        if not isinstance(payload, dict) or not ({"amount_ml", "timestamp"} & payload.keys()):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Give amount_ml and/or timestamp")
+        if "amount_ml" in payload:
+            amount, _ = parse_entry({"amount_ml": payload["amount_ml"]})
+            db.update_entry_amount(entry_id, amount)
+        if "timestamp" in payload:
+            _, ts = parse_entry({"amount_ml": 1, "timestamp": payload["timestamp"]})
+            if ts is None:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "timestamp must not be null")
+            db.update_entry_timestamp(entry_id, ts.isoformat())
+        self._send_json(entry_json(db.get_entry_by_id(entry_id)))
+
+    def delete_entry(self, entry_id: int):
+        db = self.db
+        if db.get_entry_by_id(entry_id) is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No entry {entry_id}")
+        db.delete_entry(entry_id)
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def get_entries(self):
+        day = parse_date(self.query.get("date"), date.today().isoformat())
+        self._send_json([entry_json(r) for r in self.db.get_entries_for_date(day)])
+
+    def get_totals(self):
+        db = self.db
+        day = parse_date(self.query.get("date"), date.today().isoformat())
+        self._send_json({"date": day, "total_ml": db.get_intake_for_date(day),
+                         "target_ml": db.get_daily_target_ml()})
+
+    def get_history(self):
+        db = self.db
+        try:
+            limit = max(1, min(int(self.query.get("limit", 14)), 100_000))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be an integer")
+        etag = f'W/"{self.service.instance}-{self.service.current_generation()}-{db.user_id}-{limit}"'
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        rows = [{"date": d, "total_ml": t} for d, t in db.get_history(limit)]
+        self._send_json(rows, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    def get_export(self):
+        fmt = self.query.get("format", exporter.FORMAT_CSV)
+        if fmt not in EXPORT_TYPES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown export format: {fmt!r}")
+        granularity = self.query.get("granularity", exporter.GRANULARITY_DAY)
+        start = parse_date(self.query.get("start"))
+        end = parse_date(self.query.get("end"))
+        fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+        os.close(fd)
+        try:
+            exporter.export(self.db, path, fmt=fmt, granularity=granularity, start=start, end=end)
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", EXPORT_TYPES[fmt])
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.send_header("Content-Disposition", f'attachment; filename="water_history.{fmt}"')
+            self.end_headers()
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(64 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def make_server(db: Database, host: str = "127.0.0.1", port: int = 8765,
+                quiet: bool = False) -> Tuple[ThreadingHTTPServer, IntakeService]:
+    """A ready-to-run server; call serve_forever() and, when done, service.close()."""
+    service = IntakeService(db)
+    handler = type("Handler", (ApiHandler,), {"service": service, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, service
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Water Intake Tracker HTTP API")
+    parser.add_argument("--db", default=DB_FILE,
+                        help="database file, 'log:PATH' or 'memory:' (default %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--readers", type=int, default=8,
+                        help="read-only connections in the pool (default %(default)s)")
+    parser.add_argument("--group-commit-ms", type=int, default=0,
+                        help="share one commit between writes arriving within this window")
+    parser.add_argument("--user", type=int, default=DEFAULT_USER_ID,
+                        help="profile used when a request gives no ?user=")
+    parser.add_argument("--quiet", action="store_true", help="don't log every request")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="time requests, Database calls and SQL; served on /metrics")
+    args = parser.parse_args(argv)
+
+    db = open_database(args.db, durability=DURABILITY_NORMAL, group_commit_ms=args.group_commit_ms,
+                       max_readers=args.readers, user_id=args.user)
+    if args.diagnostics:
+        diagnostics.enable(db)
+    server, service = make_server(db, args.host, args.port, args.quiet)
+    print(f"Serving {args.db} on http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+# storage.py
+"""
+Storage interface for the Water Intake Tracker.
+
+Storage is the API the GUI, server, CLI, exporter, importer, analytics
+and retention code program against. Backends:
+- database.Database: SQLite file (the default)
+- memory_database.MemoryDatabase: pure in-memory engine, for tests and
+  demo kiosks that don't want disk I/O
+- log_database.LogDatabase: in-memory engine whose writes are appended to
+  a log file, replayed into memory on open
+
+open_database() picks one from a spec: "memory:", "log:<path>", or a
+SQLite path (optionally "sqlite:<path>").
+
+Every Storage is scoped to one profile (user_id); for_user() returns a
+view of another profile sharing the same data, caches and listeners.
+Rows returned by the entry, user and daily-total methods support both
+row["name"] and row[index] access, like sqlite3.Row.
+"""
+
+import copy
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import (Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence,
+                    Tuple, Union)
+
+# Profile that owns everything written before profiles existed, and the
+# one a Database opens on unless told otherwise.
+DEFAULT_USER_ID = 1
+DEFAULT_USER_NAME = "Default"
+
+# Durability modes:
+# - "full": rollback journal, synchronous=FULL, one fsync per commit
+# - "normal": WAL journal, synchronous=NORMAL; commits are durable across
+#   application crashes but the last few may roll back on power loss
+DURABILITY_FULL = "full"
+DURABILITY_NORMAL = "normal"
+
+# Compaction granularities: one row per day, or per hour of the day
+COMPACT_DAY = "day"
+COMPACT_HOUR = "hour"
+
+MEMORY_SPEC = "memory:"
+LOG_PREFIX = "log:"
+SQLITE_PREFIX = "sqlite:"
+
+
+class Change(NamedTuple):
+    """
+    Published to Database listeners after every write.
+    kind: "intake", "settings", "users" (a profile was added, renamed or
+        deleted) or "external" (another process wrote)
+    dates: 'YYYY-MM-DD' days whose intake changed (empty: possibly all)
+    key: settings key for "settings" changes
+    user_id: profile that was written (None for "external")
+    """
+    kind: str
+    dates: Tuple[str, ...] = ()
+    key: Optional[str] = None
+    user_id: Optional[int] = None
+
+
+def to_epoch_ms(ts: datetime) -> int:
+    """Epoch milliseconds for a (naive, local) timestamp."""
+    return int(ts.timestamp() * 1000)
+
+
+# one item of log_intakes(): an amount, (amount_ml, ts), or
+# (amount_ml, ts, entries) for a compacted row standing for several entries
+IntakeItem = Union[int, Tuple[int, Optional[datetime]], Tuple[int, Optional[datetime], int]]
+
+
+def split_intake(item: IntakeItem, now: datetime) -> Tuple[int, datetime, int]:
+    """(amount_ml, ts, entries) of a log_intakes() item; ts defaults to now."""
+    if not isinstance(item, tuple):
+        return int(item), now, 1
+    amount_ml, ts, *weight = item
+    return int(amount_ml), ts or now, int(weight[0]) if weight else 1
+
+
+class Row(tuple):
+    """A tuple whose fields can also be read by name, like sqlite3.Row."""
+    __slots__ = ()
+    fields: Tuple[str, ...] = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self.fields.index(key)
+            except ValueError:
+                raise IndexError(f"No item with that key: {key!r}")
+        return tuple.__getitem__(self, key)
+
+    def keys(self) -> List[str]:
+        return list(self.fields)
+
+
+class UserRow(Row):
+    __slots__ = ()
+    fields = ("id", "name", "created_ms")
+
+
+class EntryRow(Row):
+    __slots__ = ()
+    fields = ("id", "date", "timestamp", "amount_ml")
+
+
+class EntryExportRow(Row):
+    __slots__ = ()
+    fields = ("id", "date", "timestamp", "ts_ms", "amount_ml", "entries")
+
+
+class DailyTotalRow(Row):
+    __slots__ = ()
+    fields = ("date", "total_ml", "entries")
+
+
+class _SharedState:
+    """Caches and listeners shared by a Database and its per-user views."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.settings: Dict[int, Dict[str, str]] = {}  # user id -> key -> value
+        self.data_version = -1
+        self.checked = 0.0
+        self.listeners: List[Callable[[Change], None]] = []
+
+
+class Storage(ABC):
+    """
+    The intake store API. Subclasses implement the abstract methods;
+    profile views, listeners and the typed settings helpers are shared.
+    Subclass constructors set user_id, db_path, _state and _owns_storage.
+    """
+    user_id: int
+    db_path: str
+    _state: _SharedState
+    _owns_storage: bool
+
+    # Profiles
+    def for_user(self, user_id: int) -> "Storage":
+        """
+        A view scoped to another profile. It shares this one's
+        connections, settings cache and listeners; closing it is a no-op.
+        """
+        if self.get_user(user_id) is None:
+            raise ValueError(f"Unknown user id: {user_id!r}")
+        view = copy.copy(self)
+        view.user_id = int(user_id)
+        view._owns_storage = False
+        return view
+
+    @abstractmethod
+    def create_user(self, name: str) -> int: ...
+
+    @abstractmethod
+    def rename_user(self, user_id: int, name: str): ...
+
+    @abstractmethod
+    def delete_user(self, user_id: int):
+        """Remove a profile with all its intake and settings."""
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[Row]: ...
+
+    @abstractmethod
+    def get_user_by_name(self, name: str) -> Optional[Row]: ...
+
+    @abstractmethod
+    def get_users(self) -> List[Row]:
+        """All profiles (id, name, created_ms), ordered by name."""
+
+    @abstractmethod
+    def get_user_totals_for_date(self, dt: str) -> List[Tuple[int, str, int]]:
+        """(user_id, name, total_ml) for every profile that logged intake on dt."""
+
+    # Change notification
+    def add_listener(self, callback: Callable[[Change], None]):
+        """
+        callback(change) runs on the writing thread right after each
+        commit, while the write lock is held, so keep it short (e.g. emit
+        a queued Qt signal).
+        """
+        self._state.listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Change], None]):
+        if callback in self._state.listeners:
+            self._state.listeners.remove(callback)
+
+    def _notify(self, change: Change):
+        for callback in list(self._state.listeners):
+            callback(change)
+
+    @abstractmethod
+    def check_external_change(self) -> bool:
+        """
+        Detect writes made by other processes; notifies listeners with an
+        "external" Change and returns True when something changed.
+        """
+
+    @abstractmethod
+    def data_version(self) -> Tuple[int, int]:
+        """A value that changes after every write. Cheap enough to key caches on."""
+
+    @abstractmethod
+    def schema_version(self) -> int: ...
+
+    def flush(self):
+        """Make writes still waiting on a group-commit window durable."""
+
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]):
+        """Statement trace callback (see diagnostics.py); only SQL backends have one."""
+
+    # Settings
+    @abstractmethod
+    def set_setting(self, key: str, value: str): ...
+
+    @abstractmethod
+    def get_setting(self, key: str) -> Optional[str]: ...
+
+    # Target helpers
+
+    def set_daily_target_ml(self, ml: int):
+        self.set_setting("daily_target_ml", str(int(ml)))
+
+    def get_daily_target_ml(self) -> int:
+        val = self.get_setting("daily_target_ml")
+        if val:
+            try:
+                return int(val)
+            except ValueError:
+                return 2000
+        return 2000  # default 2000 ml
+
+    # Reminder settings
+    def set_reminder_enabled(self, enabled: bool):
+        self.set_setting("reminder_enabled", "1" if enabled else "0")
+
+    def get_reminder_enabled(self) -> bool:
+        val = self.get_setting("reminder_enabled")
+        return val == "1"
+
+    def set_reminder_minutes(self, minutes: int):
+        self.set_setting("reminder_minutes", str(int(minutes)))
+
+    def get_reminder_minutes(self) -> int:
+        val = self.get_setting("reminder_minutes")
+        if val:
+            try:
+                return int(val)
+            except ValueError:
+                return 60
+        return 60
+
+    # Retention settings (see retention.py)
+    def set_retention_days(self, days: int):
+        self.set_setting("retention_days", str(max(0, int(days))))
+
+    def get_retention_days(self) -> int:
+        """Days of raw entries to keep; 0 keeps them forever."""
+        val = self.get_setting("retention_days")
+        if val:
+            try:
+                return max(0, int(val))
+            except ValueError:
+                return 0
+        return 0
+
+    def set_retention_granularity(self, granularity: str):
+        if granularity not in (COMPACT_DAY, COMPACT_HOUR):
+            raise ValueError(f"Unknown compaction granularity: {granularity!r}")
+        self.set_setting("retention_granularity", granularity)
+
+    def get_retention_granularity(self) -> str:
+        val = self.get_setting("retention_granularity")
+        return val if val in (COMPACT_DAY, COMPACT_HOUR) else COMPACT_DAY
+
+    # Intake
+    @abstractmethod
+    def log_intake(self, amount_ml: int, ts: Optional[datetime] = None) -> int: ...
+
+    @abstractmethod
+    def log_intakes(self, entries: Iterable[IntakeItem],
+                    update_totals: bool = True) -> int:
+        """
+        Bulk version of log_intake. entries yields amounts, (amount_ml, ts)
+        pairs, or (amount_ml, ts, entries) for rows that stand for several
+        entries (see compact_entries); everything is written in one
+        transaction.
+        With update_totals=False the caller must call
+        rebuild_daily_totals() for the affected dates before relying on
+        totals, and no change event is published until then.
+        Returns the number of entries logged.
+        """
+
+    @abstractmethod
+    def rebuild_daily_totals(self, dates: Optional[Iterable[str]] = None):
+        """Recompute the daily rollup for the given dates or the whole history."""
+
+    @abstractmethod
+    def update_entry_amount(self, entry_id: int, amount_ml: int): ...
+
+    @abstractmethod
+    def update_entry_timestamp(self, entry_id: int, timestamp_iso: str): ...
+
+    @abstractmethod
+    def get_intake_for_date(self, dt: str) -> int:
+        """Total ml logged on dt ('YYYY-MM-DD')."""
+
+    @abstractmethod
+    def get_entries_for_date(self, dt: str) -> List[Row]:
+        """(id, date, timestamp, amount_ml) rows for dt, by timestamp."""
+
+    @abstractmethod
+    def get_entry_by_id(self, entry_id: int) -> Optional[Row]: ...
+
+    @abstractmethod
+    def delete_entry(self, entry_id: int): ...
+
+    @abstractmethod
+    def get_history(self, limit: int = 14) -> List[Tuple[str, int]]:
+        """(date_str, total_ml) for the latest days with intake, newest first."""
+
+    @abstractmethod
+    def totals_between(self, start: str, end: str) -> List[Tuple[str, int]]:
+        """(date_str, total_ml) for every day from start to end inclusive, zero-filled."""
+
+    @abstractmethod
+    def clear_entries_for_date(self, date_str: str): ...
+
+    # Streaming reads (exports, imports, reports)
+    @abstractmethod
+    def count_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Number of intake entries between start and end (inclusive 'YYYY-MM-DD')."""
+
+    @abstractmethod
+    def count_days(self, start: Optional[str] = None, end: Optional[str] = None) -> int: ...
+
+    @abstractmethod
+    def iter_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                     batch_size: int = 5000) -> Iterator[List[Row]]:
+        """Batches of (id, date, timestamp, ts_ms, amount_ml) rows in chronological order."""
+
+    @abstractmethod
+    def iter_daily_totals(self, start: Optional[str] = None, end: Optional[str] = None,
+                          batch_size: int = 5000, descending: bool = False
+                          ) -> Iterator[List[Row]]:
+        """Batches of (date, total_ml, entries) rows."""
+
+    @abstractmethod
+    def packed_entries(self, start: Optional[str] = None, end: Optional[str] = None) -> List[int]:
+        """
+        Every entry between start and end, in chronological order, packed
+        as epoch_day << 37 | hour << 32 | amount_ml. Rows whose date is not
+        a valid date are left out.
+        """
+
+    def packed_entry_chunks(self, start: Optional[str] = None, end: Optional[str] = None
+                            ) -> List[Sequence[int]]:
+        """packed_entries() as consecutive pieces, each usable with np.asarray()."""
+        return [self.packed_entries(start, end)]
+
+    @abstractmethod
+    def existing_intake_keys(self, start_ms: int, end_ms: int) -> set:
+        """(ts_ms, amount_ml) pairs already stored between start_ms and end_ms inclusive."""
+
+    # Retention / compaction
+    @abstractmethod
+    def compact_entries(self, before: str, granularity: str = COMPACT_DAY) -> Tuple[int, int]:
+        """
+        Replace raw entries dated before `before` with one aggregate row
+        per day or hour. Returns (rows removed, aggregate rows written).
+        """
+
+    def seal_archive(self, through: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Move days up to `through` into a read-optimized archive; returns
+        (days, entries) archived. Backends that already serve reads from
+        memory have nothing to do.
+        """
+        return 0, 0
+
+    def file_stats(self) -> Dict[str, int]:
+        """page_size, page_count, freelist_count and auto_vacuum mode (2 = incremental)."""
+        return {"page_size": 1, "page_count": 0, "freelist_count": 0, "auto_vacuum": 0}
+
+    def enable_incremental_vacuum(self) -> bool:
+        return False
+
+    def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """Return unused file space to the file system; returns bytes freed."""
+        return 0
+
+    def export_history_txt(self, file_path: str):
+        from exporter import export, FORMAT_TXT
+        try:
+            export(self, file_path, fmt=FORMAT_TXT)
+            return True  # success
+        except Exception as e:
+            print(f"Error exporting history: {e}")
+            return False
+
+    def close(self):
+        """Release the backend (views from for_user() leave it open)."""
+
+
+def open_database(spec: str, durability: str = DURABILITY_FULL, group_commit_ms: int = 0,
+                  max_readers: int = 4, user_id: int = DEFAULT_USER_ID) -> Storage:
+    """
+    Open the backend named by spec: "memory:", "log:<path>", or a SQLite
+    file path (optionally prefixed "sqlite:"). Options a backend has no
+    use for are ignored.
+    """
+    if spec == MEMORY_SPEC:
+        from memory_database import MemoryDatabase
+        return MemoryDatabase(user_id=user_id)
+    if spec.startswith(LOG_PREFIX):
+        from log_database import LogDatabase
+        return LogDatabase(spec[len(LOG_PREFIX):], durability=durability, user_id=user_id)
+    if spec.startswith(SQLITE_PREFIX):
+        spec = spec[len(SQLITE_PREFIX):]
+    from database import Database
+    return Database(spec, durability=durability, group_commit_ms=group_commit_ms,
+                    max_readers=max_readers, user_id=user_id)
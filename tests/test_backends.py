@@ -0,0 +1,184 @@
+# tests/test_backends.py
+"""
+Every storage backend must behave like the SQLite one: a scripted
+workload (profiles, settings, single and bulk logs, edits, deletes,
+compaction, archive seals) is replayed through each, and everything read
+back along the way must match SQLite's transcript.
+"""
+
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database import Database, DURABILITY_NORMAL
+from log_database import LogDatabase
+from memory_database import MemoryDatabase
+from storage import COMPACT_DAY, COMPACT_HOUR, Storage, to_epoch_ms
+
+BACKENDS = ("sqlite", "memory", "log")
+AMOUNTS = [150, 200, 250, 330, 500, 750]
+
+
+def open_backend(kind: str, path: str) -> Storage:
+    """path is used by the file backends; pass it again to reopen."""
+    if kind == "memory":
+        return MemoryDatabase()
+    if kind == "log":
+        return LogDatabase(path, durability=DURABILITY_NORMAL)
+    return Database(path, durability=DURABILITY_NORMAL)
+
+
+def _snapshot(db: Storage) -> list:
+    """Everything one profile can read back, as plain values."""
+    return [
+        [tuple(r) for batch in db.iter_entries() for r in batch],
+        [tuple(r) for batch in db.iter_daily_totals(descending=True) for r in batch],
+        db.get_history(-1),
+        db.count_entries(), db.count_days(),
+        db.packed_entries(),
+        sorted((s, db.get_setting(s)) for s in ("daily_target_ml", "reminder_minutes", "note")),
+    ]
+
+
+def conformance_transcript(db: Storage, seed: int = 7) -> list:
+    """
+    Drives db through a scripted workload (profiles, settings, single and
+    bulk logs, edits, deletes, compaction) and returns what every read
+    returned along the way. Backends must produce identical transcripts.
+    """
+    rng = random.Random(seed)
+    out = []
+
+    def attempt(fn, *args):
+        try:
+            return fn(*args)
+        except ValueError as e:
+            return ("error", str(e))
+
+    first = date(2026, 1, 1)
+    stamps = sorted(datetime.combine(first + timedelta(days=rng.randrange(40)), datetime.min.time())
+                    + timedelta(minutes=rng.randrange(6 * 60, 22 * 60)) for _ in range(300))
+    alice = db.create_user("alice")
+    bob = db.create_user("bob")
+    out.append(attempt(db.create_user, "alice"))
+    out.append(attempt(db.create_user, "   "))
+    out.append([(u["id"], u["name"]) for u in db.get_users()])
+    a, b = db.for_user(alice), db.for_user(bob)
+
+    db.set_daily_target_ml(2200)
+    a.set_setting("note", "hello")
+    a.set_reminder_minutes(45)
+    out.append((db.get_daily_target_ml(), a.get_daily_target_ml(), a.get_setting("note")))
+
+    ids = [db.log_intake(rng.choice(AMOUNTS), ts) for ts in stamps[:120]]
+    ids.append(db.log_intake(250, stamps[5]))   # same timestamp as another entry
+    out.append(ids[:5] + ids[-5:])
+    out.append(a.log_intakes([(rng.choice(AMOUNTS), ts) for ts in stamps[120:250]]))
+    out.append(b.log_intakes([(rng.choice(AMOUNTS), ts) for ts in stamps[250:]],
+                             update_totals=False))
+    b.rebuild_daily_totals()
+    # on SQLite, the reads and edits below then cross an archive cut-off
+    db.seal_archive("2026-01-25")
+    a.seal_archive("2026-02-28")
+    out.append(_snapshot(db))
+    out.append(_snapshot(a))
+
+    for entry_id in rng.sample(ids, 15):
+        db.update_entry_amount(entry_id, rng.choice(AMOUNTS))
+    for entry_id in rng.sample(ids, 10):
+        db.update_entry_timestamp(entry_id, (stamps[rng.randrange(300)] + timedelta(seconds=7)).isoformat())
+    for entry_id in rng.sample(ids, 10):
+        db.delete_entry(entry_id)
+    a.delete_entry(ids[0])                      # someone else's entry: ignored
+    out.append(tuple(a.get_entry_by_id(ids[1]) or ()))
+    out.append(tuple(db.get_entry_by_id(ids[1]) or ()))
+
+    day = stamps[100].date().isoformat()
+    out.append([tuple(r) for r in db.get_entries_for_date(day)])
+    out.append(db.get_user_totals_for_date(day))
+    db.clear_entries_for_date(stamps[60].date().isoformat())
+
+    out.append(db.totals_between("2025-12-30", "2026-01-12"))
+    out.append(db.get_history(5))
+    out.append(db.count_entries("2026-01-05", "2026-01-20"))
+    out.append(db.count_days(end="2026-01-15"))
+    out.append(sorted(db.existing_intake_keys(to_epoch_ms(stamps[10]), to_epoch_ms(stamps[40]))))
+    out.append(db.packed_entries(start="2026-01-20"))
+
+    out.append(a.compact_entries("2026-01-20", COMPACT_HOUR))
+    out.append(a.compact_entries("2026-01-30", COMPACT_DAY))
+    out.append(a.compact_entries("2026-01-30", COMPACT_DAY))   # nothing left to merge
+    out.append(a.log_intake(500, stamps[-1]))
+    out.append(attempt(db.rename_user, alice, "bob"))
+    db.rename_user(alice, "Alice")
+    out.append(attempt(db.delete_user, 1))
+    db.delete_user(bob)
+    out.append(db.create_user("carol"))
+    out.append([(u["id"], u["name"]) for u in db.get_users()])
+    out.append(db.get_user_totals_for_date(day))
+    out.append(_snapshot(db))
+    out.append(_snapshot(a))
+    db.seal_archive("2026-01-20")
+    a.seal_archive("2026-02-28")
+    out.append(_snapshot(db))
+    out.append(_snapshot(a))
+    db.log_intake(100, datetime(2026, 1, 19, 12))   # retires db's archive
+    out.append(_snapshot(db))
+    db.seal_archive("2026-01-20")
+    out.append([db.count_entries("2026-01-10", "2026-01-30"), db.count_days("2026-01-19", "2026-01-21"),
+                db.totals_between("2026-01-18", "2026-01-22"), db.get_history(3),
+                [tuple(r) for batch in db.iter_daily_totals("2026-01-15", "2026-01-25", batch_size=3)
+                 for r in batch]])
+
+    # limits between the number of stored days and twice that
+    dave = db.for_user(db.create_user("dave"))
+    dave.log_intakes([(300, datetime(2026, 3, 1, 9) + timedelta(days=d)) for d in range(7)])
+    out.append([dave.get_history(n) for n in (0, 6, 7, 10, 13, 14, 30)])
+    return out
+
+
+def all_profiles(db: Storage) -> list:
+    return [_snapshot(db.for_user(u["id"])) for u in db.get_users()]
+
+
+@pytest.fixture(scope="module")
+def reference(tmp_path_factory):
+    db = open_backend("sqlite", str(tmp_path_factory.mktemp("reference") / "water.db"))
+    transcript = conformance_transcript(db)
+    db.close()
+    return transcript
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_transcript_matches_sqlite(tmp_path, reference, kind):
+    db = open_backend(kind, str(tmp_path / "water.db"))
+    transcript = conformance_transcript(db)
+    db.close()
+    assert len(transcript) == len(reference)
+    for step, (got, want) in enumerate(zip(transcript, reference)):
+        assert got == want, f"step {step}"
+
+
+@pytest.mark.parametrize("kind", [k for k in BACKENDS if k != "memory"])
+def test_reopened_store_reads_back_the_same(tmp_path, kind):
+    path = str(tmp_path / "water.db")
+    db = open_backend(kind, path)
+    conformance_transcript(db)
+    written = all_profiles(db)
+    db.close()
+    db = open_backend(kind, path)
+    assert all_profiles(db) == written
+    db.close()
+
+
+def test_rewritten_log_reads_back_the_same(tmp_path):
+    path = str(tmp_path / "water.log")
+    db = open_backend("log", path)
+    conformance_transcript(db)
+    written = all_profiles(db)
+    db.incremental_vacuum()
+    db.close()
+    db = open_backend("log", path)
+    assert all_profiles(db) == written
+    db.close()
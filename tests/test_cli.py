@@ -0,0 +1,53 @@
+# tests/test_cli.py
+"""`python -m water` must never import the GUI stack or charting."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ("PyQt6", "matplotlib", "numpy", "GUI", "charts", "workers")
+
+# runs the CLI in a fresh interpreter, then reports what it imported
+_PROBE = """
+import json, runpy, sys
+sys.argv = ["water"] + sys.argv[1:]
+code = 0
+try:
+    runpy.run_module("water", run_name="__main__")
+except SystemExit as e:
+    code = e.code or 0
+print(json.dumps({"code": code, "modules": sorted({m.split(".")[0] for m in sys.modules})}))
+"""
+
+
+def run_cli(*argv):
+    proc = subprocess.run([sys.executable, "-c", _PROBE] + list(argv), cwd=ROOT,
+                          capture_output=True, text=True, check=True, timeout=60)
+    return json.loads(proc.stdout.rstrip().rsplit("\n", 1)[-1])
+
+
+@pytest.mark.parametrize("command", [
+    ["log", "250"],
+    ["today"],
+    ["--json", "today"],
+    ["history", "--days", "30"],
+    ["target", "2200"],
+])
+def test_cli_imports_no_gui_modules(tmp_path, command):
+    db = str(tmp_path / "water.db")
+    report = run_cli("--db", db, *command)
+    assert report["code"] == 0
+    assert not set(report["modules"]) & set(FORBIDDEN)
+
+
+def test_cli_export_imports_no_gui_modules(tmp_path):
+    db = str(tmp_path / "water.db")
+    run_cli("--db", db, "log", "300")
+    report = run_cli("--db", db, "export", str(tmp_path / "out.csv"))
+    assert report["code"] == 0
+    assert not set(report["modules"]) & set(FORBIDDEN)
+    assert (tmp_path / "out.csv").exists()
@@ -0,0 +1,70 @@
+# tests/test_export_import.py
+"""
+A per-entry export imported into an empty database gives back the same
+totals and entry counts, including rows that compaction merged.
+"""
+
+import gzip
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import Database
+from exporter import FORMAT_BIN, FORMAT_CSV, FORMAT_JSONL, GRANULARITY_ENTRY, export
+from importer import import_file
+
+START, END = "2024-01-01", "2024-01-20"
+
+
+@pytest.fixture
+def source(tmp_path):
+    db = Database(str(tmp_path / "source.db"))
+    start = datetime(2024, 1, 1, 8, 0)
+    db.log_intakes((200 + 50 * h, start + timedelta(days=d, hours=h)) for d in range(20) for h in range(5))
+    db.compact_entries("2024-01-11")
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_CSV, FORMAT_JSONL])
+def test_round_trip_keeps_entry_counts(tmp_path, source, fmt):
+    path = str(tmp_path / f"export.{fmt}")
+    export(source, path, fmt, GRANULARITY_ENTRY)
+    target = Database(str(tmp_path / "target.db"))
+    try:
+        report = import_file(target, path)
+        assert report.rejected == 0
+        assert target.count_entries() == source.count_entries() == 100
+        assert target.totals_between(START, END) == source.totals_between(START, END)
+    finally:
+        target.close()
+
+
+def test_binary_entry_records_carry_entries(tmp_path, source):
+    path = str(tmp_path / "export.bin")
+    export(source, path, FORMAT_BIN, GRANULARITY_ENTRY)
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+    assert data[:4] == b"WIEX"
+    body = data[6:]
+    weights = [entries for _, _, entries in struct.iter_unpack("<qii", body)]
+    assert sum(weights) == 100
+    assert weights.count(5) == 10
+
+
+def test_amounts_rounding_to_zero_are_rejected(tmp_path):
+    path = tmp_path / "import.csv"
+    path.write_text("timestamp,amount_ml\n"
+                    "2024-02-01T08:00:00,0.3\n"
+                    "2024-02-01T09:00:00,0.6\n"
+                    "2024-02-01T10:00:00,250\n")
+    db = Database(str(tmp_path / "water.db"))
+    try:
+        report = import_file(db, str(path))
+        assert (report.inserted, report.rejected) == (2, 1)
+        assert report.reject_reasons == {"amount out of range": 1}
+        assert db.count_entries() == 2
+        assert db.totals_between("2024-02-01", "2024-02-01") == [("2024-02-01", 251)]
+    finally:
+        db.close()
@@ -0,0 +1,147 @@
+# tests/test_pool.py
+"""
+Concurrent writers and readers on one Database through the connection
+pool, and how pool writes roll back and commit.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+from database import DURABILITY_FULL, DURABILITY_NORMAL, Database
+from pool import ConnectionPool
+
+WRITERS = 4
+WRITES_EACH = 150
+READERS = 4
+DAY = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.mark.parametrize("durability, group_commit_ms", [
+    (DURABILITY_FULL, 0),
+    (DURABILITY_NORMAL, 0),
+    (DURABILITY_NORMAL, 20),
+])
+def test_concurrent_writers_and_readers(tmp_path, durability, group_commit_ms):
+    db = Database(str(tmp_path / "water.db"), durability=durability,
+                  group_commit_ms=group_commit_ms, max_readers=READERS)
+    day = DAY.date().isoformat()
+    done = threading.Event()
+    errors = []
+
+    def write(worker):
+        try:
+            for i in range(WRITES_EACH):
+                if i % 10 == 0:
+                    db.log_intakes([(worker + 1, DAY)] * 5)
+                else:
+                    db.log_intake(worker + 1, DAY)
+        except BaseException as e:
+            errors.append(e)
+
+    def read():
+        last = 0
+        try:
+            while not done.is_set():
+                total = db.get_intake_for_date(day)
+                # totals only ever grow, and every read sees a whole write
+                assert total >= last
+                last = total
+                history = db.get_history(7)
+                assert all(t >= 0 for _, t in history)
+                assert db.count_entries(day, day) >= 0
+        except BaseException as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(w,)) for w in range(WRITERS)]
+    readers = [threading.Thread(target=read) for _ in range(READERS)]
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    done.set()
+    for t in readers:
+        t.join()
+    db.flush()
+
+    assert errors == []
+    per_worker = WRITES_EACH + 4 * (WRITES_EACH // 10)   # each bulk call logs 5
+    expected_entries = WRITERS * per_worker
+    expected_total = sum((w + 1) * per_worker for w in range(WRITERS))
+    assert db.count_entries() == expected_entries
+    assert db.get_intake_for_date(day) == expected_total
+    assert db.get_history(1) == [(day, expected_total)]
+    with db._pool.read() as conn:
+        raw = conn.execute("SELECT COUNT(*), SUM(amount_ml) FROM intake").fetchone()
+    assert tuple(raw) == (expected_entries, expected_total)
+    db.close()
+
+    reopened = Database(str(tmp_path / "water.db"))
+    assert reopened.get_intake_for_date(day) == expected_total
+    reopened.close()
+
+
+def test_reader_path_with_uri_characters(tmp_path):
+    path = tmp_path / "odd?name#1%20.db"
+    db = Database(str(path))
+    db.log_intake(250, DAY)
+    db.flush()
+    assert db.get_intake_for_date(DAY.date().isoformat()) == 250
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == ".db") == [path.name]
+    db.close()
+
+
+def _amounts(path):
+    # what another connection sees, i.e. what has been committed
+    conn = sqlite3.connect(path)
+    try:
+        return [r[0] for r in conn.execute("SELECT amount_ml FROM intake ORDER BY id")]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("group_commit_ms", [0, 60_000])
+def test_failed_write_rolls_back_only_its_own_statements(tmp_path, group_commit_ms):
+    path = str(tmp_path / "water.db")
+    db = Database(path, group_commit_ms=group_commit_ms)
+    db.log_intake(100, DAY)
+    # with group commit the first write is still pending in an open transaction
+    assert db._pool.writer.in_transaction == (group_commit_ms > 0)
+    with pytest.raises(RuntimeError):
+        with db._pool.write() as conn:
+            conn.execute("INSERT INTO intake (user_id, date, timestamp, ts_ms, amount_ml) "
+                         "VALUES (1, '2024-03-01', '2024-03-01T13:00:00', 0, 555)")
+            raise RuntimeError("boom")
+    db.log_intake(200, DAY)
+    db.flush()
+    assert _amounts(path) == [100, 200]
+    assert db.get_intake_for_date(DAY.date().isoformat()) == 300
+    db.close()
+
+
+def test_pending_group_commit_is_flushed_on_close(tmp_path):
+    path = str(tmp_path / "water.db")
+    db = Database(path, durability=DURABILITY_NORMAL, group_commit_ms=60_000)
+    db.log_intake(100, DAY)
+    db.log_intakes([(50, DAY)] * 3)
+    assert _amounts(path) == []
+    db.close()
+    assert _amounts(path) == [100, 50, 50, 50]
+
+
+def test_pool_close_commits_pending_writes(tmp_path):
+    path = str(tmp_path / "plain.db")
+    pool = ConnectionPool(path, group_commit_ms=60_000)
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    pool.flush()
+    with pool.write() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    pool.commit()
+    assert pool.writer.in_transaction
+    pool.close()
+    check = sqlite3.connect(path)
+    assert check.execute("SELECT x FROM t").fetchall() == [(1,)]
+    check.close()
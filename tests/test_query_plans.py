@@ -0,0 +1,95 @@
+# tests/test_query_plans.py
+"""
+The per-day reads, deletes and totals must be index lookups: every
+statement they run is traced and checked with EXPLAIN QUERY PLAN.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import Database
+
+DAY = "2024-03-10"
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "water.db"))
+    start = datetime(2024, 1, 1, 8, 0)
+    db.log_intakes((250, start + timedelta(days=d, hours=h)) for d in range(90) for h in range(6))
+    other = db.for_user(db.create_user("Other"))
+    other.log_intakes((300, start + timedelta(days=d)) for d in range(90))
+    yield db
+    db.close()
+
+
+def traced(db, call):
+    """The statements on intake / daily_totals that call() runs."""
+    statements = []
+    db.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        db.set_trace_callback(None)
+    # a statement can be reported more than once (e.g. re-prepared)
+    return [s for s in dict.fromkeys(statements)
+            if s.split(None, 1)[0].upper() in ("SELECT", "DELETE", "UPDATE")
+            and ("intake" in s or "daily_totals" in s)]
+
+
+def plans(db, call):
+    conn = sqlite3.connect(db.db_path)
+    try:
+        out = []
+        for sql in traced(db, call):
+            details = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            out.append((sql, details))
+        return out
+    finally:
+        conn.close()
+
+
+def assert_indexed(results):
+    assert results, "no statements traced"
+    for sql, details in results:
+        touched = [d for d in details if "intake" in d or "daily_totals" in d]
+        assert touched, (sql, details)
+        for detail in touched:
+            assert detail.startswith("SEARCH"), (sql, details)
+            assert "INDEX" in detail or "PRIMARY KEY" in detail, (sql, details)
+            # narrowed by day or row id, not only by profile
+            assert "date" in detail or "rowid=?" in detail, (sql, details)
+
+
+def test_entries_for_date_uses_index_without_sort(db):
+    results = plans(db, lambda: db.get_entries_for_date(DAY))
+    assert_indexed(results)
+    for sql, details in results:
+        assert not any("TEMP B-TREE" in d for d in details), (sql, details)
+
+
+def test_intake_for_date_reads_rollup_by_key(db):
+    results = plans(db, lambda: db.get_intake_for_date(DAY))
+    assert_indexed(results)
+    assert all("daily_totals" in sql for sql, _ in results)
+
+
+def test_history_and_range_totals_use_index(db):
+    assert_indexed(plans(db, lambda: db.get_history(30)))
+    assert_indexed(plans(db, lambda: db.totals_between("2024-02-01", "2024-02-29")))
+    assert_indexed(plans(db, lambda: db.count_entries("2024-02-01", "2024-02-29")))
+
+
+def test_delete_entry_uses_index(db):
+    entry_id = db.get_entries_for_date(DAY)[0]["id"]
+    results = plans(db, lambda: db.delete_entry(entry_id))
+    assert_indexed(results)
+    assert any(sql.startswith("DELETE") for sql, _ in results)
+
+
+def test_clear_day_uses_index(db):
+    results = plans(db, lambda: db.clear_entries_for_date(DAY))
+    assert_indexed(results)
+    assert sum(sql.startswith("DELETE") for sql, _ in results) == 2
@@ -0,0 +1,213 @@
+# tests/test_reminders.py
+"""Reminder deadlines and the scheduler, on a simulated clock."""
+
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+import reminders
+from memory_database import MemoryDatabase
+from reminders import ACTIVE_END, ACTIVE_START, ReminderState, next_deadline
+
+AMOUNTS = [150, 200, 250, 330, 500, 750]
+DAY = "2026-03-02"
+
+
+def state(consumed=0, target=2000, interval=60, last_intake=None):
+    return ReminderState(1, "p", DAY, interval, target, consumed, last_intake)
+
+
+def at(hour, minute=0, day=0):
+    return datetime(2026, 3, 2 + day, hour, minute)
+
+
+class ManualTimer:
+    """reminders.ThreadTimer stand-in on a simulated clock: the test fires it."""
+
+    def __init__(self, callback, clock):
+        self.callback = callback
+        self.clock = clock
+        self.due: Optional[datetime] = None
+
+    def arm(self, delay_s: float):
+        self.due = self.clock() + timedelta(seconds=max(0.0, delay_s))
+
+    def cancel(self):
+        self.due = None
+
+    def close(self):
+        self.due = None
+
+    def fire(self):
+        self.due = None
+        self.callback()
+
+
+class ClockedNotifier(reminders.RecordingNotifier):
+    """RecordingNotifier that also notes the simulated time of every reminder."""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.times: List[datetime] = []
+
+    def notify(self, title: str, message: str) -> bool:
+        self.times.append(self.clock())
+        return super().notify(title, message)
+
+
+# ---------- next_deadline ----------
+def test_nothing_drunk_is_due_one_interval_into_the_day():
+    assert next_deadline(state(), None) == at(8) + timedelta(minutes=60)
+
+
+def test_deadline_is_where_pace_passes_consumption():
+    # half the target covers half of the 14 active hours
+    assert next_deadline(state(consumed=1000), None) == at(15)
+
+
+def test_recent_drink_or_reminder_pushes_the_deadline():
+    assert next_deadline(state(consumed=1000, last_intake=at(14, 30)), None) == at(15, 30)
+    assert next_deadline(state(consumed=1000), at(14, 45)) == at(15, 45)
+
+
+def test_interval_has_a_floor():
+    s = state(interval=1, last_intake=at(9))
+    assert next_deadline(s, None) == at(9) + timedelta(minutes=reminders.MIN_INTERVAL_MINUTES)
+
+
+def test_target_met_or_hours_over_moves_to_next_day():
+    tomorrow = datetime.combine(at(0, day=1).date(), ACTIVE_START) + timedelta(minutes=60)
+    assert next_deadline(state(consumed=2000), None) == tomorrow
+    assert next_deadline(state(consumed=1900, last_intake=at(21, 30)), None) == tomorrow
+
+
+# ---------- scheduler ----------
+def simulate(profiles: int, days: int, seed: int):
+    """
+    Simulated days of drinking for many profiles on a MemoryDatabase with
+    a manual clock and timer. Returns the scheduler, the reminders sent as
+    (time, user_id), the drinks logged and each profile's settings.
+    """
+    rng = random.Random(seed)
+    now = [datetime(2026, 3, 2, 0, 0)]
+    clock = lambda: now[0]  # noqa: E731
+    db = MemoryDatabase()
+    settings, names, drinks = {}, {}, []
+    for i in range(profiles):
+        user = db.for_user(db.create_user(f"profile {i}"))
+        names[f"profile {i}"] = user.user_id
+        enabled = i % 5 != 0
+        interval, target = rng.choice((30, 45, 60, 90)), rng.choice((1500, 2000, 2500))
+        user.set_reminder_enabled(enabled)
+        user.set_reminder_minutes(interval)
+        user.set_daily_target_ml(target)
+        settings[user.user_id] = (enabled, interval, target)
+        # steady drinkers stay on pace; the rest forget for hours at a time
+        gap = (20, 40) if i % 3 == 0 else (60, 240)
+        for day in range(days):
+            t = datetime.combine(now[0].date() + timedelta(days=day), datetime.min.time()) \
+                + timedelta(hours=7, minutes=rng.randrange(90))
+            while t.hour < 23:
+                drinks.append((t, user.user_id, rng.choice(AMOUNTS)))
+                t += timedelta(minutes=rng.randrange(*gap))
+    drinks.sort()
+
+    notifier = ClockedNotifier(clock)
+    timers = []
+
+    def make_timer(callback):
+        timers.append(ManualTimer(callback, clock))
+        return timers[-1]
+
+    scheduler = reminders.ReminderScheduler(db, notifier, clock=clock, timer_factory=make_timer)
+    scheduler.start()
+    timer = timers[0]
+    end = datetime.combine(now[0].date() + timedelta(days=days), datetime.min.time())
+    i = 0
+    while True:
+        next_drink = drinks[i][0] if i < len(drinks) else None
+        if timer.due is not None and (next_drink is None or timer.due <= next_drink):
+            if timer.due >= end:
+                break
+            now[0] = max(now[0], timer.due)
+            timer.fire()
+        elif next_drink is not None and next_drink < end:
+            now[0], user_id, amount = drinks[i]
+            db.for_user(user_id).log_intake(amount, now[0])
+            i += 1
+        else:
+            break
+    scheduler.stop()
+    sent = [(t, names[message.split(":")[0]]) for t, (_, message) in zip(notifier.times, notifier.sent)]
+    return scheduler, sent, drinks[:i], settings
+
+
+@pytest.fixture(scope="module")
+def simulation():
+    return simulate(profiles=60, days=3, seed=42)
+
+
+def test_simulation_sends_reminders(simulation):
+    _scheduler, sent, _drinks, settings = simulation
+    reminded = {user_id for _, user_id in sent}
+    assert len(sent) > 50
+    assert reminded <= {uid for uid, (enabled, _, _) in settings.items() if enabled}
+
+
+def test_every_reminder_follows_the_rules(simulation):
+    _scheduler, sent, drinks, settings = simulation
+    by_user: Dict[int, List[Tuple[datetime, int]]] = {}
+    for t, user_id, amount in drinks:
+        by_user.setdefault(user_id, []).append((t, amount))
+    last_reminder: Dict[int, datetime] = {}
+    for t, user_id in sent:
+        enabled, interval, target = settings[user_id]
+        start = datetime.combine(t.date(), ACTIVE_START)
+        stop = datetime.combine(t.date(), ACTIVE_END)
+        today = [(dt, a) for dt, a in by_user.get(user_id, []) if dt.date() == t.date() and dt < t]
+        consumed = sum(a for _, a in today)
+        quiet = [x for x in [today[-1][0] if today else None, last_reminder.get(user_id)]
+                 if x is not None and x.date() == t.date()]
+        pace = target * (t - start) / (stop - start)
+        assert enabled, f"profile {user_id} reminded with reminders off"
+        assert start <= t < stop, f"profile {user_id} reminded outside the active hours at {t}"
+        assert consumed < target and consumed <= pace + 1e-6, \
+            f"profile {user_id} reminded at {t} while on pace ({consumed} ml)"
+        assert not quiet or t - max(quiet) >= timedelta(minutes=interval), \
+            f"profile {user_id} reminded at {t} within {interval} min"
+        last_reminder[user_id] = t
+
+
+def test_wakeups_follow_events_not_the_clock(simulation):
+    scheduler, sent, drinks, settings = simulation
+    days = 3
+    enabled = sum(1 for on, _, _ in settings.values() if on)
+    # one wake-up per reminder, drink and day rollover at most: no polling
+    assert scheduler.wakeups <= len(sent) + len(drinks) + days * enabled + days + 1
+
+
+def test_idle_scheduler_does_not_wake():
+    db = MemoryDatabase()
+    for i in range(20):
+        user = db.for_user(db.create_user(f"profile {i}"))
+        user.set_reminder_enabled(True)
+        user.set_daily_target_ml(1000)
+        user.log_intake(1000)   # target met: next reminder is tomorrow
+    notifier = reminders.RecordingNotifier()
+    scheduler = reminders.ReminderScheduler(db, notifier)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(scheduler.deadlines()) < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)   # the first wake-up loads every profile
+        assert len(scheduler.deadlines()) == 20
+        woken = scheduler.wakeups
+        time.sleep(0.5)
+        assert scheduler.wakeups == woken
+        assert notifier.sent == []
+    finally:
+        scheduler.stop()
@@ -0,0 +1,90 @@
+# tests/test_rollup.py
+"""
+daily_totals must always equal a GROUP BY date over the raw intake rows:
+after every kind of write, and after migrating a database that predates
+the rollup.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import COMPACT_HOUR, SCHEMA_VERSION, Database
+
+START = datetime(2024, 5, 1, 8, 0)
+
+ROLLUP = "SELECT user_id, date, total_ml, entries FROM daily_totals ORDER BY user_id, date"
+RAW = ("SELECT user_id, date, SUM(amount_ml), SUM(entries) FROM intake "
+       "GROUP BY user_id, date ORDER BY user_id, date")
+
+
+def assert_in_sync(conn):
+    assert [tuple(r) for r in conn.execute(ROLLUP)] == [tuple(r) for r in conn.execute(RAW)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "water.db"))
+    yield db
+    db.close()
+
+
+def test_rollup_follows_every_write(db):
+    other = db.for_user(db.create_user("Other"))
+    ids = [db.log_intake(100 + 10 * i, START + timedelta(hours=3 * i)) for i in range(20)]
+    other.log_intake(400, START)
+    assert_in_sync(db.conn)
+
+    db.log_intakes([(250, START + timedelta(days=d, minutes=5)) for d in range(10)])
+    other.log_intakes([(300, START + timedelta(days=d)) for d in range(3)], update_totals=False)
+    other.rebuild_daily_totals()
+    assert_in_sync(db.conn)
+
+    db.update_entry_amount(ids[0], 999)
+    assert_in_sync(db.conn)
+
+    # moved to another day, and to a day that had no entries yet
+    db.update_entry_timestamp(ids[1], (START + timedelta(days=2, hours=1)).isoformat())
+    db.update_entry_timestamp(ids[2], (START + timedelta(days=30)).isoformat())
+    assert_in_sync(db.conn)
+
+    db.delete_entry(ids[3])
+    other.delete_entry(ids[4])   # not this profile's entry: ignored
+    # deleting a day's only entry removes its rollup row
+    db.delete_entry(ids[2])
+    assert_in_sync(db.conn)
+
+    db.clear_entries_for_date(START.date().isoformat())
+    assert_in_sync(db.conn)
+
+    db.compact_entries((START + timedelta(days=5)).date().isoformat(), COMPACT_HOUR)
+    assert_in_sync(db.conn)
+
+    db.delete_user(other.user_id)
+    assert_in_sync(db.conn)
+
+
+def test_migration_backfills_rollup(tmp_path):
+    # the schema written before versioning, daily_totals and profiles existed
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("CREATE TABLE intake (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, "
+                 "timestamp TEXT NOT NULL, amount_ml INTEGER NOT NULL)")
+    rows = [START + timedelta(hours=5 * i) for i in range(40)]
+    conn.executemany("INSERT INTO intake (date, timestamp, amount_ml) VALUES (?, ?, ?)",
+                     [(ts.date().isoformat(), ts.isoformat(), 150 + i) for i, ts in enumerate(rows)])
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert db.conn.execute("SELECT COUNT(*) FROM daily_totals").fetchone()[0] == 9
+        assert_in_sync(db.conn)
+        assert db.count_entries() == 40
+        db.log_intake(500, rows[-1])
+        assert_in_sync(db.conn)
+    finally:
+        db.close()
@@ -0,0 +1,56 @@
+# tests/test_settings.py
+"""
+Cached settings are invalidated by PRAGMA data_version when another
+connection or process writes them.
+"""
+
+import sqlite3
+
+import pytest
+
+import database
+from database import Database
+
+
+@pytest.fixture
+def pair(tmp_path):
+    path = str(tmp_path / "water.db")
+    a, b = Database(path), Database(path)
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_write_through_other_connection_invalidates_cache(pair, monkeypatch):
+    a, b = pair
+    monkeypatch.setattr(database, "SETTINGS_RECHECK_S", 3600.0)
+    a.set_daily_target_ml(2000)
+    assert b.get_daily_target_ml() == 2000   # now cached in b
+
+    a.set_daily_target_ml(3100)
+    # within the recheck interval the cached value is served as-is
+    assert b.get_daily_target_ml() == 2000
+    monkeypatch.setattr(database, "SETTINGS_RECHECK_S", 0.0)
+    assert b.get_daily_target_ml() == 3100
+    # b's own view of its writes never needs a recheck
+    b.set_daily_target_ml(1800)
+    assert b.get_daily_target_ml() == 1800
+    assert a.get_daily_target_ml() == 1800
+
+
+def test_external_change_is_detected_and_published(pair):
+    a, b = pair
+    b.set_setting("note", "old")
+    assert b.get_setting("note") == "old"
+    changes = []
+    b.add_listener(changes.append)
+    assert not b.check_external_change()
+
+    conn = sqlite3.connect(a.db_path)
+    conn.execute("UPDATE settings SET value = 'new' WHERE key = 'note'")
+    conn.commit()
+    conn.close()
+
+    assert b.check_external_change()
+    assert [c.kind for c in changes] == ["external"]
+    assert b.get_setting("note") == "new"
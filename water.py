@@ -0,0 +1,269 @@
+# water.py
+"""
+Command-line interface for the Water Intake Tracker.
+Imports only the standard library and database.py (plus exporter.py or
+importer.py for those commands), never PyQt6 or matplotlib, so it is
+cheap enough for scripts, cron jobs and shell prompts.
+
+    python -m water log 250
+    python -m water log 330 --at 2026-10-17T08:15
+    printf '250\\n500 2026-10-17T09:00\\n' | python -m water log -
+    python -m water today
+    python -m water history --days 30
+    python -m water target 2200
+    python -m water export history.csv --granularity entry
+    python -m water import old_history.jsonl
+    python -m water compact --keep-days 90 --granularity hour --save
+    python -m water seal
+
+--db and --user (profile id or name) go before the command; --json
+switches the output of today/history/target to JSON. --diagnostics FILE
+writes the command's Database and SQL timings to FILE (.json or
+Prometheus text).
+"""
+
+import argparse
+import json
+import sys
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from database import Database, DB_FILE, open_database
+
+# lines per transaction when logging from stdin
+STDIN_BATCH = 10_000
+
+
+class CliError(Exception):
+    pass
+
+
+def parse_amount(text: str) -> int:
+    try:
+        amount = int(round(float(text)))
+    except ValueError:
+        raise CliError(f"not an amount: {text!r}")
+    if amount <= 0:
+        raise CliError(f"amount must be positive: {text!r}")
+    return amount
+
+
+def parse_timestamp(text: str) -> datetime:
+    try:
+        ts = datetime.fromisoformat(text)
+    except ValueError:
+        raise CliError(f"not an ISO timestamp: {text!r}")
+    return ts.astimezone().replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+
+def read_stdin_entries(lines) -> Iterator[Tuple[int, Optional[datetime]]]:
+    """'AMOUNT [TIMESTAMP]' per line, space or comma separated; # starts a comment."""
+    for line_no, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].replace(",", " ").strip()
+        if not line:
+            continue
+        parts = line.split()
+        try:
+            amount = parse_amount(parts[0])
+            ts = parse_timestamp(parts[1]) if len(parts) > 1 else None
+        except CliError as e:
+            raise CliError(f"stdin line {line_no}: {e}")
+        yield amount, ts
+
+
+def select_profile(db: Database, name_or_id: Optional[str]) -> Database:
+    if name_or_id is None:
+        return db
+    user = db.get_user_by_name(name_or_id)
+    if user is None and name_or_id.isdigit():
+        user = db.get_user(int(name_or_id))
+    if user is None:
+        raise CliError(f"no such profile: {name_or_id!r}")
+    return db.for_user(user["id"])
+
+
+# ---------- Commands ----------
+def cmd_log(db: Database, args) -> int:
+    if args.amount == "-":
+        logged = 0
+        batch: List[Tuple[int, Optional[datetime]]] = []
+        for entry in read_stdin_entries(sys.stdin):
+            batch.append(entry)
+            if len(batch) >= STDIN_BATCH:
+                logged += db.log_intakes(batch)
+                batch.clear()
+        logged += db.log_intakes(batch)
+        print(f"logged {logged} entries")
+        return 0
+    amount = parse_amount(args.amount)
+    ts = parse_timestamp(args.at) if args.at else None
+    entry_id = db.log_intake(amount, ts)
+    day = (ts or datetime.now()).date().isoformat()
+    print(f"logged {amount} ml (entry {entry_id}); {day} total {db.get_intake_for_date(day)} ml")
+    return 0
+
+
+def cmd_today(db: Database, args) -> int:
+    day = date.today().isoformat()
+    target = db.get_daily_target_ml()
+    total = db.get_intake_for_date(day)
+    entries = db.get_entries_for_date(day) if args.entries else []
+    if args.json:
+        payload = {"date": day, "total_ml": total, "target_ml": target}
+        if args.entries:
+            payload["entries"] = [
+                {"id": e["id"], "timestamp": e["timestamp"], "amount_ml": e["amount_ml"]}
+                for e in entries
+            ]
+        print(json.dumps(payload))
+        return 0
+    pct = int(total / target * 100) if target > 0 else 0
+    print(f"Today: {total} / {target} ml ({pct}%), {max(0, target - total)} ml remaining")
+    for e in entries:
+        ts = datetime.fromisoformat(e["timestamp"]).strftime("%H:%M:%S")
+        print(f"  {e['id']} — {ts} — {e['amount_ml']} ml")
+    return 0
+
+
+def cmd_history(db: Database, args) -> int:
+    start = (date.today() - timedelta(days=args.days - 1)).isoformat()
+    rows = [(r["date"], r["total_ml"])
+            for batch in db.iter_daily_totals(start=start, descending=True)
+            for r in batch]
+    if args.json:
+        print(json.dumps([{"date": d, "total_ml": t} for d, t in rows]))
+        return 0
+    for d, t in rows:
+        print(f"{d}: {t} ml")
+    return 0
+
+
+def cmd_target(db: Database, args) -> int:
+    if args.ml is not None:
+        db.set_daily_target_ml(parse_amount(args.ml))
+    target = db.get_daily_target_ml()
+    print(json.dumps({"target_ml": target}) if args.json else f"Daily target: {target} ml")
+    return 0
+
+
+def cmd_export(db: Database, args) -> int:
+    import exporter
+    fmt = args.format or exporter.format_for_path(args.path)
+    count = exporter.export(db, args.path, fmt=fmt, granularity=args.granularity,
+                            start=args.start, end=args.end)
+    print(f"{count} rows exported to {args.path}")
+    return 0
+
+
+def cmd_import(db: Database, args) -> int:
+    import importer
+    report = importer.import_file(db, args.path, fmt=args.format)
+    print(report.summary())
+    return 0 if report.rejected == 0 else 1
+
+
+def cmd_compact(db: Database, args) -> int:
+    import retention
+    policy = retention.RetentionPolicy.from_settings(db)
+    if args.keep_days is not None:
+        policy = retention.RetentionPolicy(args.keep_days, policy.granularity if policy else "day")
+    if policy is None:
+        raise CliError("no retention policy stored for this profile; pass --keep-days")
+    if args.granularity:
+        policy.granularity = args.granularity
+    if args.save:
+        policy.save(db)
+    if policy.keep_raw_days <= 0:
+        print("retention disabled, raw entries are kept")
+        return 0
+    report = retention.apply(db, policy)
+    print(f"compacted entries before {policy.cutoff()} by {policy.granularity}: {report.summary()}")
+    return 0
+
+
+def cmd_seal(db: Database, args) -> int:
+    through = args.through or (date.today() - timedelta(days=1)).isoformat()
+    try:
+        date.fromisoformat(through)
+    except ValueError:
+        raise CliError(f"not an ISO date: {through!r}")
+    days, entries = db.seal_archive(through)
+    print(f"archived {entries} entries over {days} days up to {through}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m water", description="Water Intake Tracker CLI")
+    parser.add_argument("--db", default=DB_FILE,
+                        help="database file, 'log:PATH' or 'memory:' (default %(default)s)")
+    parser.add_argument("--user", help="profile name or id (default: the default profile)")
+    parser.add_argument("--json", action="store_true", help="JSON output for today/history/target")
+    parser.add_argument("--diagnostics", metavar="FILE",
+                        help="write Database and SQL timings to FILE (.json or Prometheus text)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("log", help="log an amount in ml ('-' reads 'AMOUNT [TIMESTAMP]' lines from stdin)")
+    p.add_argument("amount")
+    p.add_argument("--at", help="ISO timestamp (default: now)")
+    p.set_defaults(func=cmd_log)
+
+    p = sub.add_parser("today", help="today's total against the target")
+    p.add_argument("--entries", action="store_true", help="also list today's entries")
+    p.set_defaults(func=cmd_today)
+
+    p = sub.add_parser("history", help="daily totals, newest first")
+    p.add_argument("--days", type=int, default=14)
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("target", help="show or set the daily target")
+    p.add_argument("ml", nargs="?")
+    p.set_defaults(func=cmd_target)
+
+    # exporter/importer constants aren't imported here, to keep startup lean
+    p = sub.add_parser("export", help="export history (format from the extension by default)")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("csv", "jsonl", "bin", "txt"))
+    p.add_argument("--granularity", choices=("day", "entry"), default="day")
+    p.add_argument("--start", help="first day, YYYY-MM-DD")
+    p.add_argument("--end", help="last day, YYYY-MM-DD")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="import a CSV or JSON Lines history")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("csv", "jsonl"))
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("compact", help="aggregate old raw entries and vacuum the file")
+    p.add_argument("--keep-days", type=int, help="days of raw entries to keep (default: stored policy)")
+    p.add_argument("--granularity", choices=("day", "hour"), help="one row per day or per hour")
+    p.add_argument("--save", action="store_true", help="store the policy for the profile")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("seal", help="move closed days into the columnar archive for fast long-range reads")
+    p.add_argument("--through", help="last day to archive, YYYY-MM-DD (default: yesterday)")
+    p.set_defaults(func=cmd_seal)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        if args.diagnostics:
+            import diagnostics
+            diagnostics.enable()
+        db = open_database(args.db)
+        try:
+            if args.diagnostics:
+                diagnostics.attach(db)
+            return args.func(select_profile(db, args.user), args)
+        finally:
+            db.close()
+            if args.diagnostics:
+                diagnostics.dump(args.diagnostics)
+    except (CliError, ValueError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
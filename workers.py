@@ -0,0 +1,109 @@
+# workers.py
+"""
+Runs Database calls off the Qt GUI thread.
+Reads go to a small QThreadPool; identical reads that are already in
+flight are coalesced. Writes go to a single-thread pool so they are
+applied in the order they were submitted. Results come back through a
+queued signal, so callbacks always run on the GUI thread.
+With diagnostics enabled, each call is timed from submission to its
+callback returning ("worker <key or function>").
+"""
+
+import itertools
+import time
+from typing import Callable, Dict, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+import diagnostics
+
+
+class _Task(QRunnable):
+    def __init__(self, worker, task_id, fn, args):
+        super().__init__()
+        self.worker = worker
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        try:
+            value = self.fn(*self.args)
+        except Exception as e:
+            self.worker._done.emit(self.task_id, False, e)
+            return
+        self.worker._done.emit(self.task_id, True, value)
+
+
+class DbWorker(QObject):
+    # emitted when a submitted call raises: (key or "write", exception)
+    failed = pyqtSignal(str, object)
+    _done = pyqtSignal(int, bool, object)
+
+    def __init__(self, readers: int = 2, parent=None):
+        super().__init__(parent)
+        self._read_pool = QThreadPool(self)
+        self._read_pool.setMaxThreadCount(max(1, readers))
+        self._write_pool = QThreadPool(self)
+        self._write_pool.setMaxThreadCount(1)
+        self._ids = itertools.count(1)
+        self._callbacks: Dict[int, tuple] = {}   # task id -> (key, callback)
+        self._submitted: Dict[int, tuple] = {}   # task id -> (span name, start), with diagnostics on
+        self._inflight: Dict[str, int] = {}      # read key -> task id
+        self._pending: Dict[str, tuple] = {}     # read key -> latest (fn, args, callback)
+        self._done.connect(self._on_done)
+
+    def read(self, key: str, fn: Callable, *args, callback: Optional[Callable] = None):
+        """
+        Run fn(*args) on a reader thread and pass the result to callback on
+        the GUI thread. While a read with the same key is in flight, newer
+        requests replace each other and only the latest one runs after it.
+        """
+        if key in self._inflight:
+            self._pending[key] = (fn, args, callback)
+            return
+        self._submit(self._read_pool, key, fn, args, callback)
+
+    def write(self, fn: Callable, *args, callback: Optional[Callable] = None):
+        """Run fn(*args) on the writer thread; writes run in submission order."""
+        self._submit(self._write_pool, None, fn, args, callback)
+
+    def _submit(self, pool, key, fn, args, callback):
+        task_id = next(self._ids)
+        self._callbacks[task_id] = (key, callback)
+        if key is not None:
+            self._inflight[key] = task_id
+        if diagnostics.enabled():
+            name = key or getattr(fn, "__name__", "write")
+            self._submitted[task_id] = (f"worker {name}", time.perf_counter())
+        pool.start(_Task(self, task_id, fn, args))
+
+    def _on_done(self, task_id, ok, value):
+        submitted = self._submitted.pop(task_id, None)
+        try:
+            self._finish(task_id, ok, value)
+        finally:
+            rec = diagnostics.recorder()
+            if submitted is not None and rec is not None:
+                rec.record(submitted[0], time.perf_counter() - submitted[1])
+
+    def _finish(self, task_id, ok, value):
+        key, callback = self._callbacks.pop(task_id, (None, None))
+        if key is not None:
+            self._inflight.pop(key, None)
+            if key in self._pending:
+                # a newer request superseded this result; run that instead
+                fn, args, next_callback = self._pending.pop(key)
+                self._submit(self._read_pool, key, fn, args, next_callback)
+                return
+        if not ok:
+            self.failed.emit(key or "write", value)
+        elif callback is not None:
+            callback(value)
+
+    def shutdown(self):
+        """Wait for queued work to finish (call before closing the Database)."""
+        self._pending.clear()
+        self._submitted.clear()
+        self._write_pool.waitForDone()
+        self._read_pool.waitForDone()